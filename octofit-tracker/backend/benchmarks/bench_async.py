@@ -0,0 +1,140 @@
+"""
+Concurrency benchmark: sync WSGI read path vs async ASGI read path.
+
+Seeds a scratch database with generate_load_data, then for each concurrency
+level fires the same GET routes at the DRF endpoints through the WSGI
+handler (one thread per in-flight request) and at their /api/async/
+counterparts through the ASGI handler (one task per in-flight request on a
+single event loop). Needs a local mongod:
+
+    python benchmarks/bench_async.py --scale 100000 --concurrency 1,8,32,128 \\
+        --output async.json
+
+Throughput that keeps rising with concurrency on the ASGI side while the
+WSGI side flattens at its thread count is the scaling the async path buys.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bench_endpoints import git_commit, seed  # sets up Django
+
+from django.conf import settings
+from django.test import AsyncClient, Client
+
+# (route under /api/ and /api/async/, query params) filled in from the seeded samples.
+ROUTES = [
+    ('users/', {}),
+    ('users/{user}/', {}),
+    ('users/{user}/profile/', {}),
+    ('teams/', {}),
+    ('teams/{team}/members/', {}),
+    ('activities/', {}),
+    ('activities/by_user/', {'user_id': '{username}'}),
+    ('activities/summary/', {'group_by': 'type'}),
+    ('workouts/', {}),
+    ('leaderboard/individual/', {}),
+    ('leaderboard/top/', {'limit': '10'}),
+]
+
+
+def expand(route, params, sample):
+    values = {'user': sample['pk']['user'], 'team': sample['pk']['team'],
+              'username': sample['username']}
+    return route.format(**values), {k: v.format(**values) for k, v in params.items()}
+
+
+def summarize(latencies, elapsed, statuses, concurrency):
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'status': sorted(statuses),
+        'p50_ms': round(quantiles[49], 3),
+        'p99_ms': round(quantiles[98], 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'concurrency': concurrency,
+    }
+
+
+def run_wsgi(path, params, requests, concurrency):
+    def one(_):
+        client = Client(HTTP_HOST='localhost')
+        start = time.perf_counter()
+        response = client.get(path, params)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    return summarize([r[0] for r in results], elapsed, {r[1] for r in results}, concurrency)
+
+
+async def run_asgi(path, params, requests, concurrency):
+    client = AsyncClient()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limit:
+            start = time.perf_counter()
+            response = await client.get(path, params)
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return summarize([r[0] for r in results], elapsed, {r[1] for r in results}, concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', type=int, default=100000,
+                        help='Activities to seed')
+    parser.add_argument('--concurrency', default='1,8,32,128',
+                        help='Comma-separated in-flight request counts')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Requests per route and concurrency level')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default='octofit_bench')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    args = parser.parse_args()
+
+    if args.database == 'octofit_db':
+        parser.error('refusing to seed the application database')
+    settings.DATABASES['default']['NAME'] = args.database
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    # Measure the database path, not the response cache.
+    settings.LEADERBOARD_CACHE_TTL = 0
+
+    print(f'Seeding {args.scale:,} activities into {args.database}...')
+    sample = seed(args.scale, args.seed)
+    results = {}
+    print(f'{"route":<32}{"conc":>6}{"wsgi rps":>12}{"asgi rps":>12}'
+          f'{"wsgi p99":>12}{"asgi p99":>12}')
+    for route, params in ROUTES:
+        path, query = expand(route, params, sample)
+        results[route] = route_results = {}
+        for concurrency in [int(value) for value in args.concurrency.split(',')]:
+            wsgi = run_wsgi(f'/api/{path}', query, args.requests, concurrency)
+            asgi = asyncio.run(run_asgi(f'/api/async/{path}', query, args.requests,
+                                        concurrency))
+            route_results[str(concurrency)] = {'wsgi': wsgi, 'asgi': asgi}
+            print(f'{route:<32}{concurrency:>6}{wsgi["throughput_rps"]:>12.1f}'
+                  f'{asgi["throughput_rps"]:>12.1f}{wsgi["p99_ms"]:>12.2f}'
+                  f'{asgi["p99_ms"]:>12.2f}')
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            'commit': git_commit(),
+            'settings': vars(args),
+            'routes': results,
+        }, indent=2))
+        print(f'\nResults written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+Endpoint benchmark: latency percentiles and throughput for every API route.
+
+Seeds a dedicated database at each requested scale with generate_load_data,
+then drives every route registered on the DefaultRouter (list, detail and
+each @action) in-process through Django's test client. Needs a local mongod
+(djongo's SQL translation cannot run against mongomock):
+
+    python benchmarks/bench_endpoints.py --scales 1000,100000,1000000 \\
+        --output results.json [--compare previous.json]
+
+Results are written as JSON keyed by scale and route so runs from different
+commits can be diffed with --compare.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from octofit_tracker.db import get_db  # noqa: E402
+from octofit_tracker.urls import router  # noqa: E402
+
+ACTIVITIES_PER_USER = 10
+
+# Query parameters for routes that require them, built from sample documents.
+PARAMS = {
+    'user-by-team': lambda s: {'team_id': s['team_id']},
+    'activity-by-user': lambda s: {'user_id': s['username']},
+    'activity-by-type': lambda s: {'type': 'running'},
+    'activity-summary': lambda s: {'group_by': 'type,month'},
+    'workout-by-type': lambda s: {'type': 'cardio'},
+    'workout-by-difficulty': lambda s: {'difficulty': 'medium'},
+    'leaderboard-top': lambda s: {'limit': 10},
+    'activity-export': lambda s: {'format': 'csv', 'user_id': s['username']},
+    # Every generated activity's notes read "Synthetic session <type>".
+    'search-list': lambda s: {'q': 'session running'},
+}
+
+
+def _activity(sample):
+    return {
+        'user_id': sample['username'],
+        'type': 'running',
+        'duration_minutes': 30,
+        'distance_km': 5.0,
+        'points': 80,
+        'date': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+# Request bodies for write routes; write routes without one are skipped.
+PAYLOADS = {
+    ('activity-list', 'post'): _activity,
+    ('activity-bulk', 'post'): lambda s: [_activity(s) for _ in range(100)],
+}
+
+
+def discover_routes():
+    """Yield (route_name, method, detail) for every route on the router"""
+    for _prefix, viewset, basename in router.registry:
+        yield f'{basename}-list', 'get', False
+        if hasattr(viewset, 'create'):
+            yield f'{basename}-list', 'post', False
+        yield f'{basename}-detail', 'get', True
+        for method, handler in [('put', 'update'), ('patch', 'partial_update'),
+                                ('delete', 'destroy')]:
+            if hasattr(viewset, handler):
+                yield f'{basename}-detail', method, True
+        for action in viewset.get_extra_actions():
+            for method in sorted(action.mapping):
+                yield f'{basename}-{action.url_name}', method, action.detail
+
+
+def seed(scale, seed_value):
+    """Load a dataset with roughly ``scale`` activities and return samples"""
+    users = max(1, scale // ACTIVITIES_PER_USER)
+    call_command(
+        'generate_load_data', users=users, teams=max(2, users // 1000),
+        activities_per_user=ACTIVITIES_PER_USER, seed=seed_value,
+        end_date='2024-12-31', verbosity=0, stdout=io.StringIO(),
+    )
+    db = get_db()
+    db.workouts.delete_many({})
+    db.workouts.insert_many([
+        {
+            'name': f'Workout {i}', 'description': 'Benchmark workout',
+            'type': ['cardio', 'strength', 'flexibility'][i % 3],
+            'duration_minutes': 30, 'difficulty': ['easy', 'medium', 'hard'][i % 3],
+            'exercises': ['squats', 'lunges'], 'created_at': datetime.now(timezone.utc),
+        }
+        for i in range(30)
+    ])
+    user = db.users.find_one({}, {'username': 1, 'team_id': 1})
+    return {
+        'username': user['username'],
+        'team_id': user['team_id'],
+        'pk': {
+            'user': str(user['_id']),
+            'team': user['team_id'],
+            'activity': str(db.activities.find_one({}, {'_id': 1})['_id']),
+            'workout': str(db.workouts.find_one({}, {'_id': 1})['_id']),
+            'leaderboard': str(db.leaderboard.find_one({}, {'_id': 1})['_id']),
+        },
+    }
+
+
+def build_request(route, method, detail, sample):
+    """Return (path, params, body) for a route, or None if it cannot be driven"""
+    basename = route.split('-', 1)[0]
+    args = [sample['pk'][basename]] if detail else []
+    path = reverse(route, args=args)
+    params = PARAMS.get(route, lambda s: {})(sample)
+    body = None
+    if method != 'get':
+        factory = PAYLOADS.get((route, method))
+        if factory is None:
+            return None
+        body = factory(sample)
+    return path, params, body
+
+
+def call(client, method, path, params, body):
+    if method == 'get':
+        response = client.get(path, params)
+    else:
+        response = getattr(client, method)(path, data=json.dumps(body),
+                                           content_type='application/json')
+    if response.streaming:
+        # Streamed bodies are produced as they are read, so read them whole.
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(method, path, params, body, requests, warmup, concurrency):
+    client = Client(HTTP_HOST='localhost')
+    for _ in range(warmup):
+        response = call(client, method, path, params, body)
+    if warmup and response.status_code >= 500:
+        return {'error': f'HTTP {response.status_code}'}
+
+    latencies = []
+    statuses = set()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = call(client, method, path, params, body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses.add(response.status_code)
+
+    def worker(count):
+        worker_client = Client(HTTP_HOST='localhost')
+        for _ in range(count):
+            call(worker_client, method, path, params, body)
+
+    per_worker = max(1, requests // concurrency)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, [per_worker] * concurrency))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'status': sorted(statuses),
+        'requests': requests,
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'p50_ms': round(quantiles[49], 3),
+        'p90_ms': round(quantiles[89], 3),
+        'p99_ms': round(quantiles[98], 3),
+        'max_ms': round(latencies[-1], 3),
+        'throughput_rps': round(per_worker * concurrency / elapsed, 1),
+        'concurrency': concurrency,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text())['scales']
+    print(f'\nChange in p50 vs {baseline_path}:')
+    for scale, routes in results.items():
+        for key, stats in routes.items():
+            before = baseline.get(scale, {}).get(key)
+            if not before or 'p50_ms' not in before or 'p50_ms' not in stats:
+                continue
+            change = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+            flag = '  <-- regression' if change > 10 else ''
+            print(f'  {scale:>9} {key:<36} {before["p50_ms"]:>9.2f} -> '
+                  f'{stats["p50_ms"]:>9.2f} ms ({change:+.1f}%){flag}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', default='1000,100000,1000000',
+                        help='Comma-separated activity counts to seed')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default='octofit_bench',
+                        help='Scratch database to seed; it is dropped and reloaded')
+    parser.add_argument('--cold-leaderboard', action='store_true',
+                        help='Disable the leaderboard response cache')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--compare', help='Previous JSON results to diff against')
+    args = parser.parse_args()
+
+    if args.database == 'octofit_db':
+        parser.error('refusing to seed the application database')
+    settings.DATABASES['default']['NAME'] = args.database
+    if args.cold_leaderboard:
+        settings.LEADERBOARD_CACHE_TTL = 0
+
+    routes = list(discover_routes())
+    results = {}
+    for scale in [int(value) for value in args.scales.split(',')]:
+        print(f'\nSeeding {scale:,} activities into {args.database}...')
+        sample = seed(scale, args.seed)
+        results[str(scale)] = scale_results = {}
+        print(f'{"route":<36}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"req/s":>10}')
+        for route, method, detail in routes:
+            key = f'{method.upper()} {route}'
+            request = build_request(route, method, detail, sample)
+            if request is None:
+                scale_results[key] = {'skipped': 'no payload defined'}
+                continue
+            stats = measure(method, *request, args.requests, args.warmup,
+                            args.concurrency)
+            scale_results[key] = stats
+            if 'error' in stats:
+                print(f'{key:<36}{stats["error"]:>40}')
+            else:
+                print(f'{key:<36}{stats["p50_ms"]:>10.2f}{stats["p90_ms"]:>10.2f}'
+                      f'{stats["p99_ms"]:>10.2f}{stats["throughput_rps"]:>10.1f}')
+
+    document = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'settings': {key: value for key, value in vars(args).items()
+                     if key not in ('output', 'compare')},
+        'scales': results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2))
+        print(f'\nResults written to {args.output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
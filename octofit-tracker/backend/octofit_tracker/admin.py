@@ -1,54 +1,83 @@
 from django.contrib import admin
+from django.db.models import Q
+from . import repository
+from .changelist import FacetFilter, ScalableAdmin
 from .models import User, Team, Activity, Workout, Leaderboard
 
 
+class TextSearchAdmin(ScalableAdmin):
+    """
+    Answer the changelist search box from the collection's text index
+    (``Model.text_index``) instead of djongo's unanchored regex scans.
+    ``exact_search_fields`` also match the whole search term by equality.
+    """
+    exact_search_fields = []
+    text_search_limit = 1000
+    
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        ids = repository.text_search_ids(self.model, search_term, self.text_search_limit)
+        condition = Q(pk__in=ids)
+        for field in self.exact_search_fields:
+            condition |= Q(**{field: search_term})
+        return queryset.filter(condition), False
+
+
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(ScalableAdmin):
     """Admin interface for User model"""
     list_display = ['username', 'full_name', 'email', 'team_id', 'role', 'created_at']
-    list_filter = ['team_id', 'role', 'created_at']
+    list_filter = [('team_id', FacetFilter), ('role', FacetFilter), 'created_at']
+    sortable_by = ['username', 'email', 'created_at']
     search_fields = ['username', 'full_name', 'email']
     readonly_fields = ['created_at']
     ordering = ['-created_at']
 
 
 @admin.register(Team)
-class TeamAdmin(admin.ModelAdmin):
+class TeamAdmin(ScalableAdmin):
     """Admin interface for Team model"""
     list_display = ['_id', 'name', 'description', 'created_at']
+    sortable_by = ['_id', 'name', 'created_at']
     search_fields = ['name', 'description']
     readonly_fields = ['created_at']
     ordering = ['name']
 
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(TextSearchAdmin):
     """Admin interface for Activity model"""
     list_display = ['user_id', 'type', 'duration_minutes', 'distance_km', 'points', 'date', 'created_at']
-    list_filter = ['type', 'date', 'created_at']
+    list_filter = [('type', FacetFilter), 'date']
+    sortable_by = ['date']
     search_fields = ['user_id', 'type', 'notes']
+    exact_search_fields = ['user_id', 'type']
     readonly_fields = ['created_at']
     ordering = ['-date']
 
 
 @admin.register(Workout)
-class WorkoutAdmin(admin.ModelAdmin):
+class WorkoutAdmin(TextSearchAdmin):
     """Admin interface for Workout model"""
     list_display = ['name', 'type', 'duration_minutes', 'difficulty', 'created_at']
-    list_filter = ['type', 'difficulty', 'created_at']
+    list_filter = [('type', FacetFilter), ('difficulty', FacetFilter), 'created_at']
+    sortable_by = ['name', 'type', 'difficulty', 'created_at']
     search_fields = ['name', 'description']
     readonly_fields = ['created_at']
     ordering = ['name']
 
 
 @admin.register(Leaderboard)
-class LeaderboardAdmin(admin.ModelAdmin):
+class LeaderboardAdmin(ScalableAdmin):
     """Admin interface for Leaderboard model"""
-    list_display = ['rank', 'type', 'get_name', 'points', 'updated_at']
-    list_filter = ['type', 'updated_at']
+    list_display = ['type', 'get_name', 'points', 'updated_at']
+    list_filter = [('type', FacetFilter), 'updated_at']
+    sortable_by = ['points', 'updated_at']
     search_fields = ['full_name', 'team_name', 'user_id', 'team_id']
     readonly_fields = ['updated_at']
-    ordering = ['rank']
+    ordering = ['-points']
     
     def get_name(self, obj):
         """Return the appropriate name based on type"""
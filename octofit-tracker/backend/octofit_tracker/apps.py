@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class OctofitTrackerConfig(AppConfig):
+    name = 'octofit_tracker'
+
+    def ready(self):
+        # Register the MongoDB command listener before any client is created.
+        from . import instrumentation  # noqa: F401
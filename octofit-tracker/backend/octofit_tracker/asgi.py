@@ -2,6 +2,10 @@
 ASGI config for octofit_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``uvicorn octofit_tracker.asgi:application`` to run the
+``/api/async/`` read endpoints natively on the event loop. The live
+leaderboard stream (``live.STREAM_PATH``) is served here directly rather
+than through Django, whose 4.1 ASGI handler cannot stream from a coroutine.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +17,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from octofit_tracker.live import STREAM_PATH, leaderboard_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        return await leaderboard_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
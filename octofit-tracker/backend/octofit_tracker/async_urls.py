@@ -0,0 +1,35 @@
+"""URL routes for the async read endpoints, mounted under ``api/async/``"""
+from django.urls import path
+
+from . import async_views as views
+
+urlpatterns = [
+    path('users/', views.user_list, name='async-user-list'),
+    path('users/by_team/', views.user_by_team, name='async-user-by-team'),
+    path('users/<str:pk>/', views.user_detail, name='async-user-detail'),
+    path('users/<str:pk>/activities/', views.user_activities, name='async-user-activities'),
+    path('users/<str:pk>/profile/', views.user_profile, name='async-user-profile'),
+    path('users/<str:pk>/history/', views.user_history, name='async-user-history'),
+    path('teams/', views.team_list, name='async-team-list'),
+    path('teams/<str:pk>/', views.team_detail, name='async-team-detail'),
+    path('teams/<str:pk>/members/', views.team_members, name='async-team-members'),
+    path('teams/<str:pk>/history/', views.team_history, name='async-team-history'),
+    path('teams/<str:pk>/leaderboard/', views.team_leaderboard,
+         name='async-team-leaderboard'),
+    path('activities/', views.activity_list, name='async-activity-list'),
+    path('activities/by_user/', views.activity_by_user, name='async-activity-by-user'),
+    path('activities/by_type/', views.activity_by_type, name='async-activity-by-type'),
+    path('activities/summary/', views.activity_summary, name='async-activity-summary'),
+    path('activities/<str:pk>/', views.activity_detail, name='async-activity-detail'),
+    path('workouts/', views.workout_list, name='async-workout-list'),
+    path('workouts/by_type/', views.workout_by_type, name='async-workout-by-type'),
+    path('workouts/by_difficulty/', views.workout_by_difficulty,
+         name='async-workout-by-difficulty'),
+    path('workouts/<str:pk>/', views.workout_detail, name='async-workout-detail'),
+    path('leaderboard/', views.leaderboard_list, name='async-leaderboard-list'),
+    path('leaderboard/individual/', views.leaderboard_individual,
+         name='async-leaderboard-individual'),
+    path('leaderboard/team/', views.leaderboard_team, name='async-leaderboard-team'),
+    path('leaderboard/top/', views.leaderboard_top, name='async-leaderboard-top'),
+    path('leaderboard/<str:pk>/', views.leaderboard_detail, name='async-leaderboard-detail'),
+]
@@ -0,0 +1,415 @@
+"""
+Async versions of the read endpoints, mounted under ``/api/async/``.
+
+Each view mirrors the GET route of the same name on the DRF viewsets and
+returns the same JSON, but awaits MongoDB through the Motor client from
+``db.get_async_db`` instead of holding a worker thread per round trip.
+Served by the ASGI application (``uvicorn octofit_tracker.asgi:application``)
+a single worker can keep many requests in flight at once. Paginated lists
+use ``pagination.apaginate``, whose cursors are interchangeable with the
+sync endpoints'. ``?fields=`` and ``?omit=`` select fields as they do there.
+Writes stay on the DRF viewsets.
+"""
+import functools
+
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from . import repository, sync
+from .cache import board_validators, cache_key, cached_response, leaderboard_cache
+from .instrumentation import timed
+from .leaderboard import awindowed_leaderboard
+from .models import User, Team, Activity, Workout, Leaderboard
+from .pagination import (
+    ActivityCursorPagination, UserCursorPagination, LeaderboardCursorPagination,
+    apaginate,
+)
+from .rollups import WINDOWS, window_start
+from .serializers import (
+    UserSerializer, TeamSerializer, ActivitySerializer, WorkoutSerializer,
+    LeaderboardSerializer, read_plan, serialize_teams,
+)
+from .views import (
+    history_response, parse_fieldset, parse_history_params, parse_summary_params,
+    parse_top_params, select_keys,
+)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json',
+                        status=status_code)
+
+
+def error(message, status_code=status.HTTP_400_BAD_REQUEST):
+    return json_response({'error': message}, status_code)
+
+
+def not_found():
+    return json_response({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+
+
+def async_get(view):
+    """
+    Allow only GET/HEAD, and answer a bad pagination cursor with 404 and a
+    bad fieldset with 400
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        try:
+            return await view(request, *args, **kwargs)
+        except NotFound as exc:
+            return json_response({'detail': exc.detail}, status.HTTP_404_NOT_FOUND)
+        except ValidationError as exc:
+            return json_response(exc.detail, status.HTTP_400_BAD_REQUEST)
+    return wrapper
+
+
+def fieldset(request, serializer_class, extra=()):
+    """The request's ``fields``/``omit`` selection, as in CompiledReadMixin"""
+    names = read_plan(serializer_class).names
+    try:
+        return parse_fieldset(request.GET, [*names, *extra])
+    except ValueError as exc:
+        raise ValidationError({'error': str(exc)})
+
+
+def serializer(serializer_class, fields=None):
+    serialize_documents = read_plan(serializer_class, fields).serialize_documents
+
+    def serialize(documents):
+        with timed('serialize'):
+            return serialize_documents(documents)
+    return serialize
+
+
+def select(request, serializer_class, query, pagination_class=None):
+    """Project ``query`` to the request's fieldset; return it and its serializer"""
+    fields = fieldset(request, serializer_class)
+    if fields is not None:
+        ordering = [name.lstrip('-') for name in getattr(pagination_class, 'ordering', ())]
+        query = query.only('_id', *ordering, *read_plan(serializer_class, fields).sources)
+    return query, serializer(serializer_class, fields)
+
+
+async def paginated(request, query, pagination_class, serializer_class):
+    query, serialize = select(request, serializer_class, query, pagination_class)
+    return await apaginate(request, query, pagination_class, serialize)
+
+
+async def delta(request, model, serializer_class):
+    """Async counterpart of CompiledReadMixin.delta"""
+    try:
+        positions = sync.parse_since(request.GET['since'])
+    except ValueError as exc:
+        return error(str(exc))
+    if sync.expired(positions):
+        return error(sync.EXPIRED_MESSAGE, status.HTTP_410_GONE)
+    fields = fieldset(request, serializer_class)
+    documents, deleted, token, more = await sync.achanges(
+        model, positions, read_plan(serializer_class, fields).columns
+    )
+    return json_response({'results': serializer(serializer_class, fields)(documents),
+                          'deleted': deleted, 'token': token, 'more': more})
+
+
+async def detail(request, model, serializer_class, pk):
+    plan = read_plan(serializer_class, fieldset(request, serializer_class))
+    document = await repository.afind(model, pk, ['_id', *plan.columns])
+    if document is None:
+        return not_found()
+    return json_response(plan.serialize_document(document))
+
+
+# Users
+
+@async_get
+async def user_list(request):
+    if 'since' in request.GET:
+        return await delta(request, User, UserSerializer)
+    return json_response(await paginated(
+        request, repository.users(), UserCursorPagination, UserSerializer,
+    ))
+
+
+@async_get
+async def user_detail(request, pk):
+    return await detail(request, User, UserSerializer, pk)
+
+
+@async_get
+async def user_by_team(request):
+    team_id = request.GET.get('team_id')
+    if not team_id:
+        return error('team_id parameter required')
+    return json_response(await paginated(
+        request, repository.users(team_id=team_id), UserCursorPagination, UserSerializer,
+    ))
+
+
+@async_get
+async def user_activities(request, pk):
+    user = await repository.afind(User, pk, ['username'])
+    if user is None:
+        return not_found()
+    return json_response(await paginated(
+        request, repository.activities(user_id=user['username']),
+        ActivityCursorPagination, ActivitySerializer,
+    ))
+
+
+@async_get
+async def user_profile(request, pk):
+    fields = fieldset(request, UserSerializer, extra=['recent_activities'])
+    plan = read_plan(UserSerializer, fields)
+    recent = fields is None or 'recent_activities' in fields
+    columns = ['_id', *plan.columns] + (['recent_activities'] if recent else [])
+    user = await repository.afind(User, pk, columns)
+    if user is None:
+        return not_found()
+    with timed('serialize'):
+        data = plan.serialize_document(user)
+        if recent:
+            data['recent_activities'] = read_plan(ActivitySerializer).serialize_documents(
+                user.get('recent_activities', [])
+            )
+    return json_response(data)
+
+
+@async_get
+async def user_history(request, pk):
+    user = await repository.afind(User, pk, ['username'])
+    if user is None:
+        return not_found()
+    try:
+        granularity, start, end = parse_history_params(request.GET)
+    except ValueError as exc:
+        return error(str(exc))
+    buckets = await repository.ahistory_buckets('user', user['username'], start, end)
+    return json_response(history_response(granularity, start, end, buckets))
+
+
+# Teams
+
+async def read_teams(request, pk=None):
+    """Async counterpart of TeamViewSet.read_teams"""
+    fields = fieldset(request, TeamSerializer, extra=['roster', 'stats'])
+    documents = await repository.ateams(
+        pk, read_plan(TeamSerializer, fields).columns,
+        roster=fields is None or 'roster' in fields,
+        stats=fields is None or 'stats' in fields,
+    )
+    with timed('serialize'):
+        return serialize_teams(documents, fields)
+
+
+@async_get
+async def team_list(request):
+    return json_response(await read_teams(request))
+
+
+@async_get
+async def team_detail(request, pk):
+    teams = await read_teams(request, pk)
+    if not teams:
+        return not_found()
+    return json_response(teams[0])
+
+
+@async_get
+async def team_members(request, pk):
+    if await repository.afind(Team, pk, ['_id']) is None:
+        return not_found()
+    users, serialize = select(request, UserSerializer, repository.users(team_id=pk))
+    return json_response(serialize(await users.alist()))
+
+
+@async_get
+async def team_history(request, pk):
+    if await repository.afind(Team, pk, ['_id']) is None:
+        return not_found()
+    try:
+        granularity, start, end = parse_history_params(request.GET)
+    except ValueError as exc:
+        return error(str(exc))
+    buckets = await repository.ahistory_buckets('team', pk, start, end)
+    return json_response(history_response(granularity, start, end, buckets))
+
+
+@async_get
+async def team_leaderboard(request, pk):
+    if await repository.afind(Team, pk, ['_id']) is None:
+        return not_found()
+    entries, serialize = select(
+        request, LeaderboardSerializer, repository.leaderboard('team').filter(team_id=pk)
+    )
+    entries = await entries.alist(1)
+    if not entries:
+        return error('Leaderboard entry not found', status.HTTP_404_NOT_FOUND)
+    return json_response(serialize(entries)[0])
+
+
+# Activities
+
+@async_get
+async def activity_list(request):
+    if 'since' in request.GET:
+        return await delta(request, Activity, ActivitySerializer)
+    return json_response(await paginated(
+        request, repository.activities(), ActivityCursorPagination, ActivitySerializer,
+    ))
+
+
+@async_get
+async def activity_detail(request, pk):
+    return await detail(request, Activity, ActivitySerializer, pk)
+
+
+@async_get
+async def activity_by_user(request):
+    user_id = request.GET.get('user_id')
+    if not user_id:
+        return error('user_id parameter required')
+    return json_response(await paginated(
+        request, repository.activities(user_id=user_id), ActivityCursorPagination,
+        ActivitySerializer,
+    ))
+
+
+@async_get
+async def activity_by_type(request):
+    activity_type = request.GET.get('type')
+    if not activity_type:
+        return error('type parameter required')
+    return json_response(await paginated(
+        request, repository.activities(type=activity_type), ActivityCursorPagination,
+        ActivitySerializer,
+    ))
+
+
+@async_get
+async def activity_summary(request):
+    try:
+        group_by, date_from, date_to = parse_summary_params(request.GET)
+    except ValueError as exc:
+        return error(str(exc))
+    return json_response(await repository.aactivity_summary(group_by, date_from, date_to))
+
+
+# Workouts
+
+@async_get
+async def workout_list(request):
+    workouts, serialize = select(request, WorkoutSerializer, repository.workouts())
+    return json_response(serialize(await workouts.alist()))
+
+
+@async_get
+async def workout_detail(request, pk):
+    return await detail(request, Workout, WorkoutSerializer, pk)
+
+
+@async_get
+async def workout_by_type(request):
+    workout_type = request.GET.get('type')
+    if not workout_type:
+        return error('type parameter required')
+    workouts, serialize = select(
+        request, WorkoutSerializer, repository.workouts(type=workout_type)
+    )
+    return json_response(serialize(await workouts.alist()))
+
+
+@async_get
+async def workout_by_difficulty(request):
+    difficulty = request.GET.get('difficulty')
+    if not difficulty:
+        return error('difficulty parameter required')
+    workouts, serialize = select(
+        request, WorkoutSerializer, repository.workouts(difficulty=difficulty)
+    )
+    return json_response(serialize(await workouts.alist()))
+
+
+# Leaderboard
+
+async def cached_board(request, board_type, build, etag_extra='', windowed=False, fields=None):
+    """Async counterpart of LeaderboardViewSet.cached_board"""
+    key = cache_key(request, fields)
+    cached = leaderboard_cache.get(key)
+    if cached is None:
+        version = leaderboard_cache.version
+        updated_at, count = await repository.aleaderboard_version(board_type)
+        if windowed:
+            updated_at = max(filter(None, [updated_at, await repository.abuckets_version(board_type)]),
+                             default=None)
+        etag, last_modified = board_validators(board_type, updated_at, count, etag_extra, fields)
+        body = JSONRenderer().render(await build())
+        cached = leaderboard_cache.set(key, body, etag, last_modified, version)
+    return cached_response(request, cached)
+
+
+@async_get
+async def leaderboard_list(request):
+    if 'since' in request.GET:
+        return await delta(request, Leaderboard, LeaderboardSerializer)
+    return json_response(await paginated(
+        request, repository.leaderboard(), LeaderboardCursorPagination, LeaderboardSerializer,
+    ))
+
+
+@async_get
+async def leaderboard_detail(request, pk):
+    plan = read_plan(LeaderboardSerializer, fieldset(request, LeaderboardSerializer))
+    entry = await repository.afind_entry(pk, plan.columns)
+    if entry is None:
+        return not_found()
+    return json_response(plan.serialize_document(entry))
+
+
+def _board(board_type):
+    @async_get
+    async def view(request):
+        return await cached_board(request, board_type, lambda: paginated(
+            request, repository.leaderboard(board_type), LeaderboardCursorPagination,
+            LeaderboardSerializer,
+        ), fields=fieldset(request, LeaderboardSerializer))
+    view.__name__ = f'leaderboard_{board_type}'
+    return view
+
+
+leaderboard_individual = _board('individual')
+leaderboard_team = _board('team')
+
+
+@async_get
+async def leaderboard_top(request):
+    try:
+        board_type, limit = parse_top_params(request.GET)
+    except ValueError as exc:
+        return error(str(exc))
+    window = request.GET.get('window')
+    if window:
+        if window not in WINDOWS:
+            return error(f'window must be one of {", ".join(WINDOWS)}')
+        start = window_start(window)
+        fields = fieldset(request, LeaderboardSerializer, extra=['window', 'window_start'])
+
+        async def build_window():
+            return select_keys(await awindowed_leaderboard(board_type, window, limit), fields)
+        return await cached_board(
+            request, board_type, build_window,
+            etag_extra=f'-{window}-{start:%Y%m%d}', windowed=True, fields=fields,
+        )
+
+    entries, serialize = select(
+        request, LeaderboardSerializer, repository.leaderboard(board_type)
+    )
+
+    async def build():
+        return serialize(await entries.alist(limit))
+    return await cached_board(request, board_type, build,
+                              fields=fieldset(request, LeaderboardSerializer))
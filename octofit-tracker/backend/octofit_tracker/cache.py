@@ -0,0 +1,119 @@
+"""
+In-process cache of rendered leaderboard responses.
+
+Entries hold the rendered JSON bytes plus the ETag and Last-Modified derived
+from the board's newest ``updated_at``, so a hit is answered (or turned into
+a 304) without touching MongoDB. Both the cache key and the ETag carry the
+request's normalized ``?fields=``/``?omit=`` selection, so one projection is
+never served or validated for another. Every Leaderboard or Activity write in this
+process bumps the cache version; ``LEADERBOARD_CACHE_TTL`` bounds how long a
+worker can serve a board changed by another process.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Activity, Leaderboard
+
+CachedResponse = namedtuple('CachedResponse', 'body etag last_modified')
+
+
+class LeaderboardCache:
+    """Thread-safe, versioned LRU of rendered leaderboard responses"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'LEADERBOARD_CACHE_TTL', 30)
+
+    def get(self, key):
+        """Return the CachedResponse for key, or None if missing or stale"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            version, expires, response = item
+            if version != self.version or expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key, body, etag, last_modified, version):
+        """
+        Store a rendered response built while the cache was at ``version``.
+
+        Responses built before an invalidation are dropped rather than stored.
+        """
+        response = CachedResponse(body, etag, last_modified)
+        with self._lock:
+            if version != self.version:
+                return response
+            self._entries[key] = (version, time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+    def invalidate(self):
+        """Drop every cached response"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+
+leaderboard_cache = LeaderboardCache()
+
+
+def fieldset_suffix(fields):
+    """Cache-key and ETag suffix for a sparse fieldset; empty for every field"""
+    if fields is None:
+        return ''
+    return '-f' + hashlib.md5(','.join(sorted(fields)).encode()).hexdigest()[:12]
+
+
+def cache_key(request, fields):
+    """The request's URL with ``fields``/``omit`` replaced by the selection they make"""
+    params = request.GET.copy()
+    for name in ('fields', 'omit'):
+        params.pop(name, None)
+    return f'{request.build_absolute_uri(request.path)}?{params.urlencode()}{fieldset_suffix(fields)}'
+
+
+def board_validators(board_type, updated_at, count, etag_extra='', fields=None):
+    """Return (etag, last_modified) for a board's newest updated_at, size and fieldset"""
+    last_modified = int(updated_at.timestamp()) if updated_at else None
+    micros = int(updated_at.timestamp() * 1e6) if updated_at else 0
+    return (f'"{board_type}-{micros}-{count}{etag_extra}{fieldset_suffix(fields)}"',
+            last_modified)
+
+
+def cached_response(request, cached):
+    """Turn a CachedResponse into a 200, or a 304 if the request's validators match"""
+    response = HttpResponse(cached.body, content_type='application/json')
+    response['ETag'] = cached.etag
+    if cached.last_modified is not None:
+        response['Last-Modified'] = http_date(cached.last_modified)
+    return get_conditional_response(
+        request, etag=cached.etag, last_modified=cached.last_modified,
+        response=response,
+    )
+
+
+@receiver([post_save, post_delete], sender=Leaderboard)
+@receiver([post_save, post_delete], sender=Activity)
+def invalidate_leaderboard_cache(sender, **kwargs):
+    leaderboard_cache.invalidate()
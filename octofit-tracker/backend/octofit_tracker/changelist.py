@@ -0,0 +1,205 @@
+"""
+Admin changelists that stay fast on large collections.
+
+Django's changelist counts the filtered rows and the whole table on every
+page load, pages with OFFSET and builds each list filter from a DISTINCT
+over the queryset; through djongo each of those is a collection scan.
+``ScalableAdmin`` replaces them:
+
+* ``EstimatedCountPaginator`` reads an unfiltered count from the
+  collection's metadata and counts a filtered one only up to
+  ``ADMIN_COUNT_LIMIT`` rows, shown as "N+".
+* ``FacetFilter`` offers the values of a field from ``distinct`` on the
+  collection, which walks the index when the field leads one, cached for
+  ``ADMIN_FACET_TTL`` seconds.
+* ``KeysetChangeList`` pages with ``?after=``/``?before=`` positions in the
+  ordering instead of ``?p=``, so every page costs one indexed range read
+  however deep it is. Orderings on nullable fields, and changelists with
+  ``list_editable``, keep Django's numbered pages.
+"""
+import base64
+import binascii
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .db import get_db
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+_facets = {}
+_facets_lock = threading.Lock()
+
+
+def facet_values(model, field_name):
+    """Sorted distinct values of a field, cached for ADMIN_FACET_TTL seconds"""
+    column = model._meta.get_field(field_name).column
+    key = (connection.settings_dict['NAME'], model._meta.db_table, column)
+    with _facets_lock:
+        cached = _facets.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    values = get_db()[model._meta.db_table].distinct(column)
+    values = sorted(values, key=lambda value: (value is None, str(value)))
+    with _facets_lock:
+        _facets[key] = (time.monotonic() + settings.ADMIN_FACET_TTL, values)
+    return values
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count never scans the collection. ``capped`` is set when
+    a filtered count stopped at ADMIN_COUNT_LIMIT.
+    """
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return get_db()[queryset.model._meta.db_table].estimated_document_count()
+        limit = settings.ADMIN_COUNT_LIMIT
+        found = len(queryset.order_by().values_list('pk', flat=True)[:limit + 1])
+        self.capped = found > limit
+        return min(found, limit)
+
+
+class FacetFilter(admin.AllValuesFieldListFilter):
+    """AllValuesFieldListFilter whose choices come from ``facet_values``"""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.lookup_choices = facet_values(model, field_path)
+
+
+def keyset_condition(ordering, values):
+    """Q for the rows that come after ``values`` in ``ordering``"""
+    condition = Q()
+    equal = {}
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{field}__{lookup}': value})
+        equal[field] = value
+    return condition
+
+
+def reverse_ordering(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList that pages by position in its ordering rather than by offset"""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for name in (AFTER_VAR, BEFORE_VAR):
+            lookup_params.pop(name, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, sort and search links start again from the first page.
+        new_params = new_params or {}
+        remove = [*(remove or []),
+                  *(name for name in (AFTER_VAR, BEFORE_VAR) if name not in new_params)]
+        return super().get_query_string(new_params, remove)
+
+    def keyset_ordering(self):
+        """
+        {ordering term: field} of the queryset's ordering, without repeated
+        fields, or None if it cannot be paged by keyset
+        """
+        if self.list_editable:
+            return None
+        ordering = {}
+        for name in self.queryset.query.order_by:
+            if not isinstance(name, str):
+                return None
+            try:
+                field = (self.opts.pk if name.lstrip('-') == 'pk'
+                         else self.opts.get_field(name.lstrip('-')))
+            except FieldDoesNotExist:
+                return None
+            if field.null or field.is_relation:
+                return None
+            if field not in ordering.values():
+                ordering[name] = field
+        return ordering or None
+
+    def encode_position(self, obj):
+        values = [field.value_to_string(obj) for field in self.keyset.values()]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_position(self, value):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(value.encode()))
+            if not isinstance(values, list) or len(values) != len(self.keyset):
+                raise ValueError
+            return [field.to_python(item) for field, item in zip(self.keyset.values(), values)]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            raise IncorrectLookupParameters
+
+    def get_results(self, request):
+        self.keyset = self.keyset_ordering()
+        if self.keyset is None:
+            return super().get_results(request)
+        ordering = list(self.keyset)
+        per_page = self.list_per_page
+        queryset = self.queryset
+        if BEFORE_VAR in request.GET:
+            before = self.decode_position(request.GET[BEFORE_VAR])
+            backwards = reverse_ordering(ordering)
+            rows = list(queryset.filter(keyset_condition(backwards, before))
+                        .order_by(*backwards)[:per_page + 1])
+            has_previous, has_next = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+        else:
+            if AFTER_VAR in request.GET:
+                after = self.decode_position(request.GET[AFTER_VAR])
+                queryset = queryset.filter(keyset_condition(ordering, after))
+            rows = list(queryset.order_by(*ordering)[:per_page + 1])
+            has_previous, has_next = AFTER_VAR in request.GET, len(rows) > per_page
+            rows = rows[:per_page]
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, per_page)
+        self.result_count = paginator.count
+        self.count_capped = paginator.capped
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = (self.root_queryset.count()
+                                  if self.show_full_result_count else None)
+        self.show_admin_actions = not self.show_full_result_count or bool(
+            self.full_result_count
+        )
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_previous or has_next
+        self.paginator = paginator
+        self.first_url = self.get_query_string() if has_previous else None
+        self.previous_url = (self.get_query_string({BEFORE_VAR: self.encode_position(rows[0])})
+                             if has_previous and rows else None)
+        self.next_url = (self.get_query_string({AFTER_VAR: self.encode_position(rows[-1])})
+                         if has_next and rows else None)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin with estimated counts and keyset pages. Use ``FacetFilter``
+    in ``list_filter`` for fields with a handful of values, and keep
+    ``sortable_by`` to indexed columns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
@@ -0,0 +1,62 @@
+"""
+Raw MongoDB access for code paths that bypass the djongo ORM.
+
+A single MongoClient is shared by every thread in the process; pymongo
+pools sockets internally, so callers should use ``get_db()`` rather than
+opening their own clients. Async views use ``get_async_db()``, a Motor
+client with the same options, shared by everything on one event loop.
+"""
+import asyncio
+import threading
+import weakref
+
+from django.db import connection
+from pymongo import MongoClient
+
+MAX_POOL_SIZE = 100
+
+_client = None
+_client_lock = threading.Lock()
+# Motor clients are bound to the loop they were created on.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _client_options():
+    options = dict(connection.settings_dict.get('CLIENT', {}))
+    options.setdefault('maxPoolSize', MAX_POOL_SIZE)
+    # Match the aware UTC datetimes the ORM returns with USE_TZ.
+    options.setdefault('tz_aware', True)
+    return options
+
+
+def get_client():
+    """Return the process-wide pooled MongoClient"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(**_client_options())
+    return _client
+
+
+def get_db():
+    """Return the pymongo Database for the default Django connection"""
+    # Read the name on each call so the test database is picked up.
+    return get_client()[connection.settings_dict['NAME']]
+
+
+def get_async_client():
+    """Return the pooled Motor client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        # Imported here so the sync path does not depend on Motor.
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(io_loop=loop, **_client_options())
+        _async_clients[loop] = client
+    return client
+
+
+def get_async_db():
+    """Return the Motor database for the default Django connection"""
+    return get_async_client()[connection.settings_dict['NAME']]
@@ -0,0 +1,61 @@
+"""
+Batched activity ingestion shared by the bulk endpoint and populate_db.
+"""
+from bson import ObjectId
+from django.utils import timezone
+from pymongo.errors import BulkWriteError
+
+from .db import get_db
+from .leaderboard import apply_activity_changes
+from .models import Activity
+from .recent import push_recent
+from .rollups import activity_writes
+
+
+def activity_document(data, now=None):
+    """Build an activities document from validated serializer data"""
+    now = now or timezone.now()
+    document = {'_id': ObjectId(), 'created_at': now, 'updated_at': now}
+    document.update(data)
+    for field in Activity._meta.concrete_fields:
+        document.setdefault(field.column, field.get_default())
+    return document
+
+
+def insert_activities(documents, db=None, update_leaderboard=True):
+    """
+    Insert activity documents and apply their stats in batched round trips.
+
+    The documents go in with one unordered ``insert_many``, so a bad
+    document does not stop the rest. The per-user and per-day totals of the
+    inserted ones, and their users' recent lists, are applied with one
+    ``bulk_write`` each. With ``update_leaderboard`` the leaderboards are
+    moved too, once per affected user. The inserts and bucket increments
+    are held off together while ``backfill_rollups`` runs.
+
+    Returns a dict mapping the index of each document that failed to insert
+    to its error message.
+    """
+    if not documents:
+        return {}
+    db = db if db is not None else get_db()
+    failures = {}
+    with activity_writes(db):
+        try:
+            db[Activity._meta.db_table].insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get('writeErrors', []):
+                failures[error['index']] = error.get('errmsg', 'write failed')
+
+        inserted = [document for index, document in enumerate(documents)
+                    if index not in failures]
+        apply_activity_changes(
+            (
+                (document['user_id'], document['date'], int(document.get('points') or 0), 1,
+                 document.get('duration_minutes') or 0, document.get('distance_km') or 0)
+                for document in inserted
+            ),
+            db=db, update_leaderboard=update_leaderboard,
+        )
+    push_recent(inserted, db=db)
+    return failures
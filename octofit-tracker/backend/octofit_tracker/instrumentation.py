@@ -0,0 +1,239 @@
+"""
+Per-request database and serialization timing.
+
+``DatabaseTimingMiddleware`` opens a ``RequestTimings`` for each request in
+a context variable. Three hooks feed it while the request runs:
+
+* a pymongo ``CommandListener`` counts every MongoDB command and its round
+  trip time, whether it came from djongo or from ``db.get_db()``;
+* an execute wrapper installed on every djongo connection times the SQL
+  translation, i.e. ``cursor.execute`` minus the round trips inside it;
+* ``timed('serialize')`` around the compiled serializers, and the
+  template-response render, time serialization and JSON rendering.
+
+The totals go out in a ``Server-Timing`` header. Requests slower than
+``SLOW_REQUEST_MS`` are logged to ``octofit_tracker.slow_requests`` as one
+JSON object that includes the shapes of the slowest commands. Commands that
+Motor runs on its executor threads do not inherit the request context and
+are not attributed.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from pymongo import monitoring
+
+logger = logging.getLogger('octofit_tracker.slow_requests')
+
+SLOWEST_COMMANDS = 3
+
+_current = contextvars.ContextVar('octofit_request_timings', default=None)
+
+
+class RequestTimings:
+    """Accumulated timings, in seconds, for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.db_commands = 0
+        self.sql_queries = 0
+        self.phases = {'translate': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.slowest = []
+        self._in_flight = {}
+
+    def command_started(self, event):
+        self._in_flight[event.request_id] = event.command
+
+    def command_finished(self, event):
+        command = self._in_flight.pop(event.request_id, None)
+        duration = event.duration_micros / 1e6
+        self.db_time += duration
+        self.db_commands += 1
+        if command is not None and (
+            len(self.slowest) < SLOWEST_COMMANDS or duration > self.slowest[-1][0]
+        ):
+            self.slowest.append((duration, event.command_name, command))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_COMMANDS:]
+
+    def add(self, phase, started, db_before):
+        """Add the time since ``started``, less any DB round trips, to a phase"""
+        elapsed = time.perf_counter() - started - (self.db_time - db_before)
+        self.phases[phase] += max(elapsed, 0.0)
+
+    def server_timing(self, total):
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_commands} commands"',
+            *(f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in self.phases.items()),
+            f'total;dur={total * 1000:.1f}',
+        ]
+        return ', '.join(metrics)
+
+    def slow_record(self, request, status, total):
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': status,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(self.db_time * 1000, 1),
+            'db_commands': self.db_commands,
+            'sql_queries': self.sql_queries,
+            **{f'{phase}_ms': round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            'slowest_commands': [
+                {
+                    'command': name,
+                    'collection': command.get(name),
+                    'duration_ms': round(duration * 1000, 1),
+                    'shape': command_shape(name, command),
+                }
+                for duration, name, command in self.slowest
+            ],
+        }
+
+
+def _shape(value):
+    """Replace literal values with '?' so queries group by structure"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and any(isinstance(item, dict) for item in value):
+        return [_shape(item) for item in value]
+    return '?'
+
+
+def command_shape(name, command):
+    """The query-bearing parts of a MongoDB command, with literals elided"""
+    parts = {
+        'find': ('filter', 'sort', 'projection'),
+        'aggregate': ('pipeline',),
+        'count': ('query',),
+        'distinct': ('key', 'query'),
+        'update': ('updates',),
+        'delete': ('deletes',),
+        'findAndModify': ('query', 'sort', 'update'),
+    }.get(name, ())
+    shape = {}
+    for part in parts:
+        if part not in command:
+            continue
+        if part in ('updates', 'deletes'):
+            shape[part] = [_shape(statement.get('q', {})) for statement in command[part]]
+        elif part == 'key':
+            shape[part] = command[part]
+        else:
+            shape[part] = _shape(command[part])
+    return shape
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Feed MongoDB command events to the current request's timings"""
+
+    def started(self, event):
+        timings = _current.get()
+        if timings is not None:
+            timings.command_started(event)
+
+    def succeeded(self, event):
+        timings = _current.get()
+        if timings is not None:
+            timings.command_finished(event)
+
+    def failed(self, event):
+        timings = _current.get()
+        if timings is not None:
+            timings.command_finished(event)
+
+
+# Listeners apply to clients created afterwards; the middleware imports this
+# module at startup, before any connection is opened.
+monitoring.register(CommandTimer())
+
+
+def _time_sql(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started, db_before = time.perf_counter(), timings.db_time
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sql_queries += 1
+        timings.add('translate', started, db_before)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if _time_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_sql)
+
+
+@contextmanager
+def timed(phase):
+    """Attribute the enclosed block, less DB round trips, to a phase"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started, db_before = time.perf_counter(), timings.db_time
+    try:
+        yield
+    finally:
+        timings.add(phase, started, db_before)
+
+
+class DatabaseTimingMiddleware:
+    """Emit Server-Timing and log slow requests; place first in MIDDLEWARE"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            # Mark the instance as a coroutine function, as MiddlewareMixin does.
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        timings = _current.get()
+        if timings is not None:
+            started, db_before = time.perf_counter(), timings.db_time
+            response.add_post_render_callback(
+                lambda rendered: timings.add('render', started, db_before)
+            )
+        return response
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        response['Server-Timing'] = timings.server_timing(total)
+        threshold = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        if threshold is not None and total * 1000 >= threshold:
+            logger.warning(json.dumps(
+                timings.slow_record(request, response.status_code, total), default=str
+            ))
+        return response
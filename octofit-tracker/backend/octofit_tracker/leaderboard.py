@@ -0,0 +1,329 @@
+"""
+Incremental leaderboard maintenance.
+
+Ranks use competition ranking: an entry's rank is one plus the number of
+entries on the same board with strictly more points. Ranks are not stored,
+since one write could change the rank of most of a crowded board. Instead
+``LeaderboardScore`` counts the entries at each points value of each board
+and reads derive ranks from it (see ``repository.with_ranks``), so a move
+is one atomic ``$inc`` on the entry and two on the counts of its old and
+new points. Moves do not take turns: concurrent ones on the same entry or
+board add up in MongoDB.
+
+``rebuild_leaderboard`` holds ``board_lock`` on both boards from its
+aggregation through its swap. Activity writes hold a shared lease on both
+(see ``locks``) from their User.stats ``$inc`` through their moves, so
+each lands wholly before the rebuild reads the stats or wholly after the
+rebuilt board is swapped in, and is neither lost nor counted twice.
+
+The counts move after the entries, so a read racing a write can see an
+entry's new points with the old counts, and ranks a step off, until its
+counts land. Entries saved through the ORM (the admin, fixtures) move the
+counts from ``post_save`` and ``post_delete``; ``rebuild_leaderboard``
+recounts them from scratch.
+
+Weekly, monthly and rolling 30-day boards are not stored; they are summed
+from the per-user and per-team daily buckets in ``rollups`` on read.
+"""
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .cache import leaderboard_cache
+from .db import get_async_db, get_db
+from .live import BOARD_TYPES, publish
+from .locks import exclusive_lock, shared_lock
+from .models import Leaderboard, LeaderboardScore, Team, User
+from .rollups import BOARD_BUCKETS, day_start, record_daily, window_start
+
+
+def _lock_name(board_type):
+    return f'leaderboard:{board_type}'
+
+
+def board_lock(db, board_type):
+    """Hold a board alone, waiting for the writes in flight to finish"""
+    return exclusive_lock(db, _lock_name(board_type))
+
+
+def board_writes(db):
+    """Shared lease on both boards for a write that moves entries"""
+    return shared_lock(db, [_lock_name(board_type) for board_type in BOARD_TYPES])
+
+
+def competition_ranks(entries):
+    """Assign competition ranks in place to entries sorted by points desc"""
+    previous_points = None
+    rank = 0
+    for position, entry in enumerate(entries, start=1):
+        if entry['points'] != previous_points:
+            rank = position
+            previous_points = entry['points']
+        entry['rank'] = rank
+    return entries
+
+
+def score_id(board_type, points):
+    return f'{board_type}|{points}'
+
+
+def count_scores(db, moves):
+    """
+    Apply {(board_type, points): count delta} to ``LeaderboardScore`` in
+    one bulk_write and drop the scores no entry has any more.
+    """
+    requests, emptied = [], []
+    for (board_type, points), delta in moves.items():
+        if delta > 0:
+            requests.append(UpdateOne(
+                {'_id': score_id(board_type, points)},
+                {'$inc': {'count': delta},
+                 '$setOnInsert': {'type': board_type, 'points': points}},
+                upsert=True,
+            ))
+        elif delta < 0:
+            emptied.append(score_id(board_type, points))
+            requests.append(UpdateOne({'_id': emptied[-1]}, {'$inc': {'count': delta}}))
+    if not requests:
+        return
+    scores = db[LeaderboardScore._meta.db_table]
+    # MongoDB retries an upsert on _id that loses a race to insert the same score.
+    scores.bulk_write(requests, ordered=False)
+    if emptied:
+        # A count raised again in between is no longer zero and stays.
+        scores.delete_many({'_id': {'$in': emptied}, 'count': {'$lte': 0}})
+
+
+def _tally(moves, board_type, old_points, new_points):
+    """Record an entry going from old (None: new entry) to new points"""
+    if old_points is not None:
+        moves[(board_type, old_points)] -= 1
+    moves[(board_type, new_points)] += 1
+
+
+def _move(collection, board_type, key, points_delta, now, new_fields, inc=None):
+    """
+    Move the entry of ``key`` on a board by ``points_delta``, inserting it
+    with ``new_fields()`` if it is missing. Returns its (old, new) points,
+    old being None for an inserted entry.
+    """
+    query = {'type': board_type, **key}
+    update = {'$inc': {'points': points_delta, **(inc or {})}, '$set': {'updated_at': now}}
+    entry = collection.find_one_and_update(query, update, {'points': 1})
+    if entry is None:
+        try:
+            entry = collection.find_one_and_update(
+                query, {**update, '$setOnInsert': new_fields()}, {'points': 1}, upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent move inserted it first (the leaderboard_entry index).
+            entry = collection.find_one_and_update(query, update, {'points': 1})
+    if entry is None:
+        return None, points_delta
+    return entry['points'], entry['points'] + points_delta
+
+
+def _apply_individual(db, user, points_delta, count_delta, now):
+    """Move a user's individual leaderboard entry by the given deltas"""
+    return _move(
+        db.leaderboard, 'individual', {'user_id': user['username']}, points_delta, now,
+        lambda: {'team_id': user.get('team_id'), 'full_name': user.get('full_name')},
+        inc={'activities_count': count_delta},
+    )
+
+
+def _apply_team(db, team_id, points_delta, now):
+    """Move a team's leaderboard entry by the given points delta"""
+    def new_fields():
+        team = db.teams.find_one({'_id': team_id}) or {}
+        return {'team_name': team.get('name'),
+                'members_count': db.users.count_documents({'team_id': team_id})}
+
+    return _move(db.leaderboard, 'team', {'team_id': team_id}, points_delta, now, new_fields)
+
+
+def increment_stats(db, deltas, now=None):
+    """
+    Apply {username: (points_delta, count_delta)} to User.stats in one bulk_write.
+    """
+    now = now or timezone.now()
+    requests = [
+        UpdateOne({'username': username}, {
+            '$inc': {
+                'stats.total_points': points_delta,
+                'stats.total_activities': count_delta,
+            },
+            '$set': {'updated_at': now},
+        })
+        for username, (points_delta, count_delta) in deltas.items()
+    ]
+    if requests:
+        db.users.bulk_write(requests, ordered=False)
+
+
+def apply_activity_changes(changes, db=None, update_leaderboard=True):
+    """
+    Apply activity writes to User.stats, the daily buckets and the leaderboards.
+
+    ``changes`` is an iterable of ``(username, date, points_delta,
+    count_delta, minutes_delta, distance_delta)``: a created activity
+    contributes (points, 1, duration_minutes, distance_km), a deleted one
+    the negated values, and an edit is its old version removed plus its new
+    version added. Changes are summed per user and per day first, so each
+    user and team entry moves once however many activities it has.
+    ``update_leaderboard=False`` leaves the boards to a full rebuild.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    daily = defaultdict(lambda: [0, 0, 0, 0])
+    for username, date, *change in changes:
+        deltas[username][0] += change[0]
+        deltas[username][1] += change[1]
+        totals = daily[(username, day_start(date))]
+        for index, value in enumerate(change):
+            totals[index] += value
+    deltas = {
+        username: tuple(delta) for username, delta in deltas.items() if any(delta)
+    }
+    if not deltas and not any(any(delta) for delta in daily.values()):
+        return
+    db = db if db is not None else get_db()
+    now = timezone.now()
+    with board_writes(db) if update_leaderboard else nullcontext():
+        increment_stats(db, deltas, now)
+        users = _board_users(db, {username for username, _ in daily})
+        record_daily(db, daily, {user['username']: user.get('team_id') for user in users}, now)
+        if update_leaderboard:
+            _move_entries(db, users, deltas, now)
+    if not update_leaderboard:
+        # Windowed boards are summed from the buckets just written.
+        leaderboard_cache.invalidate()
+
+
+def move_leaderboards(deltas, db=None):
+    """
+    Move the individual and team entries by {username: (points_delta,
+    count_delta)} without touching User.stats or the daily buckets, for
+    callers that applied those themselves. Only the moves are held off by a
+    rebuild; callers that want their stats writes to be too wrap both in
+    ``board_writes``.
+    """
+    deltas = {username: delta for username, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    db = db if db is not None else get_db()
+    with board_writes(db):
+        _move_entries(db, _board_users(db, deltas), deltas, timezone.now())
+
+
+def _board_users(db, usernames):
+    """The users' board columns; activities may name users that no longer exist"""
+    return list(db.users.find(
+        {'username': {'$in': list(usernames)}},
+        {'username': 1, 'full_name': 1, 'team_id': 1},
+    ))
+
+
+def _move_entries(db, users, deltas, now):
+    """Move each user's individual entry and each of their teams' entries once"""
+    team_deltas = defaultdict(int)
+    moves = Counter()
+    for user in users:
+        if user['username'] not in deltas:
+            continue
+        points_delta, count_delta = deltas[user['username']]
+        _tally(moves, 'individual', *_apply_individual(db, user, points_delta, count_delta, now))
+        if user.get('team_id'):
+            team_deltas[user['team_id']] += points_delta
+    for team_id, points_delta in team_deltas.items():
+        if points_delta:
+            _tally(moves, 'team', *_apply_team(db, team_id, points_delta, now))
+    count_scores(db, moves)
+    leaderboard_cache.invalidate()
+    publish(['individual', 'team'] if team_deltas else ['individual'])
+
+
+@receiver(post_save, sender=Leaderboard)
+def count_saved_entry(sender, instance, created, **kwargs):
+    moves = Counter()
+    # An entry saved without being loaded first is counted as new.
+    old = None if created else getattr(instance, '_loaded_score', None)
+    if old is not None:
+        moves[old] -= 1
+    moves[(instance.type, instance.points)] += 1
+    count_scores(get_db(), moves)
+    instance._loaded_score = (instance.type, instance.points)
+
+
+@receiver(post_delete, sender=Leaderboard)
+def count_deleted_entry(sender, instance, **kwargs):
+    count_scores(get_db(), {(instance.type, instance.points): -1})
+
+
+def _window_pipeline(board_type, start, limit):
+    key = 'user_id' if board_type == 'individual' else 'team_id'
+    return [
+        {'$match': {'day': {'$gte': start}}},
+        {'$group': {
+            '_id': f'${key}',
+            'points': {'$sum': '$points'},
+            'activities_count': {'$sum': '$activities_count'},
+        }},
+        {'$sort': {'points': -1, '_id': 1}},
+        {'$limit': limit},
+    ]
+
+
+def _window_names(board_type, ids):
+    """(collection, filter, projection, key) to look up display names"""
+    if board_type == 'individual':
+        return (User._meta.db_table, {'username': {'$in': ids}},
+                {'username': 1, 'full_name': 1, 'team_id': 1}, 'username')
+    return Team._meta.db_table, {'_id': {'$in': ids}}, {'name': 1}, '_id'
+
+
+def _window_rows(board_type, window, start, entries, names):
+    results = []
+    for entry in entries:
+        row = {'type': board_type, 'window': window, 'window_start': start}
+        info = names.get(entry['_id'], {})
+        if board_type == 'individual':
+            row.update(user_id=entry['_id'], team_id=info.get('team_id'),
+                       full_name=info.get('full_name'))
+        else:
+            row.update(team_id=entry['_id'], team_name=info.get('name'))
+        row.update(points=entry['points'], activities_count=entry['activities_count'])
+        results.append(row)
+    return competition_ranks(results)
+
+
+def windowed_leaderboard(board_type, window, limit=10, now=None):
+    """Return the top ``limit`` users or teams by points within a window"""
+    db = get_db()
+    start = window_start(window, now)
+    entries = list(db[BOARD_BUCKETS[board_type]._meta.db_table].aggregate(
+        _window_pipeline(board_type, start, limit)
+    ))
+    collection, query, projection, key = _window_names(
+        board_type, [entry['_id'] for entry in entries]
+    )
+    names = {doc[key]: doc for doc in db[collection].find(query, projection)}
+    return _window_rows(board_type, window, start, entries, names)
+
+
+async def awindowed_leaderboard(board_type, window, limit=10, now=None):
+    """Async version of ``windowed_leaderboard``"""
+    db = get_async_db()
+    start = window_start(window, now)
+    entries = await db[BOARD_BUCKETS[board_type]._meta.db_table].aggregate(
+        _window_pipeline(board_type, start, limit)
+    ).to_list(length=None)
+    collection, query, projection, key = _window_names(
+        board_type, [entry['_id'] for entry in entries]
+    )
+    names = {doc[key]: doc async for doc in db[collection].find(query, projection)}
+    return _window_rows(board_type, window, start, entries, names)
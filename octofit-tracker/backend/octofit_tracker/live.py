@@ -0,0 +1,244 @@
+"""
+Live leaderboard push over Server-Sent Events.
+
+``GET /api/live/leaderboard/?type=individual&limit=10`` on the ASGI
+application (see ``asgi.py``) keeps the connection open and sends
+
+* a ``snapshot`` event with the top ``limit`` entries on connect,
+* a ``ranks`` event with the entries that moved, or entered the top
+  ``limit``, and the ids of those that left it, whenever the board changes,
+* a comment line every ``LIVE_KEEPALIVE_SECONDS`` so proxies keep it open.
+
+Activity writes call ``publish`` with the boards they moved. Every event
+loop serving streams keeps one ``BoardFeed`` per board; ``publish`` is
+thread-safe and marks the feeds dirty on each loop. A feed waits
+``LIVE_DEBOUNCE_SECONDS`` to coalesce bursts, reads the top
+``LIVE_MAX_LIMIT`` entries once and wakes its subscribers, so a write costs
+one query per board per worker however many clients are connected, and an
+idle connection is a coroutine, an Event and its last ``limit`` entries.
+
+``publish`` only reaches the process that wrote. Feeds also re-read their
+board every ``LIVE_POLL_SECONDS``, and with ``LIVE_CHANGE_STREAMS`` they
+watch the leaderboard collection, which needs a replica set, so writes from
+other workers are pushed straight away.
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from pymongo.errors import PyMongoError
+
+from . import repository
+from .db import get_async_db
+from .models import Leaderboard
+from .serializers import LeaderboardSerializer, read_plan
+
+logger = logging.getLogger(__name__)
+
+BOARD_TYPES = ('individual', 'team')
+STREAM_PATH = '/api/live/leaderboard/'
+
+# Loop -> {board_type: BoardFeed}; feeds are bound to the loop they run on.
+_feeds = weakref.WeakKeyDictionary()
+_feeds_lock = threading.Lock()
+
+
+class BoardFeed:
+    """The latest top entries of one board, shared by a loop's streams"""
+
+    def __init__(self, board_type):
+        self.board_type = board_type
+        self.entries = None
+        self.version = 0
+        self.subscribers = set()
+        self._dirty = asyncio.Event()
+        self.loaded = asyncio.ensure_future(self.refresh())
+        self._task = asyncio.ensure_future(self.run())
+
+    def mark_dirty(self):
+        self._dirty.set()
+
+    async def refresh(self):
+        """Re-read the board and wake the subscribers if it changed"""
+        documents = await repository.leaderboard(self.board_type).alist(settings.LIVE_MAX_LIMIT)
+        entries = read_plan(LeaderboardSerializer).serialize_documents(documents)
+        if entries != self.entries:
+            self.entries = entries
+            self.version += 1
+            for wake in self.subscribers:
+                wake.set()
+
+    async def run(self):
+        watcher = (asyncio.ensure_future(self.watch())
+                   if settings.LIVE_CHANGE_STREAMS else None)
+        try:
+            await self.loaded
+            while self.subscribers:
+                try:
+                    await asyncio.wait_for(self._dirty.wait(), settings.LIVE_POLL_SECONDS)
+                    await asyncio.sleep(settings.LIVE_DEBOUNCE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._dirty.clear()
+                if not self.subscribers:
+                    break
+                try:
+                    await self.refresh()
+                except PyMongoError:
+                    logger.exception('Refreshing the %s leaderboard feed failed', self.board_type)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            with _feeds_lock:
+                feeds = _feeds.get(asyncio.get_running_loop(), {})
+                if feeds.get(self.board_type) is self:
+                    del feeds[self.board_type]
+
+    async def watch(self):
+        """Mark the feed dirty on every leaderboard change, from any process"""
+        try:
+            async with get_async_db()[Leaderboard._meta.db_table].watch() as stream:
+                async for _ in stream:
+                    self._dirty.set()
+        except PyMongoError as exc:
+            logger.warning('Leaderboard change stream unavailable, polling only: %s', exc)
+
+
+def feed(board_type):
+    """The running loop's feed for a board, started on first use"""
+    loop = asyncio.get_running_loop()
+    with _feeds_lock:
+        feeds = _feeds.setdefault(loop, {})
+        if board_type not in feeds:
+            feeds[board_type] = BoardFeed(board_type)
+        return feeds[board_type]
+
+
+def publish(board_types):
+    """Tell every loop's feeds for ``board_types`` that the boards changed"""
+    with _feeds_lock:
+        targets = [
+            (loop, feeds[board_type])
+            for loop, feeds in _feeds.items()
+            for board_type in board_types if board_type in feeds
+        ]
+    for loop, board_feed in targets:
+        try:
+            loop.call_soon_threadsafe(board_feed.mark_dirty)
+        except RuntimeError:
+            # The loop has been closed.
+            pass
+
+
+@receiver([post_save, post_delete], sender=Leaderboard)
+def publish_leaderboard_write(sender, instance, **kwargs):
+    publish([instance.type])
+
+
+def rank_changes(previous, current):
+    """Entries of ``current`` that are new or changed, and ids no longer in it"""
+    before = {entry['_id']: entry for entry in previous}
+    changed = [entry for entry in current if before.get(entry['_id']) != entry]
+    current_ids = {entry['_id'] for entry in current}
+    removed = [pk for pk in before if pk not in current_ids]
+    return changed, removed
+
+
+def event(name, data, event_id=None):
+    lines = [f'event: {name}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def _parse_params(query_string):
+    """(board_type, limit) from the query string; ValueError for bad input"""
+    params = parse_qs(query_string.decode('latin-1'))
+    board_type = params.get('type', ['individual'])[0]
+    if board_type not in BOARD_TYPES:
+        raise ValueError(f'type must be one of {", ".join(BOARD_TYPES)}')
+    try:
+        limit = int(params.get('limit', ['10'])[0])
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= settings.LIVE_MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {settings.LIVE_MAX_LIMIT}')
+    return board_type, limit
+
+
+def _headers(scope, content_type):
+    headers = [(b'content-type', content_type), (b'cache-control', b'no-cache')]
+    origin = dict(scope.get('headers', [])).get(b'origin')
+    if origin and getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+        headers += [(b'access-control-allow-origin', origin),
+                    (b'access-control-allow-credentials', b'true'), (b'vary', b'Origin')]
+    return headers
+
+
+async def _error(scope, send, status, message):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': _headers(scope, b'application/json')})
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+async def leaderboard_stream(scope, receive, send):
+    """ASGI handler for ``STREAM_PATH``"""
+    if scope['method'] != 'GET':
+        await _error(scope, send, 405, 'method not allowed')
+        return
+    try:
+        board_type, limit = _parse_params(scope['query_string'])
+    except ValueError as exc:
+        await _error(scope, send, 400, str(exc))
+        return
+
+    board_feed = feed(board_type)
+    wake = asyncio.Event()
+    closed = False
+
+    async def watch_disconnect():
+        nonlocal closed
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        closed = True
+        wake.set()
+
+    board_feed.subscribers.add(wake)
+    disconnect = asyncio.ensure_future(watch_disconnect())
+    try:
+        await asyncio.shield(board_feed.loaded)
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': _headers(scope, b'text/event-stream') + [
+                        (b'x-accel-buffering', b'no')]})
+        sent = board_feed.entries[:limit]
+        await send({'type': 'http.response.body', 'more_body': True, 'body': (
+            f'retry: {settings.LIVE_RETRY_MS}\n\n'.encode()
+            + event('snapshot', sent, board_feed.version)
+        )})
+        while not closed:
+            try:
+                await asyncio.wait_for(wake.wait(), settings.LIVE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n',
+                            'more_body': True})
+                continue
+            wake.clear()
+            if closed:
+                break
+            current = board_feed.entries[:limit]
+            changed, removed = rank_changes(sent, current)
+            if changed or removed:
+                sent = current
+                await send({'type': 'http.response.body', 'more_body': True, 'body': event(
+                    'ranks', {'changed': changed, 'removed': removed}, board_feed.version
+                )})
+    finally:
+        board_feed.subscribers.discard(wake)
+        disconnect.cancel()
@@ -0,0 +1,93 @@
+"""
+Leases in MongoDB that let a rebuild shut out the writes to what it rebuilds.
+
+Writes hold a shared lease on the names they change: they never wait on one
+another, only on an exclusive holder. A rebuild holds a name exclusively,
+which waits for the shared leases taken before it to be released and keeps
+new ones waiting until it is done. Each side registers its lease before it
+looks for the other's, so a write and a rebuild starting together cannot
+both go ahead.
+
+Every lease expires after ``LEASE_SECONDS``, so a process that dies holding
+one only stalls the others until then. Exclusive leases are renewed while
+held, since rebuilds run for longer than that.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+import threading
+import time
+
+from bson import ObjectId
+from django.utils import timezone
+from pymongo.errors import DuplicateKeyError
+
+LOCK_COLLECTION = 'locks'
+LEASE_SECONDS = 30
+
+
+def _backoff():
+    """Delays to sleep between attempts, growing to a quarter second"""
+    delay = 0.001
+    while True:
+        yield delay
+        delay = min(delay * 2, 0.25)
+
+
+def _expires():
+    return timezone.now() + timedelta(seconds=LEASE_SECONDS)
+
+
+@contextmanager
+def shared_lock(db, names):
+    """Hold a shared lease on ``names``, waiting while any is held exclusively"""
+    locks = db[LOCK_COLLECTION]
+    names = list(names)
+    token = ObjectId()
+    for delay in _backoff():
+        locks.insert_one({'_id': token, 'names': names, 'expires_at': _expires()})
+        if locks.find_one({'_id': {'$in': names}, 'expires_at': {'$gt': timezone.now()}}) is None:
+            break
+        locks.delete_one({'_id': token})
+        time.sleep(delay)
+    try:
+        yield
+    finally:
+        locks.delete_one({'_id': token})
+
+
+@contextmanager
+def exclusive_lock(db, name):
+    """Hold ``name`` alone: wait for its other holders and keep new ones off"""
+    locks = db[LOCK_COLLECTION]
+    token = ObjectId()
+    for delay in _backoff():
+        try:
+            # Takes a free or expired lease; a held one fails the upsert on _id.
+            locks.update_one(
+                {'_id': name, 'expires_at': {'$lt': timezone.now()}},
+                {'$set': {'token': token, 'expires_at': _expires()}},
+                upsert=True,
+            )
+            break
+        except DuplicateKeyError:
+            time.sleep(delay)
+    released = threading.Event()
+
+    def renew():
+        while not released.wait(LEASE_SECONDS / 3):
+            locks.update_one({'_id': name, 'token': token},
+                             {'$set': {'expires_at': _expires()}})
+
+    renewer = threading.Thread(target=renew, name=f'lease {name}', daemon=True)
+    renewer.start()
+    try:
+        for delay in _backoff():
+            if not locks.count_documents({'names': name,
+                                          'expires_at': {'$gt': timezone.now()}}):
+                break
+            time.sleep(delay)
+        yield
+    finally:
+        released.set()
+        renewer.join()
+        locks.delete_one({'_id': name, 'token': token})
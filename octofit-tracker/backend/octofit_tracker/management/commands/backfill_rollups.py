@@ -0,0 +1,124 @@
+import time as clock
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from octofit_tracker.cache import leaderboard_cache
+from octofit_tracker.db import get_db
+from octofit_tracker.management.commands.ensure_indexes import declared_indexes
+from octofit_tracker.models import (
+    Activity, DailyActivityBucket, TeamDailyActivityBucket, User,
+)
+from octofit_tracker.rollups import backfill_lock
+
+
+def _totals(count):
+    """$group accumulators for the bucket totals, counting with ``count``"""
+    return {
+        'points': {'$sum': {'$ifNull': ['$points', 0]}},
+        'activities_count': {'$sum': count},
+        'duration_minutes': {'$sum': {'$ifNull': ['$duration_minutes', 0]}},
+        'distance_km': {'$sum': {'$ifNull': ['$distance_km', 0]}},
+    }
+
+
+def _bucket_id(key):
+    return {'$concat': [
+        f'$_id.{key}', '|', {'$dateToString': {'format': '%Y-%m-%d', 'date': '$_id.day'}},
+    ]}
+
+
+def user_daily_pipeline(staging, now):
+    """
+    Pipeline over activities that writes one bucket per (user, day) to
+    ``staging``, tagged with the user's current team
+    """
+    return [
+        {'$group': {
+            '_id': {'user_id': '$user_id',
+                    'day': {'$dateTrunc': {'date': '$date', 'unit': 'day'}}},
+            **_totals(1),
+        }},
+        {'$lookup': {
+            'from': User._meta.db_table,
+            'localField': '_id.user_id',
+            'foreignField': 'username',
+            'pipeline': [{'$project': {'_id': 0, 'team_id': 1}}],
+            'as': 'user',
+        }},
+        {'$project': {
+            '_id': _bucket_id('user_id'),
+            'user_id': '$_id.user_id',
+            'team_id': {'$ifNull': [{'$first': '$user.team_id'}, None]},
+            'day': '$_id.day',
+            'points': 1,
+            'activities_count': 1,
+            'duration_minutes': 1,
+            'distance_km': 1,
+            'updated_at': {'$literal': now},
+        }},
+        {'$out': staging},
+    ]
+
+
+def team_daily_pipeline(staging, now):
+    """Pipeline over user buckets that writes one bucket per (team, day) to ``staging``"""
+    return [
+        {'$match': {'team_id': {'$ne': None}}},
+        {'$group': {
+            '_id': {'team_id': '$team_id', 'day': '$day'},
+            **_totals('$activities_count'),
+        }},
+        {'$project': {
+            '_id': _bucket_id('team_id'),
+            'team_id': '$_id.team_id',
+            'day': '$_id.day',
+            'points': 1,
+            'activities_count': 1,
+            'duration_minutes': 1,
+            'distance_km': 1,
+            'updated_at': {'$literal': now},
+        }},
+        {'$out': staging},
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the user and team daily activity buckets from the activities '
+            'collection and swap them in atomically (requires MongoDB 5.0+)')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        now = timezone.now()
+        started = clock.monotonic()
+        user_table = DailyActivityBucket._meta.db_table
+        team_table = TeamDailyActivityBucket._meta.db_table
+
+        self.stdout.write('Aggregating user buckets...')
+        # Activity writes wait from here until the rebuilt buckets are swapped
+        # in, so each one either reached activities before the aggregation
+        # read them or increments the rebuilt buckets afterwards.
+        with backfill_lock(db):
+            db[Activity._meta.db_table].aggregate(
+                user_daily_pipeline(f'{user_table}_rebuild', now), allowDiskUse=True
+            )
+            # Team buckets are summed from the rebuilt user buckets rather than
+            # from activities again.
+            self.stdout.write('Aggregating team buckets...')
+            db[f'{user_table}_rebuild'].aggregate(
+                team_daily_pipeline(f'{team_table}_rebuild', now), allowDiskUse=True
+            )
+            for model in (DailyActivityBucket, TeamDailyActivityBucket):
+                table = model._meta.db_table
+                staging = f'{table}_rebuild'
+                for name, (keys, index_options) in declared_indexes(model).items():
+                    db[staging].create_index(keys, name=name, **index_options)
+                db[staging].rename(table, dropTarget=True)
+        # Windowed boards are summed from the buckets just swapped in.
+        leaderboard_cache.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {db[user_table].estimated_document_count():,} user and '
+            f'{db[team_table].estimated_document_count():,} team daily buckets '
+            f'in {clock.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,178 @@
+from datetime import datetime
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import UniqueConstraint
+from pymongo import ASCENDING, DESCENDING
+
+from octofit_tracker.db import get_db
+
+
+# Representative query shape for each viewset endpoint:
+# (endpoint, collection, filter, sort)
+QUERY_SHAPES = [
+    ('UserViewSet.list', 'users', {},
+     [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('UserViewSet.by_team', 'users', {'team_id': ''},
+     [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('UserViewSet.activities', 'activities', {'user_id': ''},
+     [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('TeamViewSet.members', 'users', {'team_id': ''}, None),
+    ('TeamViewSet.leaderboard', 'leaderboard', {'type': 'team', 'team_id': ''}, None),
+    ('ActivityViewSet.list', 'activities', {},
+     [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('ActivityViewSet.by_user', 'activities', {'user_id': ''},
+     [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('ActivityViewSet.by_type', 'activities', {'type': ''},
+     [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('WorkoutViewSet.by_type', 'workouts', {'type': ''}, None),
+    ('WorkoutViewSet.by_difficulty', 'workouts', {'difficulty': ''}, None),
+    ('LeaderboardViewSet.list', 'leaderboard', {},
+     [('points', DESCENDING), ('_id', ASCENDING)]),
+    ('LeaderboardViewSet.individual', 'leaderboard', {'type': 'individual'},
+     [('points', DESCENDING), ('_id', ASCENDING)]),
+    ('LeaderboardViewSet.team', 'leaderboard', {'type': 'team'},
+     [('points', DESCENDING), ('_id', ASCENDING)]),
+    ('LeaderboardViewSet.top', 'leaderboard', {'type': 'individual'},
+     [('points', DESCENDING), ('_id', ASCENDING)]),
+    ('leaderboard ranks', 'leaderboard_scores', {'type': 'individual', 'points': {'$gt': 0}},
+     None),
+] + [
+    (f'{viewset}.list?since', collection, {'updated_at': {'$gte': datetime(1970, 1, 1)}},
+     [('updated_at', ASCENDING), ('_id', ASCENDING)])
+    for viewset, collection in [('UserViewSet', 'users'), ('ActivityViewSet', 'activities'),
+                                ('LeaderboardViewSet', 'leaderboard')]
+] + [
+    ('search (activities)', 'activities', {'$text': {'$search': 'run'}}, None),
+    ('search (workouts)', 'workouts', {'$text': {'$search': 'run'}}, None),
+    ('delta sync deletions', 'tombstones',
+     {'collection': '', 'deleted_at': {'$gte': datetime(1970, 1, 1)}},
+     [('deleted_at', ASCENDING), ('_id', ASCENDING)]),
+    ('UserViewSet.history', 'activity_daily',
+     {'user_id': '', 'day': {'$gte': datetime(1970, 1, 1)}}, None),
+    ('TeamViewSet.history', 'activity_team_daily',
+     {'team_id': '', 'day': {'$gte': datetime(1970, 1, 1)}}, None),
+]
+
+
+def declared_indexes(model):
+    """Return {name: (keys, options)} for the indexes declared on a model"""
+    opts = model._meta
+    indexes = {}
+    for field in opts.local_fields:
+        if field.unique and not field.primary_key:
+            # Named like pymongo's default so existing indexes are kept.
+            indexes[f'{field.column}_1'] = ([(field.column, ASCENDING)], {'unique': True})
+    for index in opts.indexes:
+        keys = []
+        for field_name in index.fields:
+            direction = DESCENDING if field_name.startswith('-') else ASCENDING
+            keys.append((opts.get_field(field_name.lstrip('-')).column, direction))
+        indexes[index.name] = (keys, {})
+    for constraint in opts.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            keys = [(opts.get_field(name).column, ASCENDING) for name in constraint.fields]
+            indexes[constraint.name] = (keys, {'unique': True})
+    text_index = getattr(model, 'text_index', None)
+    if text_index:
+        columns = {opts.get_field(name).column: weight for name, weight in text_index.items()}
+        indexes[f'{opts.db_table}_text'] = (
+            [(column, 'text') for column in sorted(columns)],
+            {'weights': columns, 'default_language': 'english'},
+        )
+    expire_after = getattr(model, 'expire_after', None)
+    if expire_after is not None:
+        field_name, seconds = expire_after
+        column = opts.get_field(field_name).column
+        indexes[f'{column}_ttl'] = ([(column, ASCENDING)], {'expireAfterSeconds': seconds})
+    return indexes
+
+
+# Options that change what an index does; one built with other values is
+# dropped and rebuilt.
+COMPARED_OPTIONS = ('unique', 'expireAfterSeconds', 'weights', 'default_language')
+
+
+def built_as_declared(info, keys, options):
+    """Whether an ``index_information()`` entry has the declared keys and options"""
+    if 'weights' in info:
+        # Text indexes list their fields under weights, not key.
+        built_keys = [(key, 'text') for key in sorted(info['weights'])]
+    else:
+        built_keys = [(key, int(direction)) for key, direction in info['key']]
+    if built_keys != keys:
+        return False
+    for option in COMPARED_OPTIONS:
+        built, declared = info.get(option), options.get(option)
+        if option == 'unique':
+            built, declared = bool(built), bool(declared)
+        elif option == 'weights' and built is not None:
+            built = dict(built)
+        if built != declared:
+            return False
+    return True
+
+
+def describe_plan(plan):
+    """Flatten a winning plan into 'STAGE > STAGE(index)' form"""
+    # MongoDB 7+ nests the classic plan under 'queryPlan'.
+    plan = plan.get('queryPlan', plan)
+    stages = []
+    while plan:
+        stage = plan['stage']
+        if 'indexName' in plan:
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return ' > '.join(stages)
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes declared in models.py and drop obsolete ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report changes without applying them')
+        parser.add_argument('--skip-explain', action='store_true',
+                            help='Do not report query plans for the viewset queries')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        dry_run = options['dry_run']
+
+        for model in apps.get_app_config('octofit_tracker').get_models():
+            collection = db[model._meta.db_table]
+            wanted = declared_indexes(model)
+            existing = collection.index_information()
+
+            for name, info in existing.items():
+                if name == '_id_':
+                    continue
+                if name in wanted and built_as_declared(info, *wanted[name]):
+                    wanted.pop(name)
+                    continue
+                self.stdout.write(f'  - dropping {collection.name}.{name}')
+                if not dry_run:
+                    collection.drop_index(name)
+
+            for name, (keys, extra) in wanted.items():
+                self.stdout.write(f'  + creating {collection.name}.{name} {keys}')
+                if not dry_run:
+                    collection.create_index(keys, name=name, background=True, **extra)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'Indexes up to date for {collection.name}'
+            ))
+
+        if options['skip_explain']:
+            return
+
+        self.stdout.write('\nWinning plans:')
+        for endpoint, collection_name, query, sort in QUERY_SHAPES:
+            cursor = db[collection_name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = cursor.limit(50).explain()
+            plan = describe_plan(explain['queryPlanner']['winningPlan'])
+            style = self.style.WARNING if 'COLLSCAN' in plan else self.style.SUCCESS
+            self.stdout.write(style(f'  {endpoint}: {plan}'))
@@ -0,0 +1,243 @@
+from collections import Counter
+
+from bson import ObjectId
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from pymongo import InsertOne
+from datetime import datetime, time, timedelta, timezone
+import random
+import time as clock
+
+from octofit_tracker.db import get_db
+from octofit_tracker.leaderboard import score_id
+from octofit_tracker.recent import RECENT_LIMIT
+from octofit_tracker.rollups import day_start
+from octofit_tracker.scoring import score
+
+
+ACTIVITY_TYPES = ['running', 'cycling', 'swimming', 'strength_training', 'yoga']
+DISTANCE_TYPES = {'running', 'cycling', 'swimming'}
+COLLECTIONS = ['users', 'teams', 'activities', 'leaderboard', 'leaderboard_scores',
+               'activity_daily', 'activity_team_daily', 'tombstones']
+
+
+def seeded_id(rng, when):
+    """An ObjectId stamped with ``when`` whose remaining bytes come from ``rng``"""
+    return ObjectId(int(when.timestamp()).to_bytes(4, 'big')
+                    + rng.getrandbits(64).to_bytes(8, 'big'))
+
+
+class BatchWriter:
+    """Buffer write requests per collection and flush them with bulk_write"""
+
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.written = {}
+
+    def add(self, collection, request):
+        buffer = self.buffers.setdefault(collection, [])
+        buffer.append(request)
+        if len(buffer) >= self.batch_size:
+            self.flush(collection)
+
+    def flush(self, collection=None):
+        names = [collection] if collection else list(self.buffers)
+        for name in names:
+            buffer = self.buffers.get(name)
+            if buffer:
+                self.db[name].bulk_write(buffer, ordered=False)
+                self.written[name] = self.written.get(name, 0) + len(buffer)
+                self.buffers[name] = []
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic dataset of any size for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--teams', type=int, default=10)
+        parser.add_argument('--activities-per-user', type=int, default=10,
+                            help='Mean activities per user (each user gets 50-150%%)')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread activities over this many days')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--end-date', default=None,
+                            help='Last activity day (YYYY-MM-DD); defaults to today. '
+                                 'Fix it to reproduce a dataset exactly')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        users, teams = options['users'], options['teams']
+        if users < 1 or teams < 1 or options['days'] < 1:
+            raise CommandError('--users, --teams and --days must be positive')
+        rng = random.Random(options['seed'])
+        # Ids draw from their own stream so they do not shift the data's.
+        ids = random.Random(f'{options["seed"]}:ids')
+        end = parse_date(options['end_date']) if options['end_date'] else None
+        if options['end_date'] and end is None:
+            raise CommandError('--end-date must be YYYY-MM-DD')
+        end = datetime.combine(end or datetime.now(timezone.utc).date(), time.min,
+                               tzinfo=timezone.utc)
+        start = end - timedelta(days=options['days'] - 1)
+        window_seconds = options['days'] * 86400
+
+        db = get_db()
+        self.stdout.write('Dropping existing collections...')
+        for name in COLLECTIONS:
+            db.drop_collection(name)
+
+        writer = BatchWriter(db, options['batch_size'])
+        started = clock.monotonic()
+
+        team_ids = [f'team_{i:05d}' for i in range(teams)]
+        for i, team_id in enumerate(team_ids):
+            # Membership lives in users.team_id; a members array would grow
+            # past the document size limit at the larger scales.
+            writer.add('teams', InsertOne({
+                '_id': team_id,
+                'name': f'Team {i}',
+                'description': f'Synthetic team {i}',
+                'created_at': start,
+                'members': [],
+            }))
+        writer.flush('teams')
+
+        team_points = dict.fromkeys(team_ids, 0)
+        scores = Counter()
+        team_members = dict.fromkeys(team_ids, 0)
+        team_daily = {}
+        mean = options['activities_per_user']
+        for i in range(users):
+            username = f'user{i:08d}'
+            team_id = team_ids[i % teams]
+            # Users join throughout the range and are active from then on,
+            # so created_at, like date, is spread rather than tied.
+            joined = rng.randrange(window_seconds)
+            created_at = start + timedelta(seconds=joined)
+            total_points = 0
+            daily = {}
+            recent = []
+            count = rng.randint(mean // 2, mean + mean // 2) if mean else 0
+            for _ in range(count):
+                activity_type = rng.choice(ACTIVITY_TYPES)
+                duration = rng.randint(20, 90)
+                distance = (round(rng.uniform(2.0, 15.0), 2)
+                            if activity_type in DISTANCE_TYPES else None)
+                points = score(activity_type, duration, distance)
+                date = created_at + timedelta(seconds=rng.randrange(window_seconds - joined))
+                total_points += points
+                day = day_start(date)
+                for bucket in (daily.setdefault(day, [0, 0, 0, 0]),
+                               team_daily.setdefault((team_id, day), [0, 0, 0, 0])):
+                    for index, value in enumerate((points, 1, duration, distance or 0)):
+                        bucket[index] += value
+                activity = {
+                    '_id': seeded_id(ids, date),
+                    'user_id': username,
+                    'type': activity_type,
+                    'duration_minutes': duration,
+                    'distance_km': distance,
+                    'points': points,
+                    'date': date,
+                    'notes': f'Synthetic session {activity_type}',
+                    'created_at': date,
+                    'updated_at': date,
+                }
+                writer.add('activities', InsertOne(activity))
+                recent.append(activity)
+
+            for day, (day_points, day_count, day_minutes, day_distance) in daily.items():
+                writer.add('activity_daily', InsertOne({
+                    '_id': f'{username}|{day:%Y-%m-%d}',
+                    'user_id': username,
+                    'team_id': team_id,
+                    'day': day,
+                    'points': day_points,
+                    'activities_count': day_count,
+                    'duration_minutes': day_minutes,
+                    'distance_km': day_distance,
+                    'updated_at': end,
+                }))
+
+            # Stats are known up front, so users are inserted in final form.
+            writer.add('users', InsertOne({
+                '_id': seeded_id(ids, created_at),
+                'email': f'{username}@load.test',
+                'username': username,
+                'full_name': f'Load User {i}',
+                'team_id': team_id,
+                'role': 'hero',
+                'avatar': None,
+                'created_at': created_at,
+                'updated_at': created_at,
+                'stats': {'total_activities': count, 'total_points': total_points},
+                'recent_activities': sorted(
+                    recent, key=lambda a: (a['date'], a['_id']), reverse=True
+                )[:RECENT_LIMIT],
+            }))
+            writer.add('leaderboard', InsertOne({
+                '_id': seeded_id(ids, end),
+                'type': 'individual',
+                'user_id': username,
+                'team_id': team_id,
+                'full_name': f'Load User {i}',
+                'points': total_points,
+                'activities_count': count,
+                'updated_at': end,
+            }))
+            scores[('individual', total_points)] += 1
+            team_points[team_id] += total_points
+            team_members[team_id] += 1
+
+            if (i + 1) % options['batch_size'] == 0:
+                self.stdout.write(f'  {i + 1:,} users, '
+                                  f'{writer.written.get("activities", 0):,} activities '
+                                  f'({clock.monotonic() - started:.0f}s)')
+
+        for (bucket_team, day), (day_points, day_count, day_minutes,
+                                 day_distance) in team_daily.items():
+            writer.add('activity_team_daily', InsertOne({
+                '_id': f'{bucket_team}|{day:%Y-%m-%d}',
+                'team_id': bucket_team,
+                'day': day,
+                'points': day_points,
+                'activities_count': day_count,
+                'duration_minutes': day_minutes,
+                'distance_km': day_distance,
+                'updated_at': end,
+            }))
+        writer.flush()
+
+        # Building indexes after the load is much faster than maintaining them.
+        self.stdout.write('Building indexes...')
+        call_command('ensure_indexes', skip_explain=True, stdout=self.stdout)
+
+        self.stdout.write('Counting leaderboard scores...')
+        for i, team_id in enumerate(team_ids):
+            writer.add('leaderboard', InsertOne({
+                '_id': seeded_id(ids, end),
+                'type': 'team',
+                'team_id': team_id,
+                'team_name': f'Team {i}',
+                'points': team_points[team_id],
+                'members_count': team_members[team_id],
+                'updated_at': end,
+            }))
+            scores[('team', team_points[team_id])] += 1
+        for (board_type, points), count in scores.items():
+            writer.add('leaderboard_scores', InsertOne({
+                '_id': score_id(board_type, points),
+                'type': board_type,
+                'points': points,
+                'count': count,
+            }))
+        writer.flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {users:,} users, {teams:,} teams and '
+            f'{writer.written.get("activities", 0):,} activities '
+            f'in {clock.monotonic() - started:.1f}s (seed {options["seed"]})'
+        ))
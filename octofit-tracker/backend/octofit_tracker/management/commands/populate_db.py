@@ -1,7 +1,10 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient
 from datetime import datetime, timedelta
 import random
+from octofit_tracker.ingest import insert_activities
+from octofit_tracker.scoring import score
 
 
 class Command(BaseCommand):
@@ -21,10 +24,12 @@ class Command(BaseCommand):
         db.activities.delete_many({})
         db.leaderboard.delete_many({})
         db.workouts.delete_many({})
+        db.activity_daily.delete_many({})
+        db.activity_team_daily.delete_many({})
+        db.tombstones.delete_many({})
         
-        # Create unique index on email field for users collection
-        db.users.create_index([("email", ASCENDING)], unique=True)
-        self.stdout.write(self.style.SUCCESS('Created unique index on email field'))
+        # Create the indexes declared in models.py (including unique email)
+        call_command('ensure_indexes', skip_explain=True, stdout=self.stdout)
         
         # Create Teams
         teams_data = [
@@ -247,83 +252,27 @@ class Command(BaseCommand):
                 activity_date = datetime.now() - timedelta(days=days_ago)
                 duration = random.randint(20, 90)
                 distance = round(random.uniform(2.0, 15.0), 2) if random.choice([True, False]) else None
-                points = duration + (distance * 10 if distance else 0)
+                activity_type = random.choice(activity_types)
                 
                 activity = {
                     'user_id': user['username'],
-                    'type': random.choice(activity_types),
+                    'type': activity_type,
                     'duration_minutes': duration,
                     'distance_km': distance,
-                    'points': int(points),
+                    'points': score(activity_type, duration, distance),
                     'date': activity_date,
                     'notes': f'Training session for {user["full_name"]}',
                     'created_at': activity_date
                 }
                 activities_data.append(activity)
-                
-                # Update user stats
-                db.users.update_one(
-                    {'username': user['username']},
-                    {
-                        '$inc': {
-                            'stats.total_activities': 1,
-                            'stats.total_points': int(points)
-                        }
-                    }
-                )
         
-        db.activities.insert_many(activities_data)
+        # Insert activities and apply user stats in one batch each; the
+        # leaderboard is rebuilt from scratch below
+        insert_activities(activities_data, db=db, update_leaderboard=False)
         self.stdout.write(self.style.SUCCESS(f'Created {len(activities_data)} activities'))
         
-        # Create Leaderboard
-        leaderboard_data = []
-        
-        # Individual leaderboard
-        for user in users_data:
-            user_stats = db.users.find_one({'username': user['username']})
-            leaderboard_data.append({
-                'type': 'individual',
-                'user_id': user['username'],
-                'team_id': user['team_id'],
-                'full_name': user['full_name'],
-                'points': user_stats['stats']['total_points'],
-                'activities_count': user_stats['stats']['total_activities'],
-                'rank': 0,  # Will be calculated
-                'updated_at': datetime.now()
-            })
-        
-        # Sort by points and assign ranks
-        leaderboard_data.sort(key=lambda x: x['points'], reverse=True)
-        for idx, entry in enumerate(leaderboard_data):
-            entry['rank'] = idx + 1
-        
-        # Team leaderboard
-        marvel_points = sum(entry['points'] for entry in leaderboard_data if entry['team_id'] == 'team_marvel')
-        dc_points = sum(entry['points'] for entry in leaderboard_data if entry['team_id'] == 'team_dc')
-        
-        leaderboard_data.extend([
-            {
-                'type': 'team',
-                'team_id': 'team_marvel',
-                'team_name': 'Team Marvel',
-                'points': marvel_points,
-                'members_count': 6,
-                'rank': 1 if marvel_points > dc_points else 2,
-                'updated_at': datetime.now()
-            },
-            {
-                'type': 'team',
-                'team_id': 'team_dc',
-                'team_name': 'Team DC',
-                'points': dc_points,
-                'members_count': 6,
-                'rank': 1 if dc_points > marvel_points else 2,
-                'updated_at': datetime.now()
-            }
-        ])
-        
-        db.leaderboard.insert_many(leaderboard_data)
-        self.stdout.write(self.style.SUCCESS(f'Created {len(leaderboard_data)} leaderboard entries'))
+        # Rank both leaderboards from the stats in one aggregation
+        call_command('rebuild_leaderboard', stdout=self.stdout)
         
         # Summary
         self.stdout.write(self.style.SUCCESS('\n' + '='*50))
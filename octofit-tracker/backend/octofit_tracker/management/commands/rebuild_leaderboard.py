@@ -0,0 +1,157 @@
+import time as clock
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from octofit_tracker.cache import leaderboard_cache
+from octofit_tracker.db import get_db
+from octofit_tracker.leaderboard import board_lock
+from octofit_tracker.live import publish
+from octofit_tracker.management.commands.ensure_indexes import declared_indexes
+from octofit_tracker.models import Leaderboard, LeaderboardScore, Team, Tombstone, User
+
+
+def keep_entry_id(board_type, key):
+    """
+    Stages that give a rebuilt entry the _id of the entry it replaces, so
+    detail URLs and delta-sync clients keep tracking it. New entries get one
+    from $out.
+    """
+    return [
+        {'$lookup': {
+            'from': Leaderboard._meta.db_table,
+            'let': {'key': f'${key}'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$type', board_type]}, {'$eq': [f'${key}', '$$key']},
+                ]}}},
+                {'$project': {'_id': 1}},
+                {'$limit': 1},
+            ],
+            'as': 'entry',
+        }},
+        {'$set': {'_id': {'$ifNull': [{'$first': '$entry._id'}, '$$REMOVE']}}},
+        {'$unset': 'entry'},
+    ]
+
+
+def team_entries():
+    """Pipeline over teams: one entry per team with its members' totals"""
+    return [
+        {'$lookup': {
+            'from': User._meta.db_table,
+            'let': {'team': '$_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$team_id', '$$team']}}},
+                {'$group': {
+                    '_id': None,
+                    'points': {'$sum': '$stats.total_points'},
+                    'members_count': {'$sum': 1},
+                }},
+            ],
+            'as': 'totals',
+        }},
+        {'$project': {
+            '_id': 0,
+            'type': {'$literal': 'team'},
+            'team_id': '$_id',
+            'team_name': '$name',
+            'points': {'$ifNull': [{'$first': '$totals.points'}, 0]},
+            'members_count': {'$ifNull': [{'$first': '$totals.members_count'}, 0]},
+        }},
+        *keep_entry_id('team', 'team_id'),
+    ]
+
+
+def rebuild_pipeline(staging, now):
+    """
+    Pipeline over users that writes the whole leaderboard to ``staging``:
+    an individual entry per user from User.stats and a team entry per team.
+    """
+    return [
+        {'$project': {
+            '_id': 0,
+            'type': {'$literal': 'individual'},
+            'user_id': '$username',
+            'team_id': '$team_id',
+            'full_name': '$full_name',
+            'points': {'$ifNull': ['$stats.total_points', 0]},
+            'activities_count': {'$ifNull': ['$stats.total_activities', 0]},
+        }},
+        *keep_entry_id('individual', 'user_id'),
+        {'$unionWith': {'coll': Team._meta.db_table, 'pipeline': team_entries()}},
+        {'$set': {'updated_at': now}},
+        {'$out': staging},
+    ]
+
+
+def score_pipeline(staging):
+    """Pipeline over a staged board that writes its LeaderboardScore counts to ``staging``"""
+    return [
+        {'$group': {'_id': {'type': '$type', 'points': '$points'}, 'count': {'$sum': 1}}},
+        {'$project': {
+            '_id': {'$concat': ['$_id.type', '|', {'$toString': '$_id.points'}]},
+            'type': '$_id.type',
+            'points': '$_id.points',
+            'count': 1,
+        }},
+        {'$out': staging},
+    ]
+
+
+def tombstone_pipeline(staging, now):
+    """Pipeline over the live board that records a tombstone per dropped entry"""
+    return [
+        {'$lookup': {'from': staging, 'localField': '_id', 'foreignField': '_id',
+                     'as': 'kept'}},
+        {'$match': {'kept': {'$size': 0}}},
+        {'$project': {
+            '_id': 0,
+            'collection': {'$literal': Leaderboard._meta.db_table},
+            'object_id': {'$toString': '$_id'},
+            'deleted_at': {'$literal': now},
+        }},
+        {'$merge': {'into': Tombstone._meta.db_table}},
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Rebuild both leaderboards from User.stats in one aggregation and swap them '
+            'in atomically (requires MongoDB 5.0+)')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        table = Leaderboard._meta.db_table
+        staging = f'{table}_rebuild'
+        scores = LeaderboardScore._meta.db_table
+        scores_staging = f'{scores}_rebuild'
+        now = timezone.now()
+        started = clock.monotonic()
+
+        self.stdout.write('Aggregating leaderboard...')
+        # Activity writes wait from here until the rebuilt board is swapped
+        # in, so each one either reached User.stats before the aggregation
+        # read it or moves the rebuilt board afterwards.
+        with board_lock(db, 'individual'), board_lock(db, 'team'):
+            db[User._meta.db_table].aggregate(
+                rebuild_pipeline(staging, now), allowDiskUse=True
+            )
+            db[staging].aggregate(score_pipeline(scores_staging), allowDiskUse=True)
+            # Indexes are built on the finished staging collections, which is
+            # faster than maintaining them during $out, and move with the rename.
+            for model, collection in [(Leaderboard, staging), (LeaderboardScore, scores_staging)]:
+                for name, (keys, index_options) in declared_indexes(model).items():
+                    db[collection].create_index(keys, name=name, **index_options)
+            db[table].aggregate(tombstone_pipeline(staging, now), allowDiskUse=True)
+            # Readers see the old board until the rename, then the whole new
+            # one. Ranks read between the two renames come from the new
+            # counts and can be off until the board follows them.
+            db[scores_staging].rename(scores, dropTarget=True)
+            db[staging].rename(table, dropTarget=True)
+        leaderboard_cache.invalidate()
+        publish(['individual', 'team'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {db[table].estimated_document_count():,} leaderboard entries '
+            f'in {clock.monotonic() - started:.1f}s'
+        ))
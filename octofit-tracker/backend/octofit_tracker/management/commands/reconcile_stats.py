@@ -0,0 +1,98 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import multiprocessing
+import os
+import time as clock
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from octofit_tracker.db import get_db
+from octofit_tracker.models import Activity, Tombstone, User
+from octofit_tracker.reconcile import init_worker, reconcile_partition
+
+# Users whose stats or activities were written this recently are skipped:
+# one of their activity writes may still be between its write and its $inc.
+SETTLE_SECONDS = 60
+
+
+def partitions(db, count):
+    """
+    Split users into about ``count`` contiguous username ranges of similar
+    size, as (lower, upper) bounds with None for an open end. Ranges rather
+    than hashes keep each partition an index range scan of both users and
+    activities.
+    """
+    buckets = list(db[User._meta.db_table].aggregate([
+        {'$bucketAuto': {'groupBy': '$username', 'buckets': count}},
+    ], allowDiskUse=True))
+    bounds = [None] + [bucket['_id']['min'] for bucket in buckets[1:]] + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+class Command(BaseCommand):
+    help = ('Recompute User.stats from the activities collection in parallel and '
+            'correct the users whose totals drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes to run partitions on (1 runs in-process)')
+        parser.add_argument('--partitions', type=int, default=None,
+                            help='Username ranges to split users into (default: 4 per worker)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without correcting it')
+        parser.add_argument('--rebuild-leaderboard', action='store_true',
+                            help='Run rebuild_leaderboard afterwards if anything was corrected')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        count = options['partitions'] or workers * 4
+        if workers < 1 or count < 1:
+            raise CommandError('--workers and --partitions must be positive')
+        db = get_db()
+        cutoff = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+        ranges = partitions(db, count)
+        started = clock.monotonic()
+        totals = Counter()
+        tables = {'users': User._meta.db_table, 'activities': Activity._meta.db_table,
+                  'tombstones': Tombstone._meta.db_table}
+        tasks = [(db.name, tables, lower, upper, cutoff, options['dry_run'])
+                 for lower, upper in ranges]
+
+        def report(done, counts):
+            totals.update(counts)
+            self.stdout.write(f'  {done}/{len(tasks)} partitions, {totals["checked"]:,} users, '
+                              f'{totals["drifted"]:,} drifted '
+                              f'({clock.monotonic() - started:.0f}s)')
+
+        if workers == 1:
+            for done, task in enumerate(tasks, 1):
+                report(done, reconcile_partition(*task))
+        else:
+            # Spawned workers open their own MongoClient; forked ones would
+            # inherit this process's sockets. They import only
+            # octofit_tracker.reconcile, which is safe before django.setup().
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [pool.submit(reconcile_partition, *task) for task in tasks]
+                for done, future in enumerate(as_completed(futures), 1):
+                    report(done, future.result())
+
+        self.stdout.write(
+            f'Drift: {totals["activities_drift"]:,} activity counts, '
+            f'{totals["points_drift"]:,} point totals, {totals["malformed"]:,} malformed; '
+            f'{totals["skipped"]:,} users with writes in the last {SETTLE_SECONDS}s skipped'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Would correct {totals["drifted"]:,} of {totals["checked"]:,} users'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Corrected {totals["corrected"]:,} of {totals["checked"]:,} users '
+            f'in {clock.monotonic() - started:.1f}s'
+        ))
+        if totals['corrected'] and options['rebuild_leaderboard']:
+            call_command('rebuild_leaderboard', stdout=self.stdout)
@@ -0,0 +1,139 @@
+import time as clock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import numpy as np
+from pymongo import ASCENDING, UpdateOne
+
+from octofit_tracker import scoring
+from octofit_tracker.db import get_db
+from octofit_tracker.leaderboard import apply_activity_changes
+from octofit_tracker.models import Activity, User
+from octofit_tracker.recent import FIELD as RECENT_FIELD
+from octofit_tracker.rollups import activity_writes
+
+COLUMNS = {'user_id': 1, 'type': 1, 'duration_minutes': 1, 'distance_km': 1,
+           'points': 1, 'date': 1}
+
+
+class Coefficients:
+    """The scoring rules as arrays indexed by an activity type code"""
+
+    def __init__(self):
+        by_type, default = scoring.rules()
+        self.codes = {activity_type: code for code, activity_type in enumerate(by_type, 1)}
+        table = [default, *by_type.values()]
+        self.base, self.per_minute, self.per_km = (
+            np.array(column, dtype=np.float64) for column in zip(*table)
+        )
+
+    def score(self, documents):
+        """Points of each document, with the same arithmetic as scoring.score"""
+        count = len(documents)
+        codes = np.fromiter((self.codes.get(doc.get('type'), 0) for doc in documents),
+                            dtype=np.intp, count=count)
+        duration = np.fromiter((doc.get('duration_minutes') or 0 for doc in documents),
+                               dtype=np.float64, count=count)
+        distance = np.fromiter((doc.get('distance_km') or 0 for doc in documents),
+                               dtype=np.float64, count=count)
+        points = (self.base[codes] + self.per_minute[codes] * duration
+                  + self.per_km[codes] * distance)
+        return np.trunc(points).astype(np.int64)
+
+
+class Command(BaseCommand):
+    help = ('Recompute every activity\'s points with the current SCORING_RULES and '
+            'apply the differences to stats, daily buckets and leaderboards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', action='append', dest='types', default=None,
+                            help='Only rescore this activity type (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        db = get_db()
+        collection = db[Activity._meta.db_table]
+        coefficients = Coefficients()
+        query = {'type': {'$in': options['types']}} if options['types'] else {}
+        users = set()
+        scanned = rescored = 0
+        started = clock.monotonic()
+        last_id = None
+
+        # Batches are keyset ranges of _id, so rewriting a batch never moves
+        # the cursor of the next one.
+        while True:
+            batch_query = {**query, '_id': {'$gt': last_id}} if last_id else query
+            documents = list(collection.find(batch_query, COLUMNS)
+                             .sort('_id', ASCENDING).limit(batch_size))
+            if not documents:
+                break
+            last_id = documents[-1]['_id']
+            scanned += len(documents)
+
+            current = np.fromiter((doc.get('points') or 0 for doc in documents),
+                                  dtype=np.int64, count=len(documents))
+            points = coefficients.score(documents)
+            changed = [(documents[index], int(points[index]), int(points[index] - current[index]))
+                       for index in np.flatnonzero(points != current)]
+            if changed and not options['dry_run']:
+                with activity_writes(db):
+                    changed = self._write(db, changed)
+            rescored += len(changed)
+            users.update(document['user_id'] for document, _, _ in changed)
+            self.stdout.write(f'  {scanned:,} scanned, {rescored:,} rescored '
+                              f'({clock.monotonic() - started:.0f}s)')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Would rescore {rescored:,} of {scanned:,} activities for {len(users):,} users'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Rescored {rescored:,} of {scanned:,} activities '
+            f'in {clock.monotonic() - started:.1f}s'
+        ))
+
+    def _write(self, db, changed):
+        """
+        Write one batch of new points and apply their differences, stats,
+        buckets and leaderboards together, so an interrupted run leaves every
+        rescored batch fully counted. Each update only matches the activity
+        as it was read, so one edited or deleted in the meantime is left to
+        that write; returns the changes that were applied.
+        """
+        now = timezone.now()
+        collection = db[Activity._meta.db_table]
+        result = collection.bulk_write([
+            UpdateOne({'_id': document['_id'],
+                       **{name: document.get(name) for name in COLUMNS}},
+                      {'$set': {'points': points, 'updated_at': now}})
+            for document, points, _ in changed
+        ], ordered=False)
+        if result.matched_count < len(changed):
+            # Rare: tell which rows this batch wrote by their new updated_at.
+            written = {document['_id'] for document in collection.find(
+                {'_id': {'$in': [document['_id'] for document, _, _ in changed]},
+                 'updated_at': now},
+                {'_id': 1},
+            )}
+            changed = [change for change in changed if change[0]['_id'] in written]
+            if not changed:
+                return changed
+        # Users whose recent list holds the activity get the new points too.
+        db[User._meta.db_table].bulk_write([
+            UpdateOne({'username': document['user_id'], f'{RECENT_FIELD}._id': document['_id']},
+                      {'$set': {f'{RECENT_FIELD}.$.points': points}})
+            for document, points, _ in changed
+        ], ordered=False)
+        apply_activity_changes(
+            ((document['user_id'], document['date'], delta, 0, 0, 0)
+             for document, _, delta in changed),
+            db=db,
+        )
+        return changed
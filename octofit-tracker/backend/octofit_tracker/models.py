@@ -1,3 +1,4 @@
+from django.conf import settings
 from djongo import models
 
 
@@ -11,11 +12,17 @@ class User(models.Model):
     role = models.CharField(max_length=50, default='hero')
     avatar = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     stats = models.JSONField(default=dict)
     
     class Meta:
         db_table = 'users'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['team_id'], name='user_team'),
+            models.Index(fields=['-created_at', '-_id'], name='user_created'),
+            models.Index(fields=['updated_at', '_id'], name='user_updated'),
+        ]
     
     def __str__(self):
         return f"{self.full_name} ({self.username})"
@@ -48,10 +55,20 @@ class Activity(models.Model):
     date = models.DateTimeField()
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # {field: weight} of the collection's text index, built by ensure_indexes.
+    text_index = {'notes': 1}
     
     class Meta:
         db_table = 'activities'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user_id', '-date', '-_id'], name='activity_user_date'),
+            models.Index(fields=['type', '-date', '-_id'], name='activity_type_date'),
+            models.Index(fields=['-date', '-_id'], name='activity_date'),
+            models.Index(fields=['updated_at', '_id'], name='activity_updated'),
+        ]
     
     def __str__(self):
         return f"{self.user_id} - {self.type} ({self.duration_minutes} min)"
@@ -68,16 +85,27 @@ class Workout(models.Model):
     exercises = models.JSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # {field: weight} of the collection's text index, built by ensure_indexes.
+    text_index = {'name': 10, 'description': 3, 'exercises': 2}
+    
     class Meta:
         db_table = 'workouts'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['type'], name='workout_type'),
+            models.Index(fields=['difficulty'], name='workout_difficulty'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.type})"
 
 
 class Leaderboard(models.Model):
-    """Leaderboard model for rankings"""
+    """
+    Leaderboard model for rankings.
+    
+    Ranks are not stored: reads derive them from ``LeaderboardScore``.
+    """
     _id = models.ObjectIdField(db_column='_id', primary_key=True)
     type = models.CharField(max_length=50)  # 'individual' or 'team'
     user_id = models.CharField(max_length=100, blank=True, null=True)
@@ -87,15 +115,125 @@ class Leaderboard(models.Model):
     points = models.IntegerField(default=0)
     activities_count = models.IntegerField(default=0, blank=True, null=True)
     members_count = models.IntegerField(default=0, blank=True, null=True)
-    rank = models.IntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'leaderboard'
-        ordering = ['rank']
+        ordering = ['-points', '_id']
+        indexes = [
+            models.Index(fields=['type', '-points', '_id'], name='leaderboard_type_points'),
+            models.Index(fields=['type', 'user_id'], name='leaderboard_type_user'),
+            models.Index(fields=['type', 'team_id'], name='leaderboard_type_team'),
+            models.Index(fields=['-points', '_id'], name='leaderboard_points'),
+            models.Index(fields=['type', '-updated_at'], name='leaderboard_type_updated'),
+            models.Index(fields=['updated_at', '_id'], name='leaderboard_updated'),
+        ]
+        constraints = [
+            # One entry per user or team; concurrent first moves insert it once.
+            models.UniqueConstraint(fields=['type', 'user_id', 'team_id'],
+                                    name='leaderboard_entry'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The score a save moves the entry from, for LeaderboardScore.
+        instance._loaded_score = (instance.__dict__.get('type'), instance.__dict__.get('points'))
+        return instance
     
     def __str__(self):
         if self.type == 'individual':
-            return f"#{self.rank} {self.full_name} - {self.points} pts"
+            return f"{self.full_name} - {self.points} pts"
         else:
-            return f"#{self.rank} {self.team_name} - {self.points} pts"
+            return f"{self.team_name} - {self.points} pts"
+
+
+class LeaderboardScore(models.Model):
+    """Number of entries on a leaderboard with a given number of points"""
+    _id = models.CharField(max_length=150, primary_key=True, db_column='_id')  # 'type|points'
+    type = models.CharField(max_length=50)
+    points = models.IntegerField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'leaderboard_scores'
+        ordering = ['type', '-points']
+        indexes = [
+            models.Index(fields=['type', '-points'], name='score_type_points'),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} {self.points} pts x{self.count}"
+
+
+class DailyActivityBucket(models.Model):
+    """Per-user, per-day activity totals maintained on every activity write"""
+    _id = models.CharField(max_length=150, primary_key=True, db_column='_id')  # 'username|YYYY-MM-DD'
+    user_id = models.CharField(max_length=100)
+    team_id = models.CharField(max_length=100, blank=True, null=True)
+    day = models.DateTimeField()
+    points = models.IntegerField(default=0)
+    activities_count = models.IntegerField(default=0)
+    duration_minutes = models.IntegerField(default=0)
+    distance_km = models.FloatField(default=0)
+    updated_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'activity_daily'
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['day', 'user_id'], name='daily_day_user'),
+            models.Index(fields=['user_id', 'day'], name='daily_user_day'),
+            models.Index(fields=['-updated_at'], name='daily_updated'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.day:%Y-%m-%d} - {self.points} pts"
+
+
+class TeamDailyActivityBucket(models.Model):
+    """Per-team, per-day activity totals maintained on every activity write"""
+    _id = models.CharField(max_length=150, primary_key=True, db_column='_id')  # 'team|YYYY-MM-DD'
+    team_id = models.CharField(max_length=100)
+    day = models.DateTimeField()
+    points = models.IntegerField(default=0)
+    activities_count = models.IntegerField(default=0)
+    duration_minutes = models.IntegerField(default=0)
+    distance_km = models.FloatField(default=0)
+    updated_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'activity_team_daily'
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['day', 'team_id'], name='team_daily_day_team'),
+            models.Index(fields=['team_id', 'day'], name='team_daily_team_day'),
+            models.Index(fields=['-updated_at'], name='team_daily_updated'),
+        ]
+    
+    def __str__(self):
+        return f"{self.team_id} {self.day:%Y-%m-%d} - {self.points} pts"
+
+
+class Tombstone(models.Model):
+    """Record of a deleted row, read by delta sync to report deletions"""
+    _id = models.ObjectIdField(db_column='_id', primary_key=True)
+    collection = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=100)
+    deleted_at = models.DateTimeField()
+    # Owner of a deleted activity, so reconcile_stats can tell whose stats
+    # a delete may not have reached yet.
+    user_id = models.CharField(max_length=100, blank=True, null=True)
+    
+    # (field, seconds) for a TTL index built by ensure_indexes.
+    expire_after = ('deleted_at', settings.SYNC_TOMBSTONE_DAYS * 24 * 60 * 60)
+    
+    class Meta:
+        db_table = 'tombstones'
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['collection', 'deleted_at', '_id'], name='tombstone_collection'),
+        ]
+    
+    def __str__(self):
+        return f"{self.collection} {self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
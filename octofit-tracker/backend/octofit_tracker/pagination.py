@@ -0,0 +1,195 @@
+"""
+Cursor pagination for the large collections.
+
+Each class orders on the model's declared ordering with ``_id`` as the
+tiebreaker, so the order is total. DRF's ``CursorPagination`` only puts
+the first ordering field in its cursor, plus an offset past the rows that
+share its value, so a page deep into many ties (a crowded score, say)
+skips over all of them. Instead the cursor holds every ordering value,
+``_id`` included, and a page is a single range read on the ordering index
+however many rows tie. ``BaseCursorPagination`` pages QuerySets and
+``repository.MongoQuery`` this way on the sync read path and ``apaginate``
+applies the same classes to the async one, so their cursors are
+interchangeable. Search results have no range key to order on, so
+``SearchPagination`` pages them by number.
+"""
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .changelist import keyset_condition, reverse_ordering
+
+
+class BaseCursorPagination(CursorPagination):
+    """
+    Keyset cursor pagination with a client-adjustable, capped page size.
+    
+    Takes a QuerySet or a ``repository.MongoQuery`` and returns DRF's
+    ``{next, previous, results}`` envelope; raises NotFound for a bad cursor.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        ordering = list(self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        position, reverse = (
+            _decode_cursor(cursor, queryset.model, ordering) if cursor else (None, False)
+        )
+        rows = list(_page_query(queryset, ordering, position, reverse)[:self.page_size + 1])
+        self.next_link, self.previous_link, rows = _page_links(
+            request, self, ordering, rows, position, reverse
+        )
+        return rows
+    
+    def get_next_link(self):
+        return self.next_link
+    
+    def get_previous_link(self):
+        return self.previous_link
+
+
+class ActivityCursorPagination(BaseCursorPagination):
+    """Activities, newest first"""
+    ordering = ('-date', '-_id')
+
+
+class UserCursorPagination(BaseCursorPagination):
+    """Users, most recently created first"""
+    ordering = ('-created_at', '-_id')
+
+
+class LeaderboardCursorPagination(BaseCursorPagination):
+    """Leaderboard entries by rank, best first"""
+    ordering = ('-points', '_id')
+
+
+class SearchPagination(PageNumberPagination):
+    """Search results by relevance, at most SEARCH_MAX_RESULTS deep"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def _value(row, name):
+    """An ordering value of a MongoDB document or a model instance"""
+    return row.get(name) if isinstance(row, dict) else getattr(row, name)
+
+
+def _encode_cursor(row, ordering, reverse):
+    position = [_encode_value(_value(row, name.lstrip('-'))) for name in ordering]
+    payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor, model, ordering):
+    """Return (position, reverse) for a cursor string"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        position = [
+            model._meta.get_field(name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, payload['p'], strict=True)
+        ]
+        return position, bool(payload['r'])
+    except (TypeError, KeyError, ValueError, ValidationError, InvalidId) as exc:
+        raise NotFound(CursorPagination.invalid_cursor_message) from exc
+
+
+def _after(ordering, position, forward):
+    """MongoDB condition for documents strictly after ``position``"""
+    clauses = []
+    for index, name in enumerate(ordering):
+        clause = {
+            previous.lstrip('-'): value
+            for previous, value in zip(ordering[:index], position)
+        }
+        operator = '$lt' if name.startswith('-') == forward else '$gt'
+        clause[name.lstrip('-')] = {operator: position[index]}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+
+def _page_query(query, ordering, position, reverse):
+    """``query`` sorted for the page after ``position`` and limited to it"""
+    query = query.order_by(*(reverse_ordering(ordering) if reverse else ordering))
+    if position is None:
+        return query
+    if isinstance(query, QuerySet):
+        return query.filter(keyset_condition(
+            reverse_ordering(ordering) if reverse else ordering, position
+        ))
+    return query.where(_after(ordering, position, not reverse))
+
+
+def _page_links(request, paginator, ordering, rows, position, reverse):
+    """
+    (next link, previous link, page) for ``rows``, the page read one row past
+    ``paginator.page_size`` in the direction of the cursor.
+    """
+    has_more = len(rows) > paginator.page_size
+    rows = rows[:paginator.page_size]
+    if reverse:
+        rows.reverse()
+
+    def link(row, link_reverse):
+        params = request.GET.copy()
+        params[paginator.cursor_query_param] = _encode_cursor(row, ordering, link_reverse)
+        return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    next_link = previous_link = None
+    if rows:
+        if has_more or reverse:
+            next_link = link(rows[-1], False)
+        if (has_more and reverse) or (position is not None and not reverse):
+            previous_link = link(rows[0], True)
+    return next_link, previous_link, rows
+
+
+async def apaginate(request, query, pagination_class, serialize):
+    """
+    Async keyset pagination of a ``repository.MongoQuery``.
+
+    Uses the ordering and page size settings of ``pagination_class`` and
+    returns the same ``{next, previous, results}`` envelope and cursors as
+    the sync endpoints. Raises NotFound for a bad cursor.
+    """
+    paginator = pagination_class()
+    try:
+        page_size = min(int(request.GET[paginator.page_size_query_param]),
+                        paginator.max_page_size)
+        if page_size > 0:
+            paginator.page_size = page_size
+    except (KeyError, ValueError):
+        pass
+    ordering = list(paginator.ordering)
+    cursor = request.GET.get(paginator.cursor_query_param)
+    position, reverse = (
+        _decode_cursor(cursor, query.model, ordering) if cursor else (None, False)
+    )
+    documents = await _page_query(query, ordering, position, reverse).alist(
+        paginator.page_size + 1
+    )
+    next_link, previous_link, documents = _page_links(
+        request, paginator, ordering, documents, position, reverse
+    )
+    return {'next': next_link, 'previous': previous_link, 'results': serialize(documents)}
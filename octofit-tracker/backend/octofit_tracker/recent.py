@@ -0,0 +1,67 @@
+"""
+Capped per-user list of recent activities.
+
+Each user document carries ``recent_activities``: its newest
+``RECENT_LIMIT`` activities, stored in the same shape as the activities
+collection and kept newest first. New activities are pushed with
+``$each``/``$sort``/``$slice`` so the list never grows past the cap; edits
+and deletions rebuild the list from the ``activity_user_date`` index. The
+profile endpoint then reads one document however long the history is.
+"""
+from collections import defaultdict
+
+from pymongo import DESCENDING, UpdateOne
+
+from .db import get_db
+from .models import Activity, User
+from .serializers import ActivitySerializer, read_plan
+
+RECENT_LIMIT = 20
+FIELD = 'recent_activities'
+
+
+def _compact(document):
+    """Keep only the activity columns the serializer reads"""
+    return {column: document.get(column) for column in read_plan(ActivitySerializer).columns}
+
+
+def instance_document(activity):
+    """Build an activities document from an Activity instance"""
+    return {
+        field.column: getattr(activity, field.attname)
+        for field in Activity._meta.concrete_fields
+    }
+
+
+def push_recent(documents, db=None):
+    """Push newly created activity documents onto their users' recent lists"""
+    by_user = defaultdict(list)
+    for document in documents:
+        by_user[document['user_id']].append(_compact(document))
+    if not by_user:
+        return
+    db = db if db is not None else get_db()
+    db[User._meta.db_table].bulk_write([
+        UpdateOne({'username': username}, {'$push': {FIELD: {
+            '$each': activities,
+            '$sort': {'date': -1, '_id': -1},
+            '$slice': RECENT_LIMIT,
+        }}})
+        for username, activities in by_user.items()
+    ], ordered=False)
+
+
+def refresh_recent(usernames, db=None):
+    """Rebuild the recent lists of the given users from the activities collection"""
+    usernames = set(usernames)
+    if not usernames:
+        return
+    db = db if db is not None else get_db()
+    columns = read_plan(ActivitySerializer).columns
+    requests = []
+    for username in usernames:
+        recent = list(db[Activity._meta.db_table].find(
+            {'user_id': username}, columns,
+        ).sort([('date', DESCENDING), ('_id', DESCENDING)]).limit(RECENT_LIMIT))
+        requests.append(UpdateOne({'username': username}, {'$set': {FIELD: recent}}))
+    db[User._meta.db_table].bulk_write(requests, ordered=False)
@@ -0,0 +1,110 @@
+"""
+Partition workers for ``manage.py reconcile_stats``.
+
+Spawned worker processes unpickle these functions by importing this module
+before Django is set up, so it imports no models: collections are passed
+in by name, and ``init_worker`` sets Django up before the first partition.
+
+A user's stats are only corrected when nothing about them can still be in
+flight. Activity writes change the activity first and ``$inc`` the user's
+stats after, so a partition skips users whose stats, activities or deleted
+activities were written after ``cutoff``; otherwise a recount could see an
+edit or delete whose ``$inc`` has yet to land, and the two would add up.
+"""
+from collections import Counter
+
+import django
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from .db import get_client
+
+
+def init_worker():
+    django.setup()
+
+
+def _between(lower, upper):
+    condition = {}
+    if lower is not None:
+        condition['$gte'] = lower
+    if upper is not None:
+        condition['$lt'] = upper
+    return condition
+
+
+def _stored(stats):
+    """(total_activities, total_points) if stats is in canonical form, else None"""
+    if not isinstance(stats, dict) or set(stats) != {'total_activities', 'total_points'}:
+        return None
+    values = stats['total_activities'], stats['total_points']
+    return values if all(isinstance(value, int) for value in values) else None
+
+
+def _in_flight(db, tables, names, cutoff):
+    """Usernames in range with an activity written or deleted after cutoff"""
+    owner = {'user_id': names} if names else {}
+    edited = db[tables['activities']].distinct(
+        'user_id', {'updated_at': {'$gt': cutoff}, **owner},
+    )
+    deleted = db[tables['tombstones']].distinct('user_id', {
+        'collection': tables['activities'], 'deleted_at': {'$gt': cutoff}, **owner,
+    })
+    return set(edited) | set(deleted)
+
+
+def reconcile_partition(db_name, tables, lower, upper, cutoff, dry_run):
+    """
+    Recompute the stats of the users in [lower, upper) from their activities
+    and correct the drifted ones. ``tables`` maps 'users', 'activities' and
+    'tombstones' to collection names. Returns a Counter of outcomes.
+    """
+    db = get_client()[db_name]
+    names = _between(lower, upper)
+    user_filter = {'username': names} if names else {}
+    activity_filter = {'created_at': {'$lte': cutoff}}
+    if names:
+        activity_filter['user_id'] = names
+    totals = {
+        row['_id']: (row['count'], row['points'])
+        for row in db[tables['activities']].aggregate([
+            {'$match': activity_filter},
+            {'$group': {'_id': '$user_id', 'count': {'$sum': 1},
+                        'points': {'$sum': {'$ifNull': ['$points', 0]}}}},
+        ], allowDiskUse=True)
+    }
+    # Read after the recount, so every write it saw is in here.
+    busy = _in_flight(db, tables, names, cutoff)
+    counts = Counter()
+    corrections = []
+    now = timezone.now()
+    for user in db[tables['users']].find(
+        user_filter, {'username': 1, 'stats': 1, 'updated_at': 1},
+    ):
+        counts['checked'] += 1
+        updated_at = user.get('updated_at')
+        if (updated_at is not None and updated_at > cutoff) or user['username'] in busy:
+            counts['skipped'] += 1
+            continue
+        expected = totals.get(user['username'], (0, 0))
+        stored = _stored(user.get('stats'))
+        if stored == expected:
+            continue
+        if stored is None:
+            counts['malformed'] += 1
+        else:
+            counts['activities_drift'] += stored[0] != expected[0]
+            counts['points_drift'] += stored[1] != expected[1]
+        corrections.append(UpdateOne(
+            # Only if no stats write landed since the read.
+            {'_id': user['_id'], 'updated_at': updated_at},
+            {'$set': {
+                'stats': {'total_activities': expected[0], 'total_points': expected[1]},
+                'updated_at': now,
+            }},
+        ))
+    counts['drifted'] = len(corrections)
+    if corrections and not dry_run:
+        result = db[tables['users']].bulk_write(corrections, ordered=False)
+        counts['corrected'] = result.modified_count
+    return counts
@@ -0,0 +1,63 @@
+"""
+Line-oriented renderers for bulk exports.
+
+Besides DRF's ``render``, used for small responses such as errors, each
+renderer has ``stream``, which turns an iterator of serialized rows into an
+iterator of encoded chunks for a ``StreamingHttpResponse``. Rows are
+buffered ``chunk_rows`` at a time so memory stays flat however many there
+are.
+"""
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamingRenderer(BaseRenderer):
+    charset = 'utf-8'
+    chunk_rows = 500
+
+    def encode_rows(self, rows, fields, header=False):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return self.encode_rows(rows, list(rows[0]) if rows else [], header=True)
+
+    def stream(self, rows, fields):
+        """Yield encoded chunks of ``chunk_rows`` rows each"""
+        chunk = []
+        header = True
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_rows:
+                yield self.encode_rows(chunk, fields, header)
+                chunk, header = [], False
+        if chunk or header:
+            yield self.encode_rows(chunk, fields, header)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Newline-delimited JSON: one object per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def encode_rows(self, rows, fields, header=False):
+        return ''.join(json.dumps(row) + '\n' for row in rows).encode(self.charset)
+
+
+class CSVRenderer(StreamingRenderer):
+    """CSV with a header row of ``fields``"""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def encode_rows(self, rows, fields, header=False):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+        if header and fields:
+            writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
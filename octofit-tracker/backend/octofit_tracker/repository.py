@@ -0,0 +1,573 @@
+"""
+Native pymongo read path for the hottest endpoints.
+
+djongo translates every ORM query to SQL and parses it back into a Mongo
+query on each call. The queries here go straight to the pooled client with
+a projection limited to the serializer's fields and yield raw documents,
+which the views turn into dicts with ``ReadPlan.serialize_documents``.
+Writes and the admin keep using the ORM.
+
+Functions prefixed with ``a`` are the async counterparts used by
+``async_views``; they build the same queries and run them through Motor.
+"""
+from bson import ObjectId
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+
+from .db import get_async_db, get_db
+from .rollups import BOARD_BUCKETS, TOTALS
+from .models import (
+    User, Team, Activity, Workout, Leaderboard, LeaderboardScore, DailyActivityBucket,
+    TeamDailyActivityBucket
+)
+from .serializers import (
+    UserSerializer, TeamSerializer, ActivitySerializer, WorkoutSerializer,
+    LeaderboardSerializer, read_plan
+)
+
+_LOOKUPS = {'lt': '$lt', 'lte': '$lte', 'gt': '$gt', 'gte': '$gte', 'in': '$in'}
+
+
+class MongoQuery:
+    """
+    Minimal lazy, queryset-like wrapper around a collection.
+
+    Supports the subset of the QuerySet API that DRF's CursorPagination
+    uses (``order_by``, ``filter`` with range lookups and slicing), so the
+    existing pagination classes produce the same envelope over raw documents.
+    """
+
+    def __init__(self, model, query=None, columns=None, sort=None):
+        self.model = model
+        self.query = query or {}
+        self.columns = columns
+        self.sort = sort or []
+
+    def _clone(self, **changes):
+        params = {'query': self.query, 'columns': self.columns, 'sort': self.sort}
+        params.update(changes)
+        return type(self)(self.model, **params)
+
+    def _column(self, field_name):
+        return self.model._meta.get_field(field_name).column
+
+    def filter(self, **lookups):
+        query = dict(self.query)
+        for lookup, value in lookups.items():
+            field_name, _, operator = lookup.partition('__')
+            field = self.model._meta.get_field(field_name)
+            # Cursor positions arrive as strings; coerce like the ORM would.
+            if operator == 'in':
+                value = [field.to_python(item) for item in value]
+            else:
+                value = field.to_python(value)
+            if operator:
+                condition = dict(query.get(field.column, {}))
+                condition[_LOOKUPS[operator]] = value
+                query[field.column] = condition
+            else:
+                query[field.column] = value
+        return self._clone(query=query)
+
+    def order_by(self, *fields):
+        sort = [
+            (self._column(name.lstrip('-')),
+             DESCENDING if name.startswith('-') else ASCENDING)
+            for name in fields
+        ]
+        return self._clone(sort=sort)
+
+    def only(self, *fields):
+        """Limit the projection to the given fields, like ``QuerySet.only``"""
+        return self._clone(columns=list(dict.fromkeys(self._column(name) for name in fields)))
+
+    def where(self, condition):
+        """AND a raw MongoDB condition onto the query"""
+        query = {'$and': [self.query, condition]} if self.query else condition
+        return self._clone(query=query)
+
+    def _cursor(self, db=None):
+        projection = dict.fromkeys(self.columns, 1) if self.columns else None
+        db = db if db is not None else get_db()
+        cursor = db[self.model._meta.db_table].find(self.query, projection)
+        if self.sort:
+            cursor = cursor.sort(self.sort)
+        return cursor
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError('MongoQuery only supports slicing')
+        cursor = self._cursor()
+        start = item.start or 0
+        if start:
+            cursor = cursor.skip(start)
+        if item.stop is not None:
+            if item.stop <= start:
+                return []
+            cursor = cursor.limit(item.stop - start)
+        return list(cursor)
+
+    def __iter__(self):
+        return iter(self._cursor())
+
+    def iterator(self, batch_size=1000):
+        """Iterate over a server-side cursor fetching ``batch_size`` at a time"""
+        return iter(self._cursor().batch_size(batch_size))
+
+    async def alist(self, limit=None):
+        """Fetch up to ``limit`` documents through the async client"""
+        cursor = self._cursor(get_async_db())
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=None)
+
+
+ROSTER_FIELDS = ('username', 'full_name', 'avatar', 'stats')
+
+
+def team_pipeline(pk=None, columns=None, roster=True, stats=True):
+    """
+    Aggregation over teams, by name, with their members joined in.
+
+    With ``roster`` each document carries a ``roster`` of its users limited
+    to the fields ``member_summary`` needs, projected inside the ``$lookup``
+    so whole user documents (and their recent activities) never reach the
+    team document. With only ``stats`` the members are summed into a
+    one-document ``rollup`` instead. Either join is served by the users
+    ``team_id`` index (MongoDB 5.0+). Pass ``pk`` to fetch a single team and
+    ``columns`` to project fewer team columns.
+    """
+    if columns is None:
+        columns = read_plan(TeamSerializer).columns
+    pipeline = [{'$match': {'_id': pk}}] if pk is not None else []
+    pipeline.append({'$sort': {'name': ASCENDING}})
+    projection = dict.fromkeys(['_id', *columns], 1)
+    if roster:
+        members, name = [{'$project': dict.fromkeys(['_id', *ROSTER_FIELDS], 1)}], 'roster'
+    elif stats:
+        members, name = [{'$group': {
+            '_id': None,
+            'members_count': {'$sum': 1},
+            'total_points': {'$sum': '$stats.total_points'},
+            'activities_completed': {'$sum': {
+                '$ifNull': ['$stats.total_activities', '$stats.activities_completed']
+            }},
+        }}], 'rollup'
+    else:
+        members = None
+    if members:
+        pipeline.append({'$lookup': {
+            'from': User._meta.db_table,
+            'localField': '_id',
+            'foreignField': 'team_id',
+            'pipeline': members,
+            'as': name,
+        }})
+        projection[name] = 1
+    pipeline.append({'$project': projection})
+    return pipeline
+
+
+def teams(pk=None, columns=None, roster=True, stats=True):
+    """Teams with their rosters or member totals, in one aggregation"""
+    pipeline = team_pipeline(pk, columns, roster, stats)
+    return list(get_db()[Team._meta.db_table].aggregate(pipeline))
+
+
+async def ateams(pk=None, columns=None, roster=True, stats=True):
+    """Async version of ``teams``"""
+    cursor = get_async_db()[Team._meta.db_table].aggregate(
+        team_pipeline(pk, columns, roster, stats)
+    )
+    return await cursor.to_list(length=None)
+
+
+def activities(**filters):
+    """Activities matching the given field filters, newest first"""
+    columns = read_plan(ActivitySerializer).columns
+    return MongoQuery(Activity, columns=columns).filter(**filters).order_by(
+        *Activity._meta.ordering, '-_id'
+    )
+
+
+def users(**filters):
+    """Users matching the given field filters, most recently created first"""
+    columns = read_plan(UserSerializer).columns
+    return MongoQuery(User, columns=columns).filter(**filters).order_by(
+        *User._meta.ordering, '-_id'
+    )
+
+
+def workouts(**filters):
+    """Workouts matching the given field filters, by name"""
+    columns = read_plan(WorkoutSerializer).columns
+    return MongoQuery(Workout, columns=columns).filter(**filters).order_by(
+        *Workout._meta.ordering, '_id'
+    )
+
+
+def _rank_finds(board_type, points):
+    """
+    (pipeline summing the entries above ``points``, filter for the scores
+    among them) on one board's LeaderboardScore counts
+    """
+    high, low = max(points), min(points)
+    above = [
+        {'$match': {'type': board_type, 'points': {'$gt': high}}},
+        {'$group': {'_id': None, 'count': {'$sum': '$count'}}},
+    ]
+    return above, {'type': board_type, 'points': {'$gte': low, '$lte': high}}
+
+
+def _board_points(documents):
+    points = {}
+    for document in documents:
+        points.setdefault(document['type'], []).append(document['points'])
+    return points
+
+
+def _assign_ranks(documents, board_type, above, scores):
+    """Rank the entries of one board from the count above them and their scores"""
+    higher = above[0]['count'] if above else 0
+    ranks = {}
+    for score in sorted(scores, key=lambda score: score['points'], reverse=True):
+        ranks[score['points']] = higher + 1
+        higher += score['count']
+    for document in documents:
+        if document['type'] == board_type:
+            document['rank'] = ranks.get(document['points'])
+
+
+def with_ranks(documents):
+    """
+    Set the competition rank of each leaderboard document, one plus the
+    number of entries on its board with more points, and return them.
+    
+    Reads two ranges of the LeaderboardScore counts per board: the sum of
+    the counts above the documents' highest points and the counts between
+    their lowest and highest. The sum reads one index key per distinct
+    score above the page, so a deep page costs as much as the number of
+    distinct scores ahead of it, not the number of entries.
+    """
+    scores = get_db()[LeaderboardScore._meta.db_table]
+    for board_type, points in _board_points(documents).items():
+        above, within = _rank_finds(board_type, points)
+        _assign_ranks(documents, board_type, list(scores.aggregate(above)),
+                      scores.find(within, {'points': 1, 'count': 1}))
+    return documents
+
+
+async def awith_ranks(documents):
+    """Async version of ``with_ranks``"""
+    scores = get_async_db()[LeaderboardScore._meta.db_table]
+    for board_type, points in _board_points(documents).items():
+        above, within = _rank_finds(board_type, points)
+        _assign_ranks(documents, board_type,
+                      await scores.aggregate(above).to_list(length=None),
+                      await scores.find(within, {'points': 1, 'count': 1}).to_list(length=None))
+    return documents
+
+
+class LeaderboardQuery(MongoQuery):
+    """MongoQuery over leaderboard entries that ranks the entries it fetches"""
+
+    def only(self, *fields):
+        # Ranks are derived from each entry's board and points.
+        return super().only(*fields, 'type', 'points')
+
+    def __getitem__(self, item):
+        return with_ranks(super().__getitem__(item))
+
+    def __iter__(self):
+        return iter(self[:])
+
+    async def alist(self, limit=None):
+        return await awith_ranks(await super().alist(limit))
+
+
+def find_entry(pk, columns):
+    """Return the ranked leaderboard entry for a primary key, or None"""
+    try:
+        pk = ObjectId(pk)
+    except (InvalidId, TypeError):
+        return None
+    entry = get_db()[Leaderboard._meta.db_table].find_one(
+        {'_id': pk}, ['_id', 'type', 'points', *columns]
+    )
+    return with_ranks([entry])[0] if entry else None
+
+
+async def afind_entry(pk, columns):
+    """Async version of ``find_entry``"""
+    entry = await afind(Leaderboard, pk, ['_id', 'type', 'points', *columns])
+    return (await awith_ranks([entry]))[0] if entry else None
+
+
+def leaderboard(board_type=None):
+    """Ranked leaderboard entries, best first, optionally of one type only"""
+    columns = read_plan(LeaderboardSerializer).columns
+    query = LeaderboardQuery(Leaderboard, columns=columns)
+    if board_type is not None:
+        query = query.filter(type=board_type)
+    return query.order_by(*Leaderboard._meta.ordering)
+
+
+def leaderboard_version(board_type):
+    """Return (newest updated_at, entry count) for a leaderboard type"""
+    collection = get_db()[Leaderboard._meta.db_table]
+    newest = collection.find_one(
+        {'type': board_type}, {'updated_at': 1}, sort=[('updated_at', DESCENDING)]
+    )
+    count = collection.count_documents({'type': board_type})
+    return (newest or {}).get('updated_at'), count
+
+
+async def aleaderboard_version(board_type):
+    """Async version of ``leaderboard_version``"""
+    collection = get_async_db()[Leaderboard._meta.db_table]
+    newest = await collection.find_one(
+        {'type': board_type}, {'updated_at': 1}, sort=[('updated_at', DESCENDING)]
+    )
+    count = await collection.count_documents({'type': board_type})
+    return (newest or {}).get('updated_at'), count
+
+
+def buckets_version(board_type):
+    """Return the newest updated_at of the daily buckets a windowed board sums"""
+    newest = get_db()[BOARD_BUCKETS[board_type]._meta.db_table].find_one(
+        {}, {'updated_at': 1}, sort=[('updated_at', DESCENDING)]
+    )
+    return (newest or {}).get('updated_at')
+
+
+async def abuckets_version(board_type):
+    """Async version of ``buckets_version``"""
+    newest = await get_async_db()[BOARD_BUCKETS[board_type]._meta.db_table].find_one(
+        {}, {'updated_at': 1}, sort=[('updated_at', DESCENDING)]
+    )
+    return (newest or {}).get('updated_at')
+
+
+async def afind(model, pk, columns):
+    """Return the document of ``model`` with primary key ``pk``, or None"""
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except (InvalidId, TypeError, ValidationError):
+        return None
+    return await get_async_db()[model._meta.db_table].find_one({'_id': pk}, list(columns))
+
+
+def find_user(pk, columns=('username',)):
+    """Return the user document for a primary key, or None"""
+    try:
+        pk = ObjectId(pk)
+    except (InvalidId, TypeError):
+        return None
+    return get_db()[User._meta.db_table].find_one({'_id': pk}, list(columns))
+
+
+def team_usernames(team_id):
+    """Usernames of a team's members, read from the user_team index"""
+    return [
+        user['username']
+        for user in get_db()[User._meta.db_table].find({'team_id': team_id}, {'username': 1})
+    ]
+
+
+async def ateam_usernames(team_id):
+    """Async version of ``team_usernames``"""
+    cursor = get_async_db()[User._meta.db_table].find({'team_id': team_id}, {'username': 1})
+    return [user['username'] async for user in cursor]
+
+
+def find_team(pk, columns=('_id',)):
+    """Return the team document for a primary key, or None"""
+    return get_db()[Team._meta.db_table].find_one({'_id': pk}, list(columns))
+
+
+SEARCH_TARGETS = {
+    'activity': (Activity, ActivitySerializer),
+    'workout': (Workout, WorkoutSerializer),
+}
+
+
+_SCORE = {'$meta': 'textScore'}
+
+
+def _text_query(terms):
+    return {'$text': {'$search': terms}}
+
+
+class TextSearch:
+    """
+    Lazy ``$text`` matches over several collections, by relevance.
+
+    Counts and slices like a QuerySet, so DRF's page-number pagination can
+    page it. A slice reads the best ``stop`` matches of each collection from
+    its text index and merges them by score; ties go by kind and ``_id`` so
+    pages are stable. Rows are ``(kind, score, document)``. Only the best
+    SEARCH_MAX_RESULTS matches are reachable: the count stops there, so no
+    page reads deeper into an index.
+    """
+
+    def __init__(self, terms, kinds=None):
+        self.terms = terms
+        self.kinds = list(kinds or SEARCH_TARGETS)
+        self.limit = settings.SEARCH_MAX_RESULTS
+
+    def count(self):
+        db = get_db()
+        found = 0
+        for kind in self.kinds:
+            found += db[SEARCH_TARGETS[kind][0]._meta.db_table].count_documents(
+                _text_query(self.terms), limit=self.limit - found
+            )
+            if found >= self.limit:
+                break
+        return found
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError('TextSearch only supports slicing')
+        start, stop = item.start or 0, min(item.stop or 0, self.limit)
+        if stop <= start:
+            return []
+        db = get_db()
+        rows = []
+        for kind in self.kinds:
+            model, serializer_class = SEARCH_TARGETS[kind]
+            projection = {**dict.fromkeys(read_plan(serializer_class).columns, 1), 'score': _SCORE}
+            cursor = db[model._meta.db_table].find(_text_query(self.terms), projection).sort(
+                [('score', _SCORE), ('_id', ASCENDING)]
+            ).limit(stop)
+            rows += [(kind, document.pop('score'), document) for document in cursor]
+        rows.sort(key=lambda row: (-row[1], row[0], str(row[2]['_id'])))
+        return rows[start:stop]
+
+
+def text_search_ids(model, terms, limit):
+    """Primary keys of the ``limit`` best text-index matches in ``model``'s collection"""
+    cursor = get_db()[model._meta.db_table].find(
+        _text_query(terms), {'score': _SCORE}
+    ).sort([('score', _SCORE)]).limit(limit)
+    return [document['_id'] for document in cursor]
+
+
+SUMMARY_DIMENSIONS = {
+    'user': '$user_id',
+    'team': '$team_id',
+    'type': '$type',
+}
+
+SUMMARY_PERIODS = {
+    'day': '%Y-%m-%d',
+    'week': '%G-W%V',
+    'month': '%Y-%m',
+}
+
+
+def summary_pipeline(group_by, date_from=None, date_to=None):
+    """
+    Aggregation of activities into counts and totals per group.
+
+    ``group_by`` is a sequence of SUMMARY_DIMENSIONS keys plus at most one
+    SUMMARY_PERIODS key; ``date_from`` is inclusive and ``date_to``
+    exclusive. The date range is matched first so the ``activity_date``
+    index bounds the scan. Grouping by team first totals activities per user
+    and the other keys, joins those rows to their users and then sums them
+    per team, so users are looked up per group instead of per activity.
+    """
+    match = {}
+    if date_from or date_to:
+        match['date'] = {}
+        if date_from:
+            match['date']['$gte'] = date_from
+        if date_to:
+            match['date']['$lt'] = date_to
+    pipeline = [{'$match': match}]
+    group_id = {}
+    for key in group_by:
+        if key in SUMMARY_DIMENSIONS:
+            group_id[key] = SUMMARY_DIMENSIONS[key]
+        else:
+            group_id['period'] = {
+                '$dateToString': {'format': SUMMARY_PERIODS[key], 'date': '$date'}
+            }
+    totals = {
+        'count': {'$sum': 1},
+        'total_minutes': {'$sum': '$duration_minutes'},
+        'total_distance_km': {'$sum': '$distance_km'},
+        'total_points': {'$sum': '$points'},
+    }
+    if 'team' in group_by:
+        by_user = {key: value for key, value in group_id.items() if key != 'team'}
+        by_user['user'] = SUMMARY_DIMENSIONS['user']
+        pipeline += [
+            {'$group': {'_id': by_user, **totals}},
+            {'$lookup': {
+                'from': User._meta.db_table,
+                'localField': '_id.user',
+                'foreignField': 'username',
+                'as': 'user',
+            }},
+        ]
+        group_id = {
+            key: {'$arrayElemAt': ['$user.team_id', 0]} if key == 'team' else f'$_id.{key}'
+            for key in group_id
+        }
+        totals = {name: {'$sum': f'${name}'} for name in totals}
+    pipeline += [
+        {'$group': {'_id': group_id or None, **totals}},
+        {'$sort': {'_id': 1}},
+    ]
+    return pipeline
+
+
+def _summary_row(doc):
+    row = dict(doc.pop('_id') or {})
+    row.update(doc)
+    row['total_distance_km'] = round(row['total_distance_km'], 2)
+    return row
+
+
+def activity_summary(group_by, date_from=None, date_to=None):
+    """Rows of ``summary_pipeline`` with the group keys flattened in"""
+    pipeline = summary_pipeline(group_by, date_from, date_to)
+    return [_summary_row(doc) for doc in get_db()[Activity._meta.db_table].aggregate(pipeline)]
+
+
+async def aactivity_summary(group_by, date_from=None, date_to=None):
+    """Async version of ``activity_summary``"""
+    pipeline = summary_pipeline(group_by, date_from, date_to)
+    cursor = get_async_db()[Activity._meta.db_table].aggregate(pipeline)
+    return [_summary_row(doc) async for doc in cursor]
+
+
+HISTORY_SOURCES = {
+    'user': (DailyActivityBucket, 'user_id'),
+    'team': (TeamDailyActivityBucket, 'team_id'),
+}
+
+
+def _history_query(kind, key, start, end):
+    model, field = HISTORY_SOURCES[kind]
+    return (model._meta.db_table,
+            {field: key, 'day': {'$gte': start, '$lt': end}},
+            dict.fromkeys(['day', *TOTALS], 1))
+
+
+def history_buckets(kind, key, start, end):
+    """
+    Day buckets of one user (by username) or team in [start, end), read
+    from the (user_id, day) or (team_id, day) index
+    """
+    table, query, projection = _history_query(kind, key, start, end)
+    return list(get_db()[table].find(query, projection))
+
+
+async def ahistory_buckets(kind, key, start, end):
+    """Async version of ``history_buckets``"""
+    table, query, projection = _history_query(kind, key, start, end)
+    return await get_async_db()[table].find(query, projection).to_list(length=None)
@@ -0,0 +1,155 @@
+"""
+Per-user and per-team daily activity buckets.
+
+Every activity write increments one ``activity_daily`` document per
+(user, day) and one ``activity_team_daily`` document per (team, day), so
+queries over a date window sum at most users x days small documents instead
+of scanning raw activities. Windows are computed from the current time on
+each read, so they roll over without any rebuild. History charts read one
+entity's day buckets and sum them into weeks or months as they go, so a
+year of history is at most 365 documents whatever the activity volume.
+
+``backfill_rollups`` rebuilds the buckets from the activities while holding
+``backfill_lock``. Activity writes hold ``activity_writes`` from writing the
+activity through incrementing its buckets, so each one is either in the
+activities the backfill reads or increments the buckets it swapped in, and
+is neither lost nor counted twice.
+"""
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from .locks import exclusive_lock, shared_lock
+from .models import DailyActivityBucket, TeamDailyActivityBucket
+
+WINDOWS = ('week', 'month', '30d')
+# Buckets each windowed board is summed from.
+BOARD_BUCKETS = {'individual': DailyActivityBucket, 'team': TeamDailyActivityBucket}
+GRANULARITIES = ('day', 'week', 'month')
+TOTALS = ('points', 'activities_count', 'duration_minutes', 'distance_km')
+ROLLUPS_LOCK = 'rollups'
+
+
+def backfill_lock(db):
+    """Hold the buckets alone, waiting for the activity writes in flight to finish"""
+    return exclusive_lock(db, ROLLUPS_LOCK)
+
+
+def activity_writes(db):
+    """Shared lease for a write to activities and the buckets they roll up to"""
+    return shared_lock(db, [ROLLUPS_LOCK])
+
+
+def day_start(value):
+    """Return midnight UTC of the day a datetime falls on"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+
+
+def window_start(window, now=None):
+    """Return the inclusive start of a leaderboard window"""
+    today = day_start(now or datetime.now(timezone.utc))
+    if window == 'week':
+        return today - timedelta(days=today.weekday())
+    if window == 'month':
+        return today.replace(day=1)
+    if window == '30d':
+        return today - timedelta(days=29)
+    raise ValueError(f'Unknown window: {window}')
+
+
+def period_start(day, granularity):
+    """Return the start of the day, ISO week or month a bucket day falls in"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'Unknown granularity: {granularity}')
+
+
+def next_period(start, granularity):
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(weeks=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def history_series(buckets, granularity, start, end):
+    """
+    Sum day buckets into one row per period in [start, end), oldest first.
+
+    ``start`` must be a period start. Periods without activity are included
+    with zero totals so charts get an evenly spaced series.
+    """
+    rows = {}
+    period = start
+    while period < end:
+        rows[period] = dict.fromkeys(TOTALS, 0)
+        period = next_period(period, granularity)
+    for bucket in buckets:
+        day = bucket['day']
+        if day.tzinfo is None:
+            day = day.replace(tzinfo=timezone.utc)
+        totals = rows.get(period_start(day, granularity))
+        if totals is None:
+            continue
+        for name in TOTALS:
+            totals[name] += bucket.get(name) or 0
+    results = []
+    for period, totals in rows.items():
+        totals['distance_km'] = round(totals['distance_km'], 2)
+        results.append({'start': period.date().isoformat(), **totals})
+    return results
+
+
+def _increment(key, totals, now):
+    return {
+        '$inc': dict(zip(TOTALS, totals)),
+        '$set': {'updated_at': now},
+        '$setOnInsert': key,
+    }
+
+
+def record_daily(db, daily, teams, now):
+    """
+    Apply {(username, day): (points_delta, count_delta, minutes_delta,
+    distance_delta)} to the user and team day buckets, stamping them with
+    ``now`` so cached windowed boards can tell they changed.
+
+    ``teams`` maps usernames to their team_id. Team buckets follow the user's
+    current team, like the team leaderboard; users without one only count
+    towards their own buckets.
+    """
+    team_daily = {}
+    requests = []
+    for (username, day), totals in daily.items():
+        if not any(totals):
+            continue
+        team_id = teams.get(username)
+        requests.append(UpdateOne(
+            {'_id': f'{username}|{day:%Y-%m-%d}'},
+            _increment({'user_id': username, 'team_id': team_id, 'day': day}, totals, now),
+            upsert=True,
+        ))
+        if team_id:
+            team_totals = team_daily.setdefault((team_id, day), [0, 0, 0, 0])
+            for index, value in enumerate(totals):
+                team_totals[index] += value
+    if requests:
+        db[DailyActivityBucket._meta.db_table].bulk_write(requests, ordered=False)
+    requests = [
+        UpdateOne(
+            {'_id': f'{team_id}|{day:%Y-%m-%d}'},
+            _increment({'team_id': team_id, 'day': day}, totals, now),
+            upsert=True,
+        )
+        for (team_id, day), totals in team_daily.items()
+    ]
+    if requests:
+        db[TeamDailyActivityBucket._meta.db_table].bulk_write(requests, ordered=False)
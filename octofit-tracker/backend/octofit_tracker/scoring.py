@@ -0,0 +1,38 @@
+"""
+Activity points.
+
+An activity scores ``base + per_minute * duration_minutes + per_km *
+distance_km``, truncated to an integer, with the coefficients configured
+for its type in ``SCORING_RULES`` and those of the ``default`` entry for any
+left out. Every activity written through ``ActivitySerializer`` is scored
+here, whatever ``points`` the client sent. After changing the rules,
+``manage.py rescore_activities`` rescores the stored history with the same
+arithmetic over NumPy columns.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+
+Rule = namedtuple('Rule', 'base per_minute per_km')
+
+# Coefficients used when SCORING_RULES has no 'default' entry.
+DEFAULT_RULE = {'base': 0, 'per_minute': 1, 'per_km': 10}
+
+
+def rules():
+    """Return ({activity type: Rule}, default Rule) for the current settings"""
+    configured = dict(settings.SCORING_RULES)
+    default = {**DEFAULT_RULE, **configured.pop('default', {})}
+    return (
+        {activity_type: Rule(**{**default, **rule})
+         for activity_type, rule in configured.items()},
+        Rule(**default),
+    )
+
+
+def score(activity_type, duration_minutes, distance_km=None):
+    """Points for one activity"""
+    by_type, default = rules()
+    rule = by_type.get(activity_type, default)
+    return int(rule.base + rule.per_minute * (duration_minutes or 0)
+               + rule.per_km * (distance_km or 0))
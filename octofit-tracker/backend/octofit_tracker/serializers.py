@@ -1,6 +1,100 @@
+import ast
+import copy
+import datetime
+from functools import lru_cache
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
+from rest_framework.fields import ISO_8601
+from rest_framework.settings import api_settings
+from . import scoring
 from .models import User, Team, Activity, Workout, Leaderboard
-import ast
+
+
+@lru_cache(maxsize=4096)
+def _cached_literal(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def _parse_literal(value):
+    """Parse a stringified Python literal once per distinct string; each caller gets its own copy"""
+    return copy.deepcopy(_cached_literal(value))
+
+
+def normalize_stats(stats):
+    """Convert stats to proper dict format"""
+    # If stats is a string representation, try to parse it
+    if isinstance(stats, str):
+        stats = _parse_literal(stats)
+    if isinstance(stats, dict):
+        return {
+            'total_points': stats.get('total_points', 0),
+            'activities_completed': stats.get('total_activities', stats.get('activities_completed', 0))
+        }
+    return {'total_points': 0, 'activities_completed': 0}
+
+
+def normalize_list(value):
+    """Convert a list or its string representation to a list"""
+    if isinstance(value, str):
+        parsed = _parse_literal(value)
+        return parsed if parsed is not None else []
+    return value if value else []
+
+
+def member_summary(user):
+    """Compact roster entry for a user document embedded in a team"""
+    stats = normalize_stats(user.get('stats'))
+    return {
+        'username': user.get('username'),
+        'full_name': user.get('full_name'),
+        'avatar': user.get('avatar'),
+        'total_points': stats['total_points'],
+        'activities_completed': stats['activities_completed'],
+    }
+
+
+def team_rollup(roster):
+    """Member count and totals over a team's member summaries"""
+    return {
+        'members_count': len(roster),
+        'total_points': sum(member['total_points'] for member in roster),
+        'activities_completed': sum(member['activities_completed'] for member in roster),
+    }
+
+
+def serialize_teams(documents, fields=None):
+    """
+    Serialize ``repository.teams`` documents with roster and rollups embedded.
+
+    ``fields`` limits the output as for ``read_plan``, ``roster`` and
+    ``stats`` included. Totals come from the roster when it was joined and
+    from the aggregation's ``rollup`` otherwise.
+    """
+    plan = read_plan(TeamSerializer, fields)
+    data = []
+    for document in documents:
+        team = plan.serialize_document(document)
+        if 'roster' in document:
+            roster = sorted(
+                (member_summary(user) for user in document['roster']),
+                key=lambda member: (-member['total_points'], member['username']),
+            )
+            if fields is None or 'roster' in fields:
+                team['roster'] = roster
+            if fields is None or 'stats' in fields:
+                team['stats'] = team_rollup(roster)
+        elif 'rollup' in document:
+            rollup = document['rollup'][0] if document['rollup'] else {}
+            team['stats'] = {name: rollup.get(name, 0) for name in
+                             ('members_count', 'total_points', 'activities_completed')}
+        data.append(team)
+    return data
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -12,34 +106,11 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['_id', 'email', 'username', 'full_name', 'team_id', 'role', 
                   'avatar', 'created_at', 'stats']
         read_only_fields = ['_id', 'created_at']
+        read_converters = {'stats': normalize_stats}
     
     def get_stats(self, obj):
         """Convert stats to proper dict format"""
-        if obj.stats is None:
-            return {'total_points': 0, 'activities_completed': 0}
-        
-        # If stats is a string representation, try to parse it
-        if isinstance(obj.stats, str):
-            try:
-                # Try to parse as Python literal (OrderedDict, dict, etc.)
-                parsed = ast.literal_eval(obj.stats)
-                if isinstance(parsed, dict):
-                    # Convert to standard format
-                    return {
-                        'total_points': parsed.get('total_points', 0),
-                        'activities_completed': parsed.get('total_activities', parsed.get('activities_completed', 0))
-                    }
-            except (ValueError, SyntaxError):
-                pass
-        
-        # If stats is already a dict
-        if isinstance(obj.stats, dict):
-            return {
-                'total_points': obj.stats.get('total_points', 0),
-                'activities_completed': obj.stats.get('total_activities', obj.stats.get('activities_completed', 0))
-            }
-        
-        return {'total_points': 0, 'activities_completed': 0}
+        return normalize_stats(obj.stats)
 
 
 class TeamSerializer(serializers.ModelSerializer):
@@ -50,15 +121,11 @@ class TeamSerializer(serializers.ModelSerializer):
         model = Team
         fields = ['_id', 'name', 'description', 'created_at', 'members']
         read_only_fields = ['created_at']
+        read_converters = {'members': normalize_list}
     
     def get_members(self, obj):
         """Convert members string to list if needed"""
-        if isinstance(obj.members, str):
-            try:
-                return ast.literal_eval(obj.members)
-            except (ValueError, SyntaxError):
-                return []
-        return obj.members if obj.members else []
+        return normalize_list(obj.members)
 
 
 class ActivitySerializer(serializers.ModelSerializer):
@@ -67,7 +134,18 @@ class ActivitySerializer(serializers.ModelSerializer):
         model = Activity
         fields = ['_id', 'user_id', 'type', 'duration_minutes', 'distance_km', 
                   'points', 'date', 'notes', 'created_at']
-        read_only_fields = ['_id', 'created_at']
+        read_only_fields = ['_id', 'points', 'created_at']
+    
+    def validate(self, attrs):
+        """Score the activity with the rules for its type"""
+        scored = {
+            name: attrs[name] if name in attrs else getattr(self.instance, name, None)
+            for name in ('type', 'duration_minutes', 'distance_km')
+        }
+        attrs['points'] = scoring.score(
+            scored['type'], scored['duration_minutes'], scored['distance_km']
+        )
+        return attrs
 
 
 class WorkoutSerializer(serializers.ModelSerializer):
@@ -79,21 +157,140 @@ class WorkoutSerializer(serializers.ModelSerializer):
         fields = ['_id', 'name', 'description', 'type', 'duration_minutes', 
                   'difficulty', 'exercises', 'created_at']
         read_only_fields = ['_id', 'created_at']
+        read_converters = {'exercises': normalize_list}
     
     def get_exercises(self, obj):
         """Convert exercises string to list if needed"""
-        if isinstance(obj.exercises, str):
-            try:
-                return ast.literal_eval(obj.exercises)
-            except (ValueError, SyntaxError):
-                return []
-        return obj.exercises if obj.exercises else []
+        return normalize_list(obj.exercises)
 
 
 class LeaderboardSerializer(serializers.ModelSerializer):
     """Serializer for Leaderboard model"""
+    # Not stored: the read path sets it on each row (repository.with_ranks).
+    rank = serializers.IntegerField(read_only=True)
+    
     class Meta:
         model = Leaderboard
         fields = ['_id', 'type', 'user_id', 'team_id', 'full_name', 'team_name', 
                   'points', 'activities_count', 'members_count', 'rank', 'updated_at']
         read_only_fields = ['_id', 'updated_at']
+
+
+def _utc_isoformat(value):
+    """DRF's ISO 8601 DateTimeField output for a UTC deployment"""
+    if isinstance(value, str):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    else:
+        value = value.astimezone(datetime.timezone.utc)
+    return value.isoformat()[:-6] + 'Z'
+
+
+def _converter(field):
+    """Pick a plain callable equivalent to field.to_representation"""
+    if isinstance(field, serializers.SerializerMethodField):
+        return None
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        utc_iso = (settings.USE_TZ and settings.TIME_ZONE == 'UTC'
+                   and output_format and output_format.lower() == ISO_8601)
+        return _utc_isoformat if utc_iso else field.to_representation
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, (serializers.CharField, serializers.ModelField)):
+        return str
+    return field.to_representation
+
+
+class ReadPlan:
+    """
+    Precompiled read-only form of a ModelSerializer.
+
+    Builds the serializer's fields once and reduces each one to a getter and
+    a plain converter, so serializing a row is one pass over a short list
+    with the same output as ``serializer_class(obj).data``. Method fields
+    listed in ``Meta.read_converters`` read the model attribute of the same
+    name and pass it through the given function instead of calling the
+    serializer method.
+
+    Rows can be model instances (``serialize``) or raw MongoDB documents
+    (``serialize_document``); ``columns`` is the projection the latter need
+    and ``sources`` the model fields either reads. A declared field whose
+    source is not a model field is read from the row as is, for values the
+    read path sets on each row itself. Pass ``fields`` to keep
+    only those output fields, as for a sparse fieldset; ``names`` is what
+    the plan outputs.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        serializer = serializer_class()
+        model = serializer_class.Meta.model
+        read_converters = getattr(serializer_class.Meta, 'read_converters', {})
+        self.names = []
+        self.sources = []
+        self.fields = []
+        self.document_fields = []
+        columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            self.names.append(name)
+            if name in read_converters:
+                convert, source, always = read_converters[name], name, True
+            else:
+                convert, source, always = _converter(field), field.source, False
+            if convert is None:
+                # Generic method field: call the serializer method on the row.
+                method = getattr(serializer, field.method_name)
+                self.fields.append((name, lambda obj: obj, method, True))
+                self.document_fields = self.sources = None
+                continue
+            self.fields.append((name, attrgetter(source), convert, always))
+            try:
+                column = model._meta.get_field(source).column
+            except FieldDoesNotExist:
+                column = None
+            if self.sources is not None and column is not None:
+                self.sources.append(source)
+            if self.document_fields is not None:
+                self.document_fields.append((name, column or source, convert, always))
+                if column is not None:
+                    columns.append(column)
+        self.columns = columns if self.document_fields is not None else None
+
+    def serialize(self, obj):
+        """Serialize one model instance to a dict"""
+        data = {}
+        for name, get, convert, always in self.fields:
+            value = get(obj)
+            data[name] = convert(value) if always or value is not None else None
+        return data
+
+    def serialize_many(self, objs):
+        """Serialize an iterable of model instances to a list of dicts"""
+        serialize = self.serialize
+        return [serialize(obj) for obj in objs]
+
+    def serialize_document(self, doc):
+        """Serialize one raw MongoDB document to a dict"""
+        if self.document_fields is None:
+            raise TypeError('Serializer has method fields without read_converters')
+        data = {}
+        for name, column, convert, always in self.document_fields:
+            value = doc.get(column)
+            data[name] = convert(value) if always or value is not None else None
+        return data
+
+    def serialize_documents(self, docs):
+        """Serialize an iterable of raw MongoDB documents to a list of dicts"""
+        serialize = self.serialize_document
+        return [serialize(doc) for doc in docs]
+
+
+@lru_cache(maxsize=None)
+def read_plan(serializer_class, fields=None):
+    """Return the cached ReadPlan for a serializer class and optional field set"""
+    return ReadPlan(serializer_class, fields)
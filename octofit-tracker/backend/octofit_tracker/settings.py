@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.instrumentation.DatabaseTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -165,3 +166,55 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+
+# Seconds a worker may serve a cached leaderboard response before re-reading
+# MongoDB. Writes in the same process invalidate the cache immediately.
+LEADERBOARD_CACHE_TTL = 30
+
+# Requests slower than this many milliseconds are logged with their database
+# breakdown to the octofit_tracker.slow_requests logger. None disables it.
+SLOW_REQUEST_MS = 500
+
+# Delta sync (?since= on the user, activity and leaderboard lists): most
+# changes per response, how many seconds a change must age before it is
+# returned so in-flight writes are not skipped, and how long tombstones of
+# deleted rows are kept. Older tokens get 410 and must refetch the list.
+SYNC_PAGE_SIZE = 1000
+SYNC_SETTLE_SECONDS = 2
+SYNC_TOMBSTONE_DAYS = 30
+
+# Live leaderboard stream (octofit_tracker.live, ASGI only): largest limit a
+# client may ask for, how long to coalesce bursts of writes, how often feeds
+# re-read their board to catch other workers' writes, the keepalive and
+# client reconnect intervals, and whether to also watch a change stream
+# (requires a replica set).
+LIVE_MAX_LIMIT = 100
+LIVE_DEBOUNCE_SECONDS = 0.5
+LIVE_POLL_SECONDS = 15
+LIVE_KEEPALIVE_SECONDS = 20
+LIVE_RETRY_MS = 3000
+LIVE_CHANGE_STREAMS = False
+
+# Admin changelists (octofit_tracker.changelist): most rows a filtered
+# changelist counts before showing "N+", and how many seconds the distinct
+# values offered by list filters are cached.
+ADMIN_COUNT_LIMIT = 1000
+ADMIN_FACET_TTL = 300
+
+# Search (/search/): most matches one query can page through. Pages past it
+# are 404 and the count stops there, so no request reads deeper than this
+# into any collection's text index.
+SEARCH_MAX_RESULTS = 1000
+
+# Activity points (octofit_tracker.scoring): base + per_minute * duration +
+# per_km * distance, truncated to an integer, with the coefficients of the
+# activity's type, falling back to 'default' for any left out. Run
+# `manage.py rescore_activities` after changing them to rescore history.
+SCORING_RULES = {
+    'default': {'base': 0, 'per_minute': 1, 'per_km': 10},
+}
+
+# Activity history (/users/{id}/history/ and /teams/{id}/history/): longest
+# from/to range, in days, one request may chart. Each day is one bucket
+# document read; `manage.py backfill_rollups` rebuilds the buckets.
+HISTORY_MAX_DAYS = 731
@@ -0,0 +1,209 @@
+"""
+Delta sync for clients that poll lists.
+
+``?since=`` on the user, activity and leaderboard lists returns only the
+rows created or updated after a point in time, the primary keys of rows
+deleted since then, and a ``token`` to send as ``since`` on the next poll,
+so steady-state polling costs as much as the changes rather than the list.
+
+Changed rows are read from each collection's ``(updated_at, _id)`` index.
+Leaderboard rows carry their rank as of the read; ranks are not stored, so
+an entry that another one passes keeps its ``updated_at`` and is only
+re-sent when it moves itself.
+Deletes go through the ORM, whose ``post_delete`` signal leaves a
+``Tombstone``; rows removed with raw ``delete_many`` (``populate_db``) are
+not tracked, so clients must refetch after a reseed.
+
+``since`` is either an ISO 8601 timestamp, for the first poll after a full
+fetch, or a token: the keyset positions reached in the rows and in the
+tombstones. A delta bigger than ``SYNC_PAGE_SIZE`` comes back over several
+responses with ``more`` set. Only changes at least ``SYNC_SETTLE_SECONDS``
+old are returned, so a write still in flight when a poll runs is picked up
+by the next one instead of being skipped. Tombstones expire after
+``SYNC_TOMBSTONE_DAYS``; an older ``since`` is reported by ``expired`` and
+the client has to refetch the full list.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_datetime
+from pymongo import ASCENDING
+
+from . import repository
+from .db import get_async_db, get_db
+from .models import Activity, Leaderboard, Tombstone, User
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EXPIRED_MESSAGE = 'since is older than the deletions kept for sync; refetch the full list'
+
+
+def _millis(value):
+    """MongoDB stores datetimes in milliseconds; positions use the same unit"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+def _datetime(millis):
+    return EPOCH + timedelta(milliseconds=millis)
+
+
+def encode_token(positions):
+    payload = json.dumps({'r': positions[0], 'd': positions[1]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def parse_since(value):
+    """
+    Decode ``since`` into (rows, tombstones) positions.
+
+    A position is ``[millis, pk]``: everything before that keyset position
+    has been seen. ``pk`` is None for a plain timestamp. Raises ValueError
+    with a client-facing message for anything else.
+    """
+    timestamp = parse_datetime(value)
+    if timestamp is not None:
+        position = [_millis(timestamp), None]
+        return position, list(position)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(value.encode()))
+        positions = payload['r'], payload['d']
+        for millis, pk in positions:
+            if not isinstance(millis, int) or not (pk is None or ObjectId.is_valid(pk)):
+                raise ValueError
+            _datetime(millis)
+    except (ValueError, TypeError, KeyError, OverflowError, binascii.Error):
+        raise ValueError('since must be an ISO 8601 timestamp or a sync token')
+    return [list(position) for position in positions]
+
+
+def expired(positions, now=None):
+    """True if ``since`` predates the tombstones still kept"""
+    now = now or django_timezone.now()
+    oldest = now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    return _datetime(positions[1][0]) < oldest
+
+
+def _query(column, position, settled, pk_field, extra=None):
+    """Filter for rows past ``position`` whose ``column`` is at most ``settled``"""
+    millis, pk = position
+    since = _datetime(millis)
+    if pk is None:
+        after = {column: {'$gte': since}}
+    else:
+        pk = pk_field.to_python(pk)
+        after = {'$or': [
+            {column: {'$gt': since}},
+            {column: since, '_id': {'$gt': pk}},
+        ]}
+    return {'$and': [{**(extra or {}), column: {'$lte': settled}}, after]}
+
+
+def _advance(documents, column, position, limit, settled):
+    """The position after ``documents``, and whether more changes remain"""
+    if len(documents) > limit:
+        last = documents[limit - 1]
+        return [_millis(last[column]), str(last['_id'])], True
+    # Caught up: everything up to ``settled`` has been seen.
+    return [max(position[0], _millis(settled) + 1), None], False
+
+
+class Delta:
+    """
+    The finds for one delta read of ``model``'s collection.
+
+    ``columns`` is the projection of the changed rows; ``updated_at`` is
+    always added to it since positions are built from it, and leaderboard
+    rows also read the board and points their rank is derived from.
+    """
+
+    def __init__(self, model, positions, columns, limit=None, now=None):
+        self.model = model
+        self.positions = positions
+        self.limit = limit or settings.SYNC_PAGE_SIZE
+        now = now or django_timezone.now()
+        self.settled = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+        if model is Leaderboard:
+            columns = [*columns, 'type', 'points']
+        self.columns = list(dict.fromkeys(['_id', *columns, 'updated_at']))
+
+    def row_find(self):
+        query = _query('updated_at', self.positions[0], self.settled, self.model._meta.pk)
+        return self.model._meta.db_table, query, self.columns
+
+    def tombstone_find(self):
+        query = _query(
+            'deleted_at', self.positions[1], self.settled, Tombstone._meta.pk,
+            {'collection': self.model._meta.db_table},
+        )
+        return Tombstone._meta.db_table, query, {'object_id': 1, 'deleted_at': 1}
+
+    def result(self, documents, tombstones):
+        """(changed documents, deleted pks, next token, more)"""
+        rows, more_rows = _advance(
+            documents, 'updated_at', self.positions[0], self.limit, self.settled
+        )
+        deleted, more_deleted = _advance(
+            tombstones, 'deleted_at', self.positions[1], self.limit, self.settled
+        )
+        return (
+            documents[:self.limit],
+            [tombstone['object_id'] for tombstone in tombstones[:self.limit]],
+            encode_token([rows, deleted]),
+            more_rows or more_deleted,
+        )
+
+
+def _sort(column):
+    return [(column, ASCENDING), ('_id', ASCENDING)]
+
+
+def changes(model, positions, columns, limit=None, now=None):
+    """Rows of ``model`` changed and deleted since ``positions``"""
+    delta = Delta(model, positions, columns, limit, now)
+    db = get_db()
+    collection, query, projection = delta.row_find()
+    documents = list(db[collection].find(query, projection)
+                     .sort(_sort('updated_at')).limit(delta.limit + 1))
+    if model is Leaderboard:
+        repository.with_ranks(documents)
+    collection, query, projection = delta.tombstone_find()
+    tombstones = list(db[collection].find(query, projection)
+                      .sort(_sort('deleted_at')).limit(delta.limit + 1))
+    return delta.result(documents, tombstones)
+
+
+async def achanges(model, positions, columns, limit=None, now=None):
+    """Async version of ``changes``"""
+    delta = Delta(model, positions, columns, limit, now)
+    db = get_async_db()
+    collection, query, projection = delta.row_find()
+    documents = await db[collection].find(query, projection).sort(
+        _sort('updated_at')).to_list(delta.limit + 1)
+    if model is Leaderboard:
+        await repository.awith_ranks(documents)
+    collection, query, projection = delta.tombstone_find()
+    tombstones = await db[collection].find(query, projection).sort(
+        _sort('deleted_at')).to_list(delta.limit + 1)
+    return delta.result(documents, tombstones)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Activity)
+@receiver(post_delete, sender=Leaderboard)
+def record_tombstone(sender, instance, **kwargs):
+    tombstone = {
+        'collection': sender._meta.db_table,
+        'object_id': str(instance.pk),
+        'deleted_at': django_timezone.now(),
+    }
+    if sender is Activity:
+        tombstone['user_id'] = instance.user_id
+    get_db()[Tombstone._meta.db_table].insert_one(tombstone)
@@ -1,9 +1,35 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+import time
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, SimpleTestCase, override_settings
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
-from datetime import datetime
-from .models import User, Team, Activity, Workout, Leaderboard
+import json
+from datetime import datetime, timedelta, timezone
+from .admin import ActivityAdmin
+from .models import (
+    User, Team, Activity, Workout, Leaderboard, LeaderboardScore, DailyActivityBucket, Tombstone
+)
+from .management.commands.ensure_indexes import built_as_declared, declared_indexes
+from .management.commands import rebuild_leaderboard, reconcile_stats, rescore_activities
+from . import repository, scoring
+from .db import get_db
+from .ingest import activity_document, insert_activities
+from .leaderboard import board_lock, move_leaderboards
+from .live import event as live_event, rank_changes
+from .rollups import backfill_lock
+from .sync import encode_token
+from rest_framework.renderers import JSONRenderer
+from .serializers import (
+    UserSerializer, ActivitySerializer, WorkoutSerializer,
+    LeaderboardSerializer, normalize_list, read_plan
+)
 
 
 class UserModelTest(TestCase):
@@ -96,15 +122,26 @@ class LeaderboardModelTest(TestCase):
             'user_id': 'testuser',
             'full_name': 'Test User',
             'points': 100,
-            'activities_count': 5,
-            'rank': 1
+            'activities_count': 5
         }
     
     def test_leaderboard_creation(self):
         """Test creating a leaderboard entry"""
         entry = Leaderboard.objects.create(**self.leaderboard_data)
         self.assertEqual(entry.type, 'individual')
-        self.assertEqual(entry.rank, 1)
+    
+    def test_saves_move_score_counts(self):
+        """Test ORM saves and deletes keep the per-points counts"""
+        scores = get_db()[LeaderboardScore._meta.db_table]
+        entry = Leaderboard.objects.create(**self.leaderboard_data)
+        Leaderboard.objects.create(**{**self.leaderboard_data, 'user_id': 'other'})
+        self.assertEqual(scores.find_one({'_id': 'individual|100'})['count'], 2)
+        entry = Leaderboard.objects.get(pk=entry.pk)
+        entry.points = 120
+        entry.save()
+        self.assertEqual(scores.find_one({'_id': 'individual|100'})['count'], 1)
+        entry.delete()
+        self.assertIsNone(scores.find_one({'_id': 'individual|120'}))
 
 
 class UserAPITest(APITestCase):
@@ -128,6 +165,27 @@ class UserAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_cursor_pages_through_many_ties(self):
+        """Test paging over more than 1000 users created at the same moment"""
+        created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        get_db()[User._meta.db_table].insert_many([
+            {'email': f'tie{index}@example.com', 'username': f'tie{index}',
+             'full_name': f'Tie {index}', 'team_id': 'team_test', 'role': 'hero',
+             'created_at': created_at, 'updated_at': created_at, 'stats': {}}
+            for index in range(1200)
+        ])
+        url, pages, seen = reverse('user-list') + '?page_size=500&fields=username', [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            seen += [user['username'] for user in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 1201)
+        self.assertEqual(len(set(seen)), 1201)
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual(previous['results'], pages[-2]['results'])
+
 
 class TeamAPITest(APITestCase):
     """Test cases for Team API endpoints"""
@@ -147,6 +205,25 @@ class TeamAPITest(APITestCase):
         url = reverse('team-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_team_roster_and_rollups(self):
+        """Test team responses embed member summaries and totals"""
+        for username, points in [('rostered', 30), ('benched', 70)]:
+            User.objects.create(email=f'{username}@example.com', username=username,
+                                full_name=username.title(), team_id='team_api',
+                                stats={'total_activities': 2, 'total_points': points})
+        response = self.client.get(reverse('team-detail', args=['team_api']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([member['username'] for member in response.data['roster']],
+                         ['benched', 'rostered'])
+        self.assertEqual(response.data['stats'], {'members_count': 2, 'total_points': 100,
+                                                  'activities_completed': 4})
+        self.assertEqual(self.client.get(reverse('team-list')).data[0]['stats']['members_count'], 2)
+        response = self.client.get(reverse('team-detail', args=['team_api']),
+                                   {'fields': 'name,stats'})
+        self.assertNotIn('roster', response.data)
+        self.assertEqual(response.data['stats'], {'members_count': 2, 'total_points': 100,
+                                                  'activities_completed': 4})
 
 
 class ActivityAPITest(APITestCase):
@@ -169,6 +246,25 @@ class ActivityAPITest(APITestCase):
         url = reverse('activity-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_activities_list_is_cursor_paginated(self):
+        """Test walking the activity list with cursor links"""
+        for days in range(1, 4):
+            Activity.objects.create(**{**self.activity_data,
+                                       'date': datetime.now() - timedelta(days=days)})
+        response = self.client.get(reverse('activity-list'), {'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+    
+    def test_by_user_uses_cursor_envelope(self):
+        """Test the by_user action returns the cursor envelope"""
+        url = reverse('activity-by-user')
+        response = self.client.get(url, {'user_id': 'testuser'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'next', 'previous', 'results'})
 
 
 class WorkoutAPITest(APITestCase):
@@ -202,8 +298,7 @@ class LeaderboardAPITest(APITestCase):
             'user_id': 'testuser',
             'full_name': 'Test User',
             'points': 100,
-            'activities_count': 5,
-            'rank': 1
+            'activities_count': 5
         }
         self.entry = Leaderboard.objects.create(**self.leaderboard_data)
     
@@ -218,6 +313,31 @@ class LeaderboardAPITest(APITestCase):
         url = reverse('leaderboard-individual')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_sparse_fieldsets(self):
+        """Test ?fields= and ?omit= select the returned fields"""
+        response = self.client.get(reverse('leaderboard-individual'),
+                                   {'fields': 'user_id,points'})
+        self.assertEqual(response.json()['results'], [{'user_id': 'testuser', 'points': 100}])
+        response = self.client.get(reverse('leaderboard-detail', args=[self.entry._id]),
+                                   {'omit': 'updated_at,team_id,team_name'})
+        self.assertNotIn('updated_at', response.data)
+        self.assertEqual(response.data['full_name'], 'Test User')
+        response = self.client.get(reverse('leaderboard-top'), {'fields': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ranks_are_derived_on_read(self):
+        """Test ties share a rank, across pages and on the detail route"""
+        Leaderboard.objects.create(**{**self.leaderboard_data, 'user_id': 'tied'})
+        last = Leaderboard.objects.create(**{**self.leaderboard_data, 'user_id': 'last',
+                                             'points': 50})
+        first = self.client.get(reverse('leaderboard-individual'),
+                                {'page_size': 2, 'fields': 'user_id,rank'}).json()
+        self.assertEqual([entry['rank'] for entry in first['results']], [1, 1])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(second['results'], [{'user_id': 'last', 'rank': 3}])
+        response = self.client.get(reverse('leaderboard-detail', args=[last._id]))
+        self.assertEqual(response.data['rank'], 3)
 
 
 class APIRootTest(APITestCase):
@@ -236,3 +356,824 @@ class APIRootTest(APITestCase):
         self.assertIn('activities', response.data)
         self.assertIn('workouts', response.data)
         self.assertIn('leaderboard', response.data)
+
+
+class ActivityLeaderboardSyncTest(APITestCase):
+    """Test cases for leaderboard maintenance on Activity writes"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        Team.objects.create(_id='team_sync', name='Sync Team', members=[])
+        for username, points in [('leader', 100), ('chaser', 50)]:
+            User.objects.create(
+                email=f'{username}@example.com',
+                username=username,
+                full_name=username.title(),
+                team_id='team_sync',
+                stats={'total_activities': 1, 'total_points': points}
+            )
+        Leaderboard.objects.create(type='individual', user_id='leader',
+                                   team_id='team_sync', full_name='Leader',
+                                   points=100, activities_count=1)
+        Leaderboard.objects.create(type='individual', user_id='chaser',
+                                   team_id='team_sync', full_name='Chaser',
+                                   points=50, activities_count=1)
+        Leaderboard.objects.create(type='team', team_id='team_sync',
+                                   team_name='Sync Team', points=150,
+                                   members_count=2)
+        self.activity_data = {
+            'user_id': 'chaser',
+            'type': 'running',
+            'duration_minutes': 60,
+            'distance_km': 2.0,
+            'points': 80,
+            'date': datetime.now(),
+        }
+    
+    def _entry(self, **filters):
+        return Leaderboard.objects.get(**filters)
+    
+    def _rank(self, **filters):
+        return repository.find_entry(self._entry(**filters).pk, [])['rank']
+    
+    def test_create_activity_moves_ranks(self):
+        """Test creating an activity updates stats, ranks and team totals"""
+        response = self.client.post(reverse('activity-list'), self.activity_data,
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        chaser = self._entry(type='individual', user_id='chaser')
+        leader = self._entry(type='individual', user_id='leader')
+        self.assertEqual((chaser.points, self._rank(pk=chaser.pk)), (130, 1))
+        self.assertEqual((leader.points, self._rank(pk=leader.pk)), (100, 2))
+        self.assertEqual(chaser.activities_count, 2)
+        self.assertEqual(self._entry(type='team', team_id='team_sync').points, 230)
+        stats = User.objects.get(username='chaser').stats
+        self.assertEqual(stats['total_points'], 130)
+        self.assertEqual(stats['total_activities'], 2)
+    
+    def test_destroy_activity_restores_ranks(self):
+        """Test deleting an activity reverts the leaderboard"""
+        response = self.client.post(reverse('activity-list'), self.activity_data,
+                                    format='json')
+        url = reverse('activity-detail', args=[response.data['_id']])
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        chaser = self._entry(type='individual', user_id='chaser')
+        self.assertEqual((chaser.points, self._rank(pk=chaser.pk)), (50, 2))
+        self.assertEqual(self._rank(type='individual', user_id='leader'), 1)
+        self.assertEqual(self._entry(type='team', team_id='team_sync').points, 150)
+    
+    def test_profile_keeps_recent_activities(self):
+        """Test the profile embeds recent activities and tracks deletions"""
+        created = [
+            self.client.post(reverse('activity-list'),
+                             {**self.activity_data, 'date': datetime.now() - timedelta(days=i)},
+                             format='json').data['_id']
+            for i in range(2)
+        ]
+        self.client.delete(reverse('activity-detail', args=[created[0]]))
+        chaser = User.objects.get(username='chaser')
+        response = self.client.get(reverse('user-profile', args=[chaser._id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([activity['_id'] for activity in response.data['recent_activities']],
+                         [created[1]])
+        self.assertEqual(response.data['stats']['total_points'], 130)
+    
+    def test_concurrent_moves_keep_ranks(self):
+        """Test moves on the same board from many threads leave consistent ranks"""
+        moves = [{username: (points, 1)}
+                 for points in (30, 60, -20, 50, 10, 70, -40, 20)
+                 for username in ('leader', 'chaser')]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(move_leaderboards, moves))
+        for board_type in ('individual', 'team'):
+            entries = repository.leaderboard(board_type)[:10]
+            for entry in entries:
+                expected = 1 + sum(other['points'] > entry['points'] for other in entries)
+                self.assertEqual(entry['rank'], expected)
+        self.assertEqual(self._entry(type='individual', user_id='leader').points, 280)
+
+
+class IndexDeclarationTest(SimpleTestCase):
+    """Test cases for the index declarations read by ensure_indexes"""
+    
+    def test_compound_index_keys(self):
+        """Test Meta.indexes translate to MongoDB key specs"""
+        keys, options = declared_indexes(Activity)['activity_user_date']
+        self.assertEqual(keys, [('user_id', 1), ('date', -1), ('_id', -1)])
+        self.assertEqual(options, {})
+    
+    def test_unique_fields_are_declared(self):
+        """Test unique model fields produce unique indexes"""
+        keys, options = declared_indexes(User)['email_1']
+        self.assertEqual(keys, [('email', 1)])
+        self.assertTrue(options['unique'])
+        keys, options = declared_indexes(Leaderboard)['leaderboard_entry']
+        self.assertEqual(keys, [('type', 1), ('user_id', 1), ('team_id', 1)])
+        self.assertTrue(options['unique'])
+
+    def test_text_index_is_declared(self):
+        """Test Model.text_index produces one weighted text index"""
+        keys, options = declared_indexes(Workout)['workouts_text']
+        self.assertEqual(keys, [('description', 'text'), ('exercises', 'text'), ('name', 'text')])
+        self.assertEqual(options['weights'], {'name': 10, 'description': 3, 'exercises': 2})
+    
+    def test_existing_index_options_are_compared(self):
+        """Test an index built with other options than declared is rebuilt"""
+        declared = declared_indexes(User)['email_1']
+        self.assertTrue(built_as_declared({'key': [('email', 1)], 'unique': True}, *declared))
+        self.assertFalse(built_as_declared({'key': [('email', 1)]}, *declared))
+        keys, options = declared_indexes(Tombstone)['deleted_at_ttl']
+        built = {'key': [('deleted_at', 1)], 'expireAfterSeconds': options['expireAfterSeconds']}
+        self.assertTrue(built_as_declared(built, keys, options))
+        built['expireAfterSeconds'] += 60
+        self.assertFalse(built_as_declared(built, keys, options))
+
+
+class ReadPlanTest(SimpleTestCase):
+    """Test cases for the compiled read-only serializers"""
+    
+    def test_user_plan_matches_serializer(self):
+        """Test ReadPlan output matches UserSerializer, including string stats"""
+        user = User(email='plan@example.com', username='plan', full_name='Plan User',
+                    team_id='team_test', created_at=datetime.now(),
+                    stats="{'total_activities': 3, 'total_points': 120}")
+        expected = dict(UserSerializer(user).data)
+        self.assertEqual(read_plan(UserSerializer).serialize(user), expected)
+        self.assertEqual(expected['stats'],
+                         {'total_points': 120, 'activities_completed': 3})
+    
+    def test_workout_plan_matches_serializer(self):
+        """Test ReadPlan output matches WorkoutSerializer for stringified lists"""
+        workout = Workout(name='Plan Workout', type='cardio', duration_minutes=20,
+                          difficulty='easy', exercises="['sprints', 'lunges']",
+                          created_at=datetime.now())
+        expected = dict(WorkoutSerializer(workout).data)
+        self.assertEqual(read_plan(WorkoutSerializer).serialize(workout), expected)
+    
+    def test_parsed_literals_are_not_shared(self):
+        """Test mutating one parsed string list leaves later parses intact"""
+        normalize_list("['sprints', 'lunges']").append('burpees')
+        self.assertEqual(normalize_list("['sprints', 'lunges']"), ['sprints', 'lunges'])
+    
+    def test_restricted_plan_projects_columns(self):
+        """Test a field subset narrows both the output and the projection"""
+        plan = read_plan(UserSerializer, frozenset({'username', 'stats'}))
+        self.assertEqual(plan.names, ['username', 'stats'])
+        self.assertEqual(plan.columns, ['username', 'stats'])
+        self.assertEqual(plan.serialize_document({'username': 'plan', 'email': 'x'}),
+                         {'username': 'plan', 'stats': {'total_points': 0,
+                                                        'activities_completed': 0}})
+
+
+class RepositoryReadPathTest(APITestCase):
+    """Test the native pymongo read path returns the same JSON as the ORM"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.team = Team.objects.create(_id='team_repo', name='Repo Team', members=[])
+        for i in range(3):
+            User.objects.create(email=f'repo{i}@example.com', username=f'repo{i}',
+                                full_name=f'Repo {i}', team_id='team_repo',
+                                stats={'total_activities': i, 'total_points': i * 10})
+            Leaderboard.objects.create(type='individual', user_id=f'repo{i}',
+                                       team_id='team_repo', full_name=f'Repo {i}',
+                                       points=100 - i, activities_count=i)
+            Activity.objects.create(user_id='repo0', type='running',
+                                    duration_minutes=20 + i, distance_km=None,
+                                    points=20 + i, notes='Repo run',
+                                    date=datetime.now() - timedelta(days=i))
+    
+    def assertSameJSON(self, actual, serializer_data):
+        expected = json.loads(JSONRenderer().render(serializer_data))
+        self.assertEqual(actual, expected)
+    
+    def test_by_user_matches_orm(self):
+        """Test ActivityViewSet.by_user matches ActivitySerializer output"""
+        response = self.client.get(reverse('activity-by-user'), {'user_id': 'repo0'})
+        activities = Activity.objects.filter(user_id='repo0').order_by('-date', '-_id')
+        self.assertSameJSON(response.json()['results'],
+                            ActivitySerializer(activities, many=True).data)
+    
+    def test_team_members_matches_orm(self):
+        """Test TeamViewSet.members matches UserSerializer output"""
+        response = self.client.get(reverse('team-members', args=[self.team._id]))
+        users = User.objects.filter(team_id='team_repo')
+        self.assertSameJSON(response.json(), UserSerializer(users, many=True).data)
+    
+    def test_leaderboard_top_matches_orm(self):
+        """Test LeaderboardViewSet.top matches LeaderboardSerializer output"""
+        response = self.client.get(reverse('leaderboard-top'), {'limit': 2})
+        entries = Leaderboard.objects.filter(type='individual').order_by('-points')[:2]
+        for rank, entry in enumerate(entries, start=1):
+            entry.rank = rank
+        self.assertSameJSON(response.json(),
+                            LeaderboardSerializer(entries, many=True).data)
+
+
+class ActivitySummaryAPITest(APITestCase):
+    """Test cases for the activity summary endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        for i, activity_type in enumerate(['running', 'running', 'yoga']):
+            Activity.objects.create(user_id='summary', type=activity_type,
+                                    duration_minutes=30, distance_km=2.5 if i else None,
+                                    points=10 * (i + 1),
+                                    date=datetime(2024, 1, 10 + i))
+    
+    def test_summary_by_type(self):
+        """Test grouping activities by type"""
+        response = self.client.get(reverse('activity-summary'), {'group_by': 'type'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        running, yoga = response.data
+        self.assertEqual(running['type'], 'running')
+        self.assertEqual((running['count'], running['total_minutes']), (2, 60))
+        self.assertEqual((running['total_distance_km'], running['total_points']), (2.5, 30))
+        self.assertEqual((yoga['count'], yoga['total_points']), (1, 30))
+    
+    def test_summary_date_range(self):
+        """Test the to bound includes the whole day"""
+        response = self.client.get(reverse('activity-summary'),
+                                   {'group_by': 'day', 'from': '2024-01-11', 'to': '2024-01-12'})
+        self.assertEqual([row['period'] for row in response.data],
+                         ['2024-01-11', '2024-01-12'])
+    
+    def test_summary_rejects_unknown_group(self):
+        """Test unknown group_by values are rejected"""
+        response = self.client.get(reverse('activity-summary'), {'group_by': 'planet'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityExportTest(APITestCase):
+    """Test cases for the streaming activity export"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        for activity_type in ['running', 'yoga']:
+            Activity.objects.create(user_id='export', type=activity_type,
+                                    duration_minutes=30, points=10,
+                                    date=datetime(2024, 1, 10))
+    
+    def test_export_streams_csv(self):
+        """Test the export streams every matching activity as CSV"""
+        response = self.client.get(reverse('activity-export'),
+                                   {'format': 'csv', 'type': 'yoga'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['_id', 'user_id', 'type'])
+        self.assertEqual(len(lines), 2)
+
+
+class DatabaseTimingTest(APITestCase):
+    """Test cases for the Server-Timing instrumentation middleware"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        Activity.objects.create(user_id='timing', type='yoga', duration_minutes=30,
+                                points=10, date=datetime(2024, 1, 10))
+    
+    def test_server_timing_header(self):
+        """Test responses report database and serialization timings"""
+        response = self.client.get(reverse('activity-by-type'), {'type': 'yoga'})
+        metrics = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['db', 'translate', 'serialize', 'render', 'total'])
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* commands"')
+
+
+class LeaderboardCacheTest(APITestCase):
+    """Test cases for cached leaderboard responses and conditional GET"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        Leaderboard.objects.create(type='individual', user_id='cached',
+                                   full_name='Cached User', points=10)
+        self.url = reverse('leaderboard-top')
+    
+    def test_if_none_match_returns_304(self):
+        """Test a matching ETag is answered with 304 Not Modified"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_write_invalidates_cache(self):
+        """Test a leaderboard write changes the ETag and the cached body"""
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        Leaderboard.objects.create(type='individual', user_id='newcomer',
+                                   full_name='Newcomer', points=5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+    
+    def test_fieldset_is_part_of_etag_and_key(self):
+        """Test a different fieldset is neither a 304 nor a cache hit, and field order does not matter"""
+        response = self.client.get(self.url, {'fields': 'user_id,points'})
+        etag = response['ETag']
+        self.assertEqual(set(response.json()[0]), {'user_id', 'points'})
+        response = self.client.get(self.url, {'fields': 'user_id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()[0]), {'user_id'})
+        response = self.client.get(self.url, {'fields': 'points,user_id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ActivityBulkAPITest(APITestCase):
+    """Test cases for bulk activity ingestion"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create(email='bulk@example.com', username='bulkuser',
+                            full_name='Bulk User', team_id='team_bulk',
+                            stats={'total_activities': 0, 'total_points': 0})
+        self.item = {
+            'user_id': 'bulkuser',
+            'type': 'cycling',
+            'duration_minutes': 60,
+            'date': '2024-03-01T08:00:00Z',
+        }
+    
+    def test_bulk_create(self):
+        """Test all valid activities are inserted and stats applied once"""
+        response = self.client.post(reverse('activity-bulk'), [self.item] * 3,
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(Activity.objects.filter(user_id='bulkuser').count(), 3)
+        stats = User.objects.get(username='bulkuser').stats
+        self.assertEqual(stats['total_points'], 180)
+        self.assertEqual(stats['total_activities'], 3)
+    
+    def test_bulk_partial_failure(self):
+        """Test invalid items are reported per item without blocking the rest"""
+        response = self.client.post(reverse('activity-bulk'),
+                                    {'activities': [self.item, {'user_id': 'bulkuser'}]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        created, invalid = response.data['results']
+        self.assertEqual(created['status'], 'created')
+        self.assertEqual(invalid['status'], 'invalid')
+        self.assertIn('duration_minutes', invalid['errors'])
+        self.assertEqual(User.objects.get(username='bulkuser').stats['total_points'], 60)
+    
+    def test_inserts_wait_for_backfill_lock(self):
+        """Test activity inserts wait while a backfill holds the buckets"""
+        db = get_db()
+        document = activity_document({
+            **self.item, 'date': datetime(2024, 3, 1, 8, tzinfo=timezone.utc), 'points': 60,
+        })
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            with backfill_lock(db):
+                insert = pool.submit(insert_activities, [document], db)
+                time.sleep(0.3)
+                self.assertFalse(insert.done())
+                self.assertEqual(Activity.objects.filter(user_id='bulkuser').count(), 0)
+            self.assertEqual(insert.result(timeout=10), {})
+        self.assertEqual(DailyActivityBucket.objects.get(user_id='bulkuser').points, 60)
+
+
+@override_settings(SCORING_RULES={
+    'default': {'base': 0, 'per_minute': 1, 'per_km': 10},
+    'yoga': {'base': 15, 'per_minute': 2},
+})
+class ScoringTest(APITestCase):
+    """Test activities are scored by the rules for their type"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create(email='scored@example.com', username='scored',
+                            full_name='Scored', team_id='team_scored',
+                            stats={'total_activities': 1, 'total_points': 5})
+    
+    def test_rules_by_type(self):
+        """Test type rules override the default coefficients they set"""
+        self.assertEqual(scoring.score('running', 30, 5.5), 85)
+        self.assertEqual(scoring.score('yoga', 30, 2.0), 95)
+        self.assertEqual(scoring.score('unknown', 30), 30)
+    
+    def test_client_points_are_ignored(self):
+        """Test a created activity gets its computed points, not the client's"""
+        response = self.client.post(reverse('activity-list'), {
+            'user_id': 'scored', 'type': 'yoga', 'duration_minutes': 10,
+            'points': 1000, 'date': datetime.now(timezone.utc),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['points'], 35)
+    
+    def test_rescore_activities(self):
+        """Test rescoring rewrites stale points and applies the difference to stats"""
+        activity = Activity.objects.create(user_id='scored', type='yoga', duration_minutes=10,
+                                           points=5, date=datetime.now(timezone.utc))
+        Leaderboard.objects.create(type='individual', user_id='scored',
+                                   full_name='Scored', points=5)
+        call_command('rescore_activities', stdout=StringIO())
+        self.assertEqual(Activity.objects.get(pk=activity.pk).points, 35)
+        self.assertEqual(User.objects.get(username='scored').stats['total_points'], 35)
+        self.assertEqual(Leaderboard.objects.get(type='individual', user_id='scored').points, 35)
+    
+    def test_rescore_skips_concurrent_edits(self):
+        """Test an activity edited after it was read is left to that edit"""
+        activity = Activity.objects.create(user_id='scored', type='yoga', duration_minutes=10,
+                                           points=5, date=datetime.now(timezone.utc))
+        write = rescore_activities.Command._write
+        
+        def edit_then_write(command, db, changed):
+            Activity.objects.filter(pk=activity.pk).update(duration_minutes=20)
+            return write(command, db, changed)
+        
+        with mock.patch.object(rescore_activities.Command, '_write', edit_then_write):
+            out = StringIO()
+            call_command('rescore_activities', stdout=out)
+        self.assertIn('Rescored 0 of 1', out.getvalue())
+        self.assertEqual(Activity.objects.get(pk=activity.pk).points, 5)
+        self.assertEqual(User.objects.get(username='scored').stats['total_points'], 5)
+
+
+class RebuildLeaderboardTest(TestCase):
+    """Test the leaderboard is rebuilt from stats by one aggregation and swapped in"""
+    
+    def setUp(self):
+        Team.objects.create(_id='team_rebuild', name='Rebuild Team', members=[])
+        for username, points in [('first', 90), ('tied', 90), ('third', 40)]:
+            User.objects.create(email=f'{username}@example.com', username=username,
+                                full_name=username.title(), team_id='team_rebuild',
+                                stats={'total_activities': 1, 'total_points': points})
+        self.kept = Leaderboard.objects.create(type='individual', user_id='third',
+                                               full_name='Third', points=0)
+        self.dropped = Leaderboard.objects.create(type='individual', user_id='gone',
+                                                  full_name='Gone', points=500)
+    
+    def ranks(self, board_type='individual'):
+        key = 'user_id' if board_type == 'individual' else 'team_id'
+        return {entry[key]: (entry['points'], entry['rank'])
+                for entry in repository.leaderboard(board_type)[:10]}
+    
+    def test_competition_ranks_and_team_totals(self):
+        """Test tied users share a rank, teams sum members and ids are kept"""
+        with mock.patch.object(rebuild_leaderboard, 'publish') as publish:
+            call_command('rebuild_leaderboard', stdout=StringIO())
+        publish.assert_called_once_with(['individual', 'team'])
+        self.assertEqual(self.ranks(), {'first': (90, 1), 'tied': (90, 1), 'third': (40, 3)})
+        self.assertEqual(self.ranks('team'), {'team_rebuild': (220, 1)})
+        self.assertEqual(Leaderboard.objects.get(type='individual', user_id='third').pk,
+                         self.kept.pk)
+        self.assertEqual(Tombstone.objects.filter(object_id=str(self.dropped.pk)).count(), 1)
+    
+    def test_moves_wait_for_board_lock(self):
+        """Test activity moves wait while a rebuild holds the boards"""
+        db = get_db()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            with board_lock(db, 'team'):
+                move = pool.submit(move_leaderboards, {'third': (10, 1)})
+                time.sleep(0.3)
+                self.assertFalse(move.done())
+            move.result(timeout=10)
+        self.assertEqual(Leaderboard.objects.get(pk=self.kept.pk).points, 10)
+
+
+class ReconcileStatsTest(TestCase):
+    """Test User.stats are recomputed from activities and only drift is corrected"""
+    
+    def setUp(self):
+        for username, stats in [('exact', {'total_activities': 1, 'total_points': 30}),
+                                ('drifted', {'total_activities': 5, 'total_points': 999}),
+                                ('legacy', {})]:
+            User.objects.create(email=f'{username}@example.com', username=username,
+                                full_name=username.title(), team_id='team_reconcile',
+                                stats=stats)
+            Activity.objects.create(user_id=username, type='yoga', duration_minutes=30,
+                                    points=30, date=datetime.now(timezone.utc))
+        # JSONField only takes dicts and lists, so write the legacy string directly.
+        get_db()[User._meta.db_table].update_one(
+            {'username': 'legacy'},
+            {'$set': {'stats': "{'total_points': 30, 'activities_completed': 1}"}},
+        )
+    
+    @mock.patch.object(reconcile_stats, 'SETTLE_SECONDS', 0)
+    def test_corrects_drift(self):
+        """Test drifted and malformed stats are rewritten and exact ones left alone"""
+        exact = User.objects.get(username='exact').updated_at
+        call_command('reconcile_stats', workers=1, partitions=2, stdout=StringIO())
+        for username in ['exact', 'drifted', 'legacy']:
+            self.assertEqual(User.objects.get(username=username).stats,
+                             {'total_activities': 1, 'total_points': 30})
+        self.assertEqual(User.objects.get(username='exact').updated_at, exact)
+    
+    @mock.patch.object(reconcile_stats, 'SETTLE_SECONDS', 0)
+    def test_dry_run_reports_only(self):
+        """Test --dry-run leaves stats untouched"""
+        out = StringIO()
+        call_command('reconcile_stats', workers=1, dry_run=True, stdout=out)
+        self.assertIn('Would correct 2 of 3 users', out.getvalue())
+        self.assertEqual(User.objects.get(username='drifted').stats['total_points'], 999)
+    
+    @mock.patch.object(reconcile_stats, 'SETTLE_SECONDS', 0)
+    def test_worker_processes(self):
+        """Test partitions run on spawned worker processes"""
+        call_command('reconcile_stats', workers=2, partitions=2, stdout=StringIO())
+        for username in ['drifted', 'legacy']:
+            self.assertEqual(User.objects.get(username=username).stats,
+                             {'total_activities': 1, 'total_points': 30})
+    
+    def test_skips_writes_in_flight(self):
+        """Test users with an activity edited or deleted after the cutoff are left alone"""
+        hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+        User.objects.update(updated_at=hour_ago)
+        Activity.objects.update(created_at=hour_ago, updated_at=hour_ago)
+        Activity.objects.filter(user_id='drifted').update(updated_at=datetime.now(timezone.utc))
+        Activity.objects.get(user_id='exact').delete()
+        call_command('reconcile_stats', workers=1, stdout=StringIO())
+        self.assertEqual(User.objects.get(username='drifted').stats['total_points'], 999)
+        self.assertEqual(User.objects.get(username='exact').stats['total_points'], 30)
+        self.assertEqual(User.objects.get(username='legacy').stats,
+                         {'total_activities': 1, 'total_points': 30})
+
+
+class WindowedLeaderboardTest(APITestCase):
+    """Test cases for weekly/monthly/30-day leaderboards from daily buckets"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        for username in ['recent', 'veteran']:
+            User.objects.create(email=f'{username}@example.com', username=username,
+                                full_name=username.title(), team_id='team_window',
+                                stats={'total_activities': 0, 'total_points': 0})
+        now = datetime.now(timezone.utc)
+        self.activity_ids = {}
+        for username, minutes, date in [('recent', 40, now),
+                                        ('veteran', 500, now - timedelta(days=90))]:
+            response = self.client.post(reverse('activity-list'), {
+                'user_id': username, 'type': 'running', 'duration_minutes': minutes,
+                'date': date,
+            }, format='json')
+            self.activity_ids[username] = response.data['_id']
+    
+    def test_window_excludes_older_activities(self):
+        """Test only activities inside the window count towards it"""
+        response = self.client.get(reverse('leaderboard-top'), {'window': '30d'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['user_id'], row['points'], row['rank'])
+                          for row in json.loads(response.content)], [('recent', 40, 1)])
+        self.assertEqual(DailyActivityBucket.objects.filter(user_id='veteran').count(), 1)
+    
+    def test_team_window_leaves_out_teamless_users(self):
+        """Test the team window sums team buckets, so users without a team add no row"""
+        Team.objects.create(_id='team_window', name='Window Team', members=[])
+        User.objects.create(email='solo@example.com', username='solo', full_name='Solo',
+                            stats={'total_activities': 0, 'total_points': 0})
+        self.client.post(reverse('activity-list'), {
+            'user_id': 'solo', 'type': 'running', 'duration_minutes': 90,
+            'date': datetime.now(timezone.utc),
+        }, format='json')
+        response = self.client.get(reverse('leaderboard-top'), {'window': '30d', 'type': 'team'})
+        self.assertEqual([(row['team_id'], row['team_name'], row['points'])
+                          for row in json.loads(response.content)],
+                         [('team_window', 'Window Team', 40)])
+    
+    def test_invalid_window(self):
+        """Test an unknown window is rejected"""
+        response = self.client.get(reverse('leaderboard-top'), {'window': 'decade'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_invalid_limit_and_type(self):
+        """Test non-numeric or out-of-range limits and unknown types are rejected"""
+        for params in [{'limit': 'ten'}, {'limit': -1}, {'limit': 0}, {'type': 'planet'}]:
+            response = self.client.get(reverse('leaderboard-top'), {'window': '30d', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_date_edit_changes_etag(self):
+        """Test moving an activity out of the window invalidates the window's ETag"""
+        url = reverse('leaderboard-top')
+        etag = self.client.get(url, {'window': '30d'})['ETag']
+        self.client.patch(reverse('activity-detail', args=[self.activity_ids['recent']]),
+                          {'date': datetime.now(timezone.utc) - timedelta(days=60)},
+                          format='json')
+        response = self.client.get(url, {'window': '30d'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['user_id'], row['points'])
+                          for row in json.loads(response.content)], [('recent', 0)])
+
+
+class ActivityHistoryTest(APITestCase):
+    """Test user and team history charts read from the daily buckets"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.team = Team.objects.create(_id='team_history', name='History Team', members=[])
+        self.user = User.objects.create(email='charted@example.com', username='charted',
+                                        full_name='Charted', team_id='team_history',
+                                        stats={'total_activities': 0, 'total_points': 0})
+        ids = []
+        for minutes, distance, day in [(30, 5.0, 3), (20, None, 17), (45, 2.5, 45)]:
+            response = self.client.post(reverse('activity-list'), {
+                'user_id': 'charted', 'type': 'running', 'duration_minutes': minutes,
+                'distance_km': distance,
+                'date': datetime(2024, 1, 1, 12, tzinfo=timezone.utc) + timedelta(days=day),
+            }, format='json')
+            ids.append(response.data['_id'])
+        self.client.patch(reverse('activity-detail', args=[ids[1]]),
+                          {'duration_minutes': 25}, format='json')
+    
+    def test_month_history(self):
+        """Test day buckets are summed per month, edits included and gaps zero-filled"""
+        response = self.client.get(reverse('user-history', args=[self.user._id]), {
+            'granularity': 'month', 'from': '2024-01-10', 'to': '2024-03-31',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['from'], '2024-01-01')
+        self.assertEqual(
+            [(row['start'], row['activities_count'], row['duration_minutes'], row['distance_km'])
+             for row in response.data['results']],
+            [('2024-01-01', 2, 55, 5.0), ('2024-02-01', 1, 45, 2.5), ('2024-03-01', 0, 0, 0)],
+        )
+        self.assertEqual(response.data['results'][0]['points'], 30 + 50 + 25)
+    
+    def test_team_day_history(self):
+        """Test team buckets follow their members' activities"""
+        response = self.client.get(reverse('team-history', args=[self.team._id]), {
+            'from': '2024-01-04', 'to': '2024-01-05',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['start'], row['points']) for row in response.data['results']],
+                         [('2024-01-04', 80), ('2024-01-05', 0)])
+    
+    def test_invalid_params(self):
+        """Test unknown granularities and oversized or inverted ranges are rejected"""
+        url = reverse('user-history', args=[self.user._id])
+        for params in [{'granularity': 'year'}, {'from': '2024-02-01', 'to': '2024-01-01'},
+                       {'from': '2020-01-01', 'to': '2024-01-01'}]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class DeltaSyncAPITest(APITestCase):
+    """Test ?since= returns only changed rows and tombstones of deleted ones"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create(email='delta@example.com', username='delta',
+                            full_name='Delta', team_id='team_delta',
+                            stats={'total_activities': 0, 'total_points': 0})
+        self.old = self.client.post(reverse('activity-list'), {
+            'user_id': 'delta', 'type': 'yoga', 'duration_minutes': 30,
+            'date': datetime.now(timezone.utc),
+        }, format='json').data['_id']
+    
+    def test_token_returns_only_later_changes(self):
+        """Test a token from one poll picks up the next create and delete only"""
+        since = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+        first = self.client.get(reverse('activity-list'), {'since': since})
+        self.assertEqual([row['_id'] for row in first.data['results']], [self.old])
+        self.assertFalse(first.data['more'])
+        users_token = self.client.get(reverse('user-list'), {'since': since}).data['token']
+        
+        new = self.client.post(reverse('activity-list'), {
+            'user_id': 'delta', 'type': 'running', 'duration_minutes': 20,
+            'date': datetime.now(timezone.utc),
+        }, format='json').data['_id']
+        self.client.delete(reverse('activity-detail', args=[self.old]))
+        
+        second = self.client.get(reverse('activity-list'), {'since': first.data['token']})
+        self.assertEqual([row['_id'] for row in second.data['results']], [new])
+        self.assertEqual(second.data['deleted'], [self.old])
+        # The user's stats changed with each activity.
+        users = self.client.get(reverse('user-list'), {'since': users_token})
+        self.assertEqual([row['username'] for row in users.data['results']], ['delta'])
+    
+    def test_invalid_and_expired_since(self):
+        """Test a malformed since is rejected and one past tombstone retention is gone"""
+        response = self.client.get(reverse('user-list'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for positions in [[[0, 'not-an-id'], [0, None]], [[0, None], [10 ** 20, None]]]:
+            response = self.client.get(reverse('user-list'),
+                                       {'since': encode_token(positions)})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('user-list'), {'since': '2000-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
+class SearchAPITest(APITestCase):
+    """Test cases for text-index search over activities and workouts"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        call_command('ensure_indexes', skip_explain=True, stdout=StringIO())
+        Workout.objects.create(name='Hill Sprints', description='Short uphill sprints',
+                               type='cardio', duration_minutes=20, difficulty='hard',
+                               exercises=['sprints'])
+        Workout.objects.create(name='Mobility', description='Gentle stretching',
+                               type='flexibility', duration_minutes=15, difficulty='easy',
+                               exercises=['stretch'])
+        Activity.objects.create(user_id='searcher', type='running', duration_minutes=30,
+                                date=datetime.now(timezone.utc), notes='Sprints on the hill')
+    
+    def test_search_ranks_matches(self):
+        """Test only matching documents come back, best first"""
+        response = self.client.get(reverse('search-list'), {'q': 'sprints'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([row['kind'] for row in response.data['results']],
+                         ['workout', 'activity'])
+        self.assertEqual(response.data['results'][0]['item']['name'], 'Hill Sprints')
+        response = self.client.get(reverse('search-list'), {'q': 'sprints', 'kind': 'activity'})
+        self.assertEqual(response.data['count'], 1)
+    
+    @override_settings(SEARCH_MAX_RESULTS=1)
+    def test_search_depth_is_capped(self):
+        """Test the count stops at SEARCH_MAX_RESULTS and deeper pages are not found"""
+        response = self.client.get(reverse('search-list'), {'q': 'sprints', 'page_size': 1})
+        self.assertEqual(response.data['count'], 1)
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(reverse('search-list'),
+                                   {'q': 'sprints', 'page_size': 1, 'page': 2})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_search_requires_query(self):
+        """Test a missing q is rejected"""
+        response = self.client.get(reverse('search-list'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdminChangeListTest(TestCase):
+    """Test the admin changelists page by keyset instead of offset"""
+    
+    def setUp(self):
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for i in range(5):
+            Activity.objects.create(user_id='keyset', type='running', duration_minutes=10,
+                                    date=start + timedelta(days=i // 2))
+    
+    def test_walks_every_row_once(self):
+        """Test next links visit each activity once, newest first"""
+        url = reverse('admin:octofit_tracker_activity_changelist')
+        seen = []
+        query = ''
+        with mock.patch.object(ActivityAdmin, 'list_per_page', 2):
+            while query is not None:
+                changelist = self.client.get(url + query).context['cl']
+                seen += [activity.pk for activity in changelist.result_list]
+                query = changelist.next_url
+            previous = self.client.get(url + changelist.previous_url).context['cl']
+        expected = list(Activity.objects.order_by('-date', '-_id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual([activity.pk for activity in previous.result_list], expected[2:4])
+    
+    def test_bad_position_is_rejected(self):
+        """Test a malformed cursor redirects like any bad lookup"""
+        url = reverse('admin:octofit_tracker_activity_changelist')
+        response = self.client.get(url, {'after': 'not-a-position'})
+        self.assertEqual(response.status_code, 302)
+
+
+class LiveLeaderboardTest(SimpleTestCase):
+    """Test cases for the live leaderboard stream's diffs and events"""
+    
+    def test_rank_changes(self):
+        """Test only moved or new entries are sent, plus ids that left the top"""
+        previous = [{'_id': 'a', 'rank': 1, 'points': 30}, {'_id': 'b', 'rank': 2, 'points': 20}]
+        current = [{'_id': 'c', 'rank': 1, 'points': 40}, {'_id': 'a', 'rank': 2, 'points': 30}]
+        changed, removed = rank_changes(previous, current)
+        self.assertEqual([entry['_id'] for entry in changed], ['c', 'a'])
+        self.assertEqual(removed, ['b'])
+        self.assertEqual(rank_changes(current, current), ([], []))
+    
+    def test_event_format(self):
+        """Test events are framed as SSE with a compact JSON payload"""
+        self.assertEqual(live_event('ranks', {'removed': ['b']}, 7),
+                         b'event: ranks\nid: 7\ndata: {"removed":["b"]}\n\n')
+
+
+class AsyncReadPathTest(APITestCase):
+    """Test the async read endpoints return the same JSON as the sync ones"""
+    
+    def setUp(self):
+        Team.objects.create(_id='team_async', name='Async Team', members=[])
+        for i in range(3):
+            User.objects.create(email=f'async{i}@example.com', username=f'async{i}',
+                                full_name=f'Async {i}', team_id='team_async',
+                                stats={'total_activities': i, 'total_points': i * 10})
+            Leaderboard.objects.create(type='individual', user_id=f'async{i}',
+                                       full_name=f'Async {i}', points=30 - i)
+    
+    async def test_matches_sync_endpoints(self):
+        """Test unpaginated and detail routes match their sync counterparts"""
+        for path in ['teams/', 'teams/team_async/members/', 'leaderboard/top/', 'workouts/']:
+            sync = await sync_to_async(self.client.get)(f'/api/{path}')
+            response = await self.async_client.get(f'/api/async/{path}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK, path)
+            self.assertEqual(json.loads(response.content), sync.json(), path)
+    
+    async def test_cursor_pages_cover_collection(self):
+        """Test following next links visits every user exactly once"""
+        url, seen = '/api/async/users/?page_size=2', []
+        while url:
+            page = json.loads((await self.async_client.get(url)).content)
+            seen += [user['username'] for user in page['results']]
+            url = page['next']
+        self.assertEqual(seen, ['async2', 'async1', 'async0'])
@@ -22,7 +22,7 @@ from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from .views import (
     UserViewSet, TeamViewSet, ActivityViewSet, 
-    WorkoutViewSet, LeaderboardViewSet
+    WorkoutViewSet, LeaderboardViewSet, SearchViewSet
 )
 
 # Create a router and register our viewsets with it
@@ -32,6 +32,7 @@ router.register(r'teams', TeamViewSet, basename='team')
 router.register(r'activities', ActivityViewSet, basename='activity')
 router.register(r'workouts', WorkoutViewSet, basename='workout')
 router.register(r'leaderboard', LeaderboardViewSet, basename='leaderboard')
+router.register(r'search', SearchViewSet, basename='search')
 
 
 @api_view(['GET'])
@@ -51,6 +52,7 @@ def api_root(request, format=None):
             'activities': f'{base_url}/api/activities/',
             'workouts': f'{base_url}/api/workouts/',
             'leaderboard': f'{base_url}/api/leaderboard/',
+            'search': f'{base_url}/api/search/',
             'admin': f'{base_url}/admin/',
         })
     else:
@@ -61,12 +63,14 @@ def api_root(request, format=None):
             'activities': reverse('activity-list', request=request, format=format),
             'workouts': reverse('workout-list', request=request, format=format),
             'leaderboard': reverse('leaderboard-list', request=request, format=format),
+            'search': reverse('search-list', request=request, format=format),
             'admin': reverse('admin:index', request=request, format=format),
         })
 
 
 urlpatterns = [
     path('', api_root, name='api-root'),
+    path('api/async/', include('octofit_tracker.async_urls')),
     path('api/', include(router.urls)),
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
@@ -1,85 +1,457 @@
+from datetime import datetime, time, timedelta, timezone
+
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from . import ingest, repository, sync
+from .cache import board_validators, cache_key, cached_response, leaderboard_cache
+from .db import get_db
+from .instrumentation import timed
+from .leaderboard import apply_activity_changes, windowed_leaderboard
+from .live import BOARD_TYPES
+from .renderers import CSVRenderer, NDJSONRenderer
+from .recent import instance_document, push_recent, refresh_recent
+from .rollups import (
+    GRANULARITIES, WINDOWS, activity_writes, day_start, history_series, period_start,
+    window_start,
+)
 from .models import User, Team, Activity, Workout, Leaderboard
+from .pagination import (
+    ActivityCursorPagination, UserCursorPagination, LeaderboardCursorPagination,
+    SearchPagination,
+)
 from .serializers import (
     UserSerializer, TeamSerializer, ActivitySerializer, 
-    WorkoutSerializer, LeaderboardSerializer
+    WorkoutSerializer, LeaderboardSerializer, read_plan, serialize_teams
 )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+def parse_date_bound(value, end=False):
+    """
+    Parse a ``from``/``to`` query parameter into an aware UTC datetime.
+
+    Plain dates cover the whole day, so ``to=2024-01-31`` becomes the
+    exclusive bound 2024-02-01T00:00Z. Returns None for a missing value and
+    raises ValueError for an unparseable one.
+    """
+    if not value:
+        return None
+    # Dates first: parse_datetime also accepts a plain date on Python 3.11+.
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f'Invalid date: {value}')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def parse_summary_params(params):
+    """
+    Return (group_by, date_from, date_to) for the activity summary.
+    
+    Raises ValueError with a client-facing message for invalid input.
+    """
+    group_by = [key for key in params.get('group_by', '').split(',') if key]
+    allowed = set(repository.SUMMARY_DIMENSIONS) | set(repository.SUMMARY_PERIODS)
+    unknown = [key for key in group_by if key not in allowed]
+    if unknown:
+        raise ValueError(f'unknown group_by value(s): {", ".join(unknown)}')
+    if len([key for key in group_by if key in repository.SUMMARY_PERIODS]) > 1:
+        raise ValueError('group_by accepts at most one of day, week, month')
+    date_from = parse_date_bound(params.get('from'))
+    date_to = parse_date_bound(params.get('to'), end=True)
+    return group_by, date_from, date_to
+
+
+def parse_top_params(params):
+    """
+    Return (board_type, limit) for the top of a leaderboard.
+    
+    Raises ValueError with a client-facing message for invalid input.
+    """
+    board_type = params.get('type', 'individual')
+    if board_type not in BOARD_TYPES:
+        raise ValueError(f'type must be one of {", ".join(BOARD_TYPES)}')
+    try:
+        limit = int(params.get('limit', 10))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    max_limit = LeaderboardCursorPagination.max_page_size
+    if not 1 <= limit <= max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+    return board_type, limit
+
+
+def parse_history_params(params, now=None):
+    """
+    Return (granularity, start, end) for an activity history.
+    
+    ``to`` defaults to today and ``from`` to a year before it. ``start`` is
+    moved back to the beginning of its week or month so the first period is
+    whole; ``end`` is exclusive. Raises ValueError with a client-facing
+    message for invalid input or a range over HISTORY_MAX_DAYS.
+    """
+    granularity = params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+    end = parse_date_bound(params.get('to'), end=True)
+    if end is None:
+        end = day_start(now or datetime.now(timezone.utc)) + timedelta(days=1)
+    start = parse_date_bound(params.get('from'))
+    if start is None:
+        start = day_start(end) - timedelta(days=365)
+    start = period_start(day_start(start), granularity)
+    if start >= end:
+        raise ValueError('from must be before to')
+    if (end - start).days > settings.HISTORY_MAX_DAYS:
+        raise ValueError(f'history is limited to {settings.HISTORY_MAX_DAYS} days per request')
+    return granularity, start, end
+
+
+def history_response(granularity, start, end, buckets):
+    return {
+        'granularity': granularity,
+        'from': start.date().isoformat(),
+        'to': (end - timedelta(microseconds=1)).date().isoformat(),
+        'results': history_series(buckets, granularity, start, end),
+    }
+
+
+def activity_change(activity, sign=1):
+    """The ``apply_activity_changes`` tuple adding (1) or removing (-1) an activity"""
+    return (activity.user_id, activity.date, sign * activity.points, sign,
+            sign * (activity.duration_minutes or 0), sign * (activity.distance_km or 0))
+
+
+def parse_fieldset(params, names):
+    """
+    Return the field names selected by ``?fields=`` and ``?omit=``.
+    
+    ``fields`` keeps only the listed fields and ``omit`` drops fields from
+    what is left. Returns None when neither is given and raises ValueError
+    with a client-facing message for names not in ``names``.
+    """
+    fields = [name for name in params.get('fields', '').split(',') if name]
+    omit = [name for name in params.get('omit', '').split(',') if name]
+    unknown = [name for name in fields + omit if name not in names]
+    if unknown:
+        raise ValueError(f'unknown field(s): {", ".join(unknown)}')
+    if not fields and not omit:
+        return None
+    return frozenset(fields or names) - frozenset(omit)
+
+
+def select_keys(rows, fields):
+    """Keep only the keys in ``fields`` of each row; None keeps all"""
+    if fields is None:
+        return rows
+    return [{key: value for key, value in row.items() if key in fields} for row in rows]
+
+
+class CompiledReadMixin:
+    """
+    Serve list, retrieve and @action responses through the serializer's
+    ReadPlan instead of instantiating DRF fields for every row.
+    
+    Every read takes a sparse fieldset: ``?fields=a,b`` returns only those
+    fields and ``?omit=a,b`` leaves them out. ``project`` pushes the
+    selection down to MongoDB, so unselected fields are not read either.
+    With ``delta_sync``, ``list`` also answers ``?since=`` (see ``sync``).
+    """
+    delta_sync = False
+    
+    def get_fieldset(self, serializer_class=None, extra=()):
+        """The requested field set, or None for every field"""
+        names = read_plan(serializer_class or self.get_serializer_class()).names
+        try:
+            return parse_fieldset(self.request.query_params, [*names, *extra])
+        except ValueError as exc:
+            raise ValidationError({'error': str(exc)})
+    
+    def get_read_plan(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        return read_plan(serializer_class, self.get_fieldset(serializer_class))
+    
+    def project(self, queryset, serializer_class=None, paginator=None):
+        """
+        Limit a QuerySet or MongoQuery to the fields the response reads.
+        
+        The primary key and the paginator's ordering fields are kept, since
+        cursor pagination reads its position from the rows.
+        """
+        serializer_class = serializer_class or self.get_serializer_class()
+        fields = self.get_fieldset(serializer_class)
+        sources = read_plan(serializer_class, fields).sources
+        if fields is None or sources is None:
+            return queryset
+        paginator = paginator or self.paginator
+        ordering = [name.lstrip('-') for name in getattr(paginator, 'ordering', None) or ()]
+        return queryset.only(queryset.model._meta.pk.name, *ordering, *sources)
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = self.project(queryset)
+        return queryset
+    
+    def serialize_many(self, instances, serializer_class=None):
+        plan = self.get_read_plan(serializer_class)
+        with timed('serialize'):
+            return plan.serialize_many(instances)
+    
+    def serialize_documents(self, documents, serializer_class=None):
+        plan = self.get_read_plan(serializer_class)
+        with timed('serialize'):
+            return plan.serialize_documents(documents)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize_many([self.get_object()])[0])
+    
+    def delta(self, request):
+        """Rows changed and deleted since ``?since=``, and the next token"""
+        try:
+            positions = sync.parse_since(request.query_params['since'])
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if sync.expired(positions):
+            return Response({'error': sync.EXPIRED_MESSAGE}, status=status.HTTP_410_GONE)
+        plan = self.get_read_plan()
+        documents, deleted, token, more = sync.changes(
+            self.queryset.model, positions, plan.columns
+        )
+        return Response({'results': self.serialize_documents(documents), 'deleted': deleted,
+                         'token': token, 'more': more})
+    
+    def list(self, request, *args, **kwargs):
+        if self.delta_sync and 'since' in request.query_params:
+            return self.delta(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_many(page))
+        return Response(self.serialize_many(queryset))
+
+
+class UserViewSet(CompiledReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing User instances.
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = UserCursorPagination
+    delta_sync = True
     
     @action(detail=False, methods=['get'])
     def by_team(self, request):
         """Get users filtered by team_id"""
         team_id = request.query_params.get('team_id')
         if team_id:
-            users = User.objects.filter(team_id=team_id)
-            serializer = self.get_serializer(users, many=True)
-            return Response(serializer.data)
+            users = self.project(User.objects.filter(team_id=team_id))
+            page = self.paginate_queryset(users)
+            return self.get_paginated_response(self.serialize_many(page))
         return Response({'error': 'team_id parameter required'}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['get'])
+    def profile(self, request, pk=None):
+        """Get a user with lifetime totals and their most recent activities"""
+        fields = self.get_fieldset(extra=['recent_activities'])
+        plan = read_plan(UserSerializer, fields)
+        recent = fields is None or 'recent_activities' in fields
+        columns = ['_id', *plan.columns] + (['recent_activities'] if recent else [])
+        user = repository.find_user(pk, columns)
+        if user is None:
+            raise Http404
+        with timed('serialize'):
+            data = plan.serialize_document(user)
+            if recent:
+                data['recent_activities'] = read_plan(ActivitySerializer).serialize_documents(
+                    user.get('recent_activities', [])
+                )
+        return Response(data)
+    
     @action(detail=True, methods=['get'])
     def activities(self, request, pk=None):
         """Get all activities for a specific user"""
-        user = self.get_object()
-        activities = Activity.objects.filter(user_id=user.username)
-        serializer = ActivitySerializer(activities, many=True)
-        return Response(serializer.data)
+        user = repository.find_user(pk)
+        if user is None:
+            raise Http404
+        paginator = ActivityCursorPagination()
+        activities = self.project(
+            repository.activities(user_id=user['username']), ActivitySerializer, paginator
+        )
+        page = paginator.paginate_queryset(activities, request, view=self)
+        data = self.serialize_documents(page, ActivitySerializer)
+        return paginator.get_paginated_response(data)
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Get a user's activity totals per day, week or month for charts"""
+        user = repository.find_user(pk)
+        if user is None:
+            raise Http404
+        try:
+            granularity, start, end = parse_history_params(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        buckets = repository.history_buckets('user', user['username'], start, end)
+        return Response(history_response(granularity, start, end, buckets))
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(CompiledReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing Team instances.
     """
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
     
+    def read_teams(self, pk=None):
+        """Serialized teams, joining rosters only if the fieldset needs them"""
+        fields = self.get_fieldset(extra=['roster', 'stats'])
+        documents = repository.teams(
+            pk, read_plan(TeamSerializer, fields).columns,
+            roster=fields is None or 'roster' in fields,
+            stats=fields is None or 'stats' in fields,
+        )
+        with timed('serialize'):
+            return serialize_teams(documents, fields)
+    
+    def list(self, request, *args, **kwargs):
+        return Response(self.read_teams())
+    
+    def retrieve(self, request, *args, **kwargs):
+        teams = self.read_teams(kwargs[self.lookup_field])
+        if not teams:
+            raise Http404
+        return Response(teams[0])
+    
     @action(detail=True, methods=['get'])
     def members(self, request, pk=None):
         """Get all members of a specific team"""
-        team = self.get_object()
-        users = User.objects.filter(team_id=team._id)
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        team = repository.find_team(pk)
+        if team is None:
+            raise Http404
+        users = self.project(repository.users(team_id=team['_id']), UserSerializer)
+        return Response(self.serialize_documents(users, UserSerializer))
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Get a team's activity totals per day, week or month for charts"""
+        team = repository.find_team(pk)
+        if team is None:
+            raise Http404
+        try:
+            granularity, start, end = parse_history_params(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        buckets = repository.history_buckets('team', team['_id'], start, end)
+        return Response(history_response(granularity, start, end, buckets))
     
     @action(detail=True, methods=['get'])
     def leaderboard(self, request, pk=None):
         """Get team leaderboard entry"""
         team = self.get_object()
-        leaderboard_entry = Leaderboard.objects.filter(
-            type='team', 
-            team_id=team._id
-        ).first()
+        leaderboard_entry = self.project(
+            repository.leaderboard('team').filter(team_id=team._id), LeaderboardSerializer
+        )[:1]
         if leaderboard_entry:
-            serializer = LeaderboardSerializer(leaderboard_entry)
-            return Response(serializer.data)
+            return Response(self.serialize_documents(leaderboard_entry, LeaderboardSerializer)[0])
         return Response({'error': 'Leaderboard entry not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(CompiledReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing Activity instances.
     """
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    pagination_class = ActivityCursorPagination
+    bulk_max_items = 10000
+    delta_sync = True
+    
+    def perform_create(self, serializer):
+        with activity_writes(get_db()):
+            activity = serializer.save()
+            apply_activity_changes([activity_change(activity)])
+        push_recent([instance_document(activity)])
+    
+    def perform_update(self, serializer):
+        previous = serializer.instance
+        old = activity_change(previous, -1)
+        with activity_writes(get_db()):
+            activity = serializer.save()
+            apply_activity_changes([old, activity_change(activity)])
+        refresh_recent({old[0], activity.user_id})
+    
+    def perform_destroy(self, instance):
+        removed = activity_change(instance, -1)
+        with activity_writes(get_db()):
+            instance.delete()
+            apply_activity_changes([removed])
+        refresh_recent([instance.user_id])
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create many activities at once, reporting the outcome per item"""
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('activities')
+        if not isinstance(items, list):
+            return Response({'error': 'expected a list of activities'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_items:
+            return Response({'error': f'at most {self.bulk_max_items} activities per request'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = self.get_serializer()
+        results = [None] * len(items)
+        documents, positions = [], []
+        for index, item in enumerate(items):
+            try:
+                data = serializer.run_validation(item)
+            except ValidationError as exc:
+                results[index] = {'index': index, 'status': 'invalid', 'errors': exc.detail}
+                continue
+            documents.append(ingest.activity_document(data))
+            positions.append(index)
+        
+        failures = ingest.insert_activities(documents)
+        for doc_index, (index, document) in enumerate(zip(positions, documents)):
+            if doc_index in failures:
+                results[index] = {'index': index, 'status': 'error',
+                                  'errors': failures[doc_index]}
+            else:
+                results[index] = {'index': index, 'status': 'created',
+                                  '_id': str(document['_id'])}
+        
+        created = sum(1 for result in results if result['status'] == 'created')
+        if created == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': created, 'failed': len(items) - created,
+                         'results': results}, status=response_status)
     
     @action(detail=False, methods=['get'])
     def by_user(self, request):
         """Get activities filtered by user_id"""
         user_id = request.query_params.get('user_id')
         if user_id:
-            activities = Activity.objects.filter(user_id=user_id)
-            serializer = self.get_serializer(activities, many=True)
-            return Response(serializer.data)
+            activities = self.project(repository.activities(user_id=user_id))
+            page = self.paginate_queryset(activities)
+            return self.get_paginated_response(self.serialize_documents(page))
         return Response({'error': 'user_id parameter required'}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
@@ -88,14 +460,65 @@ class ActivityViewSet(viewsets.ModelViewSet):
         """Get activities filtered by type"""
         activity_type = request.query_params.get('type')
         if activity_type:
-            activities = Activity.objects.filter(type=activity_type)
-            serializer = self.get_serializer(activities, many=True)
-            return Response(serializer.data)
+            activities = self.project(repository.activities(type=activity_type))
+            page = self.paginate_queryset(activities)
+            return self.get_paginated_response(self.serialize_documents(page))
         return Response({'error': 'type parameter required'}, 
                        status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Get activity counts and totals grouped by user/team/type and period"""
+        try:
+            group_by, date_from, date_to = parse_summary_params(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(repository.activity_summary(group_by, date_from, date_to))
+    
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream activities as NDJSON or CSV (``?format=ndjson|csv``).
+        
+        Rows come from a server-side cursor in batches and are written out as
+        they are serialized, so memory use does not grow with the export.
+        Filters: ``from``, ``to``, ``user_id``, ``type`` and ``team_id``;
+        ``fields`` and ``omit`` pick the columns.
+        """
+        params = request.query_params
+        try:
+            date_from = parse_date_bound(params.get('from'))
+            date_to = parse_date_bound(params.get('to'), end=True)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        filters = {}
+        if date_from:
+            filters['date__gte'] = date_from
+        if date_to:
+            filters['date__lt'] = date_to
+        for name in ('user_id', 'type'):
+            if params.get(name):
+                filters[name] = params[name]
+        if params.get('team_id'):
+            usernames = repository.team_usernames(params['team_id'])
+            user_id = filters.pop('user_id', None)
+            if user_id:
+                usernames = [name for name in usernames if name == user_id]
+            filters['user_id__in'] = usernames
+        
+        plan = self.get_read_plan()
+        activities = self.project(repository.activities(**filters))
+        rows = map(plan.serialize_document, activities.iterator())
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(rows, plan.names),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="activities.{renderer.format}"'
+        return response
 
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+class WorkoutViewSet(CompiledReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing Workout instances.
     """
@@ -107,9 +530,8 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         """Get workouts filtered by type"""
         workout_type = request.query_params.get('type')
         if workout_type:
-            workouts = Workout.objects.filter(type=workout_type)
-            serializer = self.get_serializer(workouts, many=True)
-            return Response(serializer.data)
+            workouts = self.project(Workout.objects.filter(type=workout_type))
+            return Response(self.serialize_many(workouts))
         return Response({'error': 'type parameter required'}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
@@ -118,41 +540,135 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         """Get workouts filtered by difficulty"""
         difficulty = request.query_params.get('difficulty')
         if difficulty:
-            workouts = Workout.objects.filter(difficulty=difficulty)
-            serializer = self.get_serializer(workouts, many=True)
-            return Response(serializer.data)
+            workouts = self.project(Workout.objects.filter(difficulty=difficulty))
+            return Response(self.serialize_many(workouts))
         return Response({'error': 'difficulty parameter required'}, 
                        status=status.HTTP_400_BAD_REQUEST)
 
 
-class LeaderboardViewSet(viewsets.ReadOnlyModelViewSet):
+class LeaderboardViewSet(CompiledReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing Leaderboard instances (read-only).
     """
     queryset = Leaderboard.objects.all()
     serializer_class = LeaderboardSerializer
+    pagination_class = LeaderboardCursorPagination
+    delta_sync = True
+    
+    def list(self, request, *args, **kwargs):
+        if 'since' in request.query_params:
+            return self.delta(request)
+        page = self.paginate_queryset(self.project(repository.leaderboard()))
+        return self.get_paginated_response(self.serialize_documents(page))
+    
+    def retrieve(self, request, *args, **kwargs):
+        entry = repository.find_entry(kwargs['pk'], self.get_read_plan().columns)
+        if entry is None:
+            raise Http404
+        return Response(self.serialize_documents([entry])[0])
+    
+    def cached_board(self, request, board_type, build, etag_extra='', windowed=False,
+                     fields=None):
+        """
+        Serve build()'s JSON from the leaderboard cache.
+        
+        The ETag and Last-Modified come from the board's newest updated_at,
+        so If-None-Match / If-Modified-Since are answered with 304 and cache
+        hits never query MongoDB. ``etag_extra`` distinguishes responses that
+        also depend on something other than the board, such as a window start.
+        ``windowed`` responses are summed from the daily buckets, so the
+        newest bucket write counts too: moving an activity to another day
+        changes a window without moving any entry. ``fields`` is the parsed
+        sparse fieldset, which keys and tags the response too. Non-JSON
+        renderers bypass the cache.
+        """
+        if request.accepted_renderer.format != 'json':
+            return build()
+        key = cache_key(request, fields)
+        cached = leaderboard_cache.get(key)
+        if cached is None:
+            version = leaderboard_cache.version
+            updated_at, count = repository.leaderboard_version(board_type)
+            if windowed:
+                updated_at = max(filter(None, [updated_at, repository.buckets_version(board_type)]),
+                                 default=None)
+            etag, last_modified = board_validators(board_type, updated_at, count,
+                                                   etag_extra, fields)
+            body = JSONRenderer().render(build().data)
+            cached = leaderboard_cache.set(key, body, etag, last_modified, version)
+        return cached_response(request, cached)
     
     @action(detail=False, methods=['get'])
     def individual(self, request):
         """Get individual leaderboard rankings"""
-        leaderboard = Leaderboard.objects.filter(type='individual').order_by('rank')
-        serializer = self.get_serializer(leaderboard, many=True)
-        return Response(serializer.data)
+        def build():
+            leaderboard = self.project(repository.leaderboard('individual'))
+            page = self.paginate_queryset(leaderboard)
+            return self.get_paginated_response(self.serialize_documents(page))
+        return self.cached_board(request, 'individual', build, fields=self.get_fieldset())
     
     @action(detail=False, methods=['get'])
     def team(self, request):
         """Get team leaderboard rankings"""
-        leaderboard = Leaderboard.objects.filter(type='team').order_by('rank')
-        serializer = self.get_serializer(leaderboard, many=True)
-        return Response(serializer.data)
+        def build():
+            leaderboard = self.project(repository.leaderboard('team'))
+            page = self.paginate_queryset(leaderboard)
+            return self.get_paginated_response(self.serialize_documents(page))
+        return self.cached_board(request, 'team', build, fields=self.get_fieldset())
     
     @action(detail=False, methods=['get'])
     def top(self, request):
         """Get top N entries from leaderboard"""
-        limit = int(request.query_params.get('limit', 10))
-        leaderboard_type = request.query_params.get('type', 'individual')
-        leaderboard = Leaderboard.objects.filter(
-            type=leaderboard_type
-        ).order_by('rank')[:limit]
-        serializer = self.get_serializer(leaderboard, many=True)
-        return Response(serializer.data)
+        try:
+            leaderboard_type, limit = parse_top_params(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        window = request.query_params.get('window')
+        if window:
+            if window not in WINDOWS:
+                return Response({'error': f'window must be one of {", ".join(WINDOWS)}'},
+                               status=status.HTTP_400_BAD_REQUEST)
+            start = window_start(window)
+            fields = self.get_fieldset(extra=['window', 'window_start'])
+            return self.cached_board(
+                request, leaderboard_type,
+                lambda: Response(select_keys(
+                    windowed_leaderboard(leaderboard_type, window, limit), fields
+                )),
+                etag_extra=f'-{window}-{start:%Y%m%d}', windowed=True, fields=fields,
+            )
+        def build():
+            leaderboard = self.project(repository.leaderboard(leaderboard_type))[:limit]
+            return Response(self.serialize_documents(leaderboard))
+        return self.cached_board(request, leaderboard_type, build, fields=self.get_fieldset())
+
+
+class SearchViewSet(viewsets.GenericViewSet):
+    """
+    Full-text search over activity notes and workout names, descriptions
+    and exercises, best matches first.
+    
+    ``?q=`` takes MongoDB ``$text`` syntax: words, "quoted phrases" and
+    -excluded words. ``?kind=activity|workout`` searches one collection.
+    Every match is answered from the collections' text indexes, and only
+    the best SEARCH_MAX_RESULTS can be paged to.
+    """
+    pagination_class = SearchPagination
+    
+    def list(self, request):
+        terms = request.query_params.get('q', '').strip()
+        if not terms:
+            return Response({'error': 'q parameter required'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        kind = request.query_params.get('kind')
+        if kind and kind not in repository.SEARCH_TARGETS:
+            return Response({'error': f'kind must be one of {", ".join(repository.SEARCH_TARGETS)}'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(repository.TextSearch(terms, [kind] if kind else None))
+        with timed('serialize'):
+            results = [
+                {'kind': kind, 'score': round(score, 4),
+                 'item': read_plan(repository.SEARCH_TARGETS[kind][1]).serialize_document(document)}
+                for kind, score, document in page
+            ]
+        return self.get_paginated_response(results)
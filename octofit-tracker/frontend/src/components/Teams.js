@@ -53,17 +53,21 @@ function Teams() {
                 <div className="team-icon">🤝</div>
                 <h3 className="team-name">{team.name}</h3>
                 <div className="team-member-count">
-                  <span className="count-badge">{team.members?.length || 0}</span>
+                  <span className="count-badge">{team.stats?.members_count || 0}</span>
                   <span className="count-label">Members</span>
                 </div>
               </div>
               <div className="team-card-body">
+                <p className="team-stats">
+                  {team.stats?.total_points || 0} points &middot; {team.stats?.activities_completed || 0} activities
+                </p>
                 <h5 className="team-section-title">Team Members</h5>
                 <div className="team-members-grid">
-                  {team.members && team.members.map((member, idx) => (
-                    <div key={idx} className="team-member-item">
-                      <div className="member-avatar">{member.charAt(0).toUpperCase()}</div>
-                      <span className="member-name">{member}</span>
+                  {team.roster && team.roster.map((member) => (
+                    <div key={member.username} className="team-member-item">
+                      <div className="member-avatar">{(member.full_name || member.username).charAt(0).toUpperCase()}</div>
+                      <span className="member-name">{member.full_name || member.username}</span>
+                      <span className="member-points">{member.total_points} pts</span>
                     </div>
                   ))}
                 </div>